@@ -0,0 +1,46 @@
+"""
+断点记录基准测试：追加记录的速度、合并耗时，以及崩溃后由快照和日志恢复的耗时
+python -m benchmark.checkpoint_benchmark
+"""
+import os
+import tempfile
+import time
+
+from core.schedule.checkpoint import CheckpointStore
+
+URL_COUNT = 50000
+TASK_COUNT = 10
+
+
+def main():
+    with tempfile.TemporaryDirectory() as out_dir:
+        journal_path = os.path.join(out_dir, "journal.jsonl")
+        for fsync in (False, True):
+            count = URL_COUNT if not fsync else URL_COUNT // 50
+            store = CheckpointStore(journal_path + str(fsync), compact_every=10000, fsync=fsync)
+            start = time.perf_counter()
+            for index in range(count):
+                store.mark_url_done("task-%s" % (index % TASK_COUNT), "https://example.com/item/%s" % index)
+            elapsed = time.perf_counter() - start
+            print("append fsync=%-5s %8.1f records/s, %s" % (fsync, count / elapsed, store.stats()))
+            store._journal.close()  # 模拟崩溃：不合并直接丢弃
+        store = CheckpointStore(journal_path, compact_every=URL_COUNT * 2)
+        for index in range(URL_COUNT):
+            store.mark_url_done("task-%s" % (index % TASK_COUNT), "https://example.com/item/%s" % index)
+        store._journal.close()
+        start = time.perf_counter()
+        store = CheckpointStore(journal_path)
+        print("recover %s journal records in %.1f ms" % (URL_COUNT, (time.perf_counter() - start) * 1000))
+        start = time.perf_counter()
+        store.close()
+        store = CheckpointStore(journal_path)
+        print("recover from snapshot in %.1f ms, %s" % ((time.perf_counter() - start) * 1000, store.stats()))
+        start = time.perf_counter()
+        done = sum(store.is_url_done("task-%s" % (index % TASK_COUNT), "https://example.com/item/%s" % index)
+                   for index in range(URL_COUNT))
+        print("skip check %s urls in %.1f ms (%s done)" % (URL_COUNT, (time.perf_counter() - start) * 1000, done))
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+配置基准测试：每个会话按配置逐项生成浏览器启动参数 vs 由预先解析的模板生成，以及读取配置字段的开销
+python -m benchmark.config_benchmark
+"""
+import os
+import tempfile
+import time
+
+from selenium.webdriver.edge.options import Options as EdgeOptions
+
+from core.config.config import get_config_by_section
+from core.crawl.driver_options import DriverOptionsTemplate
+
+SESSIONS = 500
+READS = 200000
+EXTENSION_SIZE = 512 * 1024  # 模拟扩展文件大小
+
+
+def build_options(edge_config: dict) -> EdgeOptions:
+    """原init_edge_driver中的做法"""
+    edge_options = EdgeOptions()
+    for argument in edge_config["arguments"]:
+        edge_options.add_argument(argument)
+    edge_options.add_experimental_option("prefs", edge_config["prefs"])
+    for extension in edge_config["extensions"]:
+        edge_options.add_extension(extension)
+    return edge_options
+
+
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        extension = os.path.join(temp_dir, "extension.crx")
+        with open(extension, "wb") as file:
+            file.write(os.urandom(EXTENSION_SIZE))
+        for extensions in ([], [extension]):
+            edge_config = dict(get_config_by_section("webdriver", "edge"), extensions=extensions)
+            start = time.perf_counter()
+            for _ in range(SESSIONS):
+                build_options(edge_config).to_capabilities()
+            built = time.perf_counter() - start
+            template = DriverOptionsTemplate("edge", edge_config)
+            start = time.perf_counter()
+            for _ in range(SESSIONS):
+                template.new_options().to_capabilities()
+            cloned = time.perf_counter() - start
+            print("%s extension(s): build %8.1f us/session, template %8.1f us/session" % (
+                len(extensions), built / SESSIONS * 1000000, cloned / SESSIONS * 1000000))
+
+    start = time.perf_counter()
+    for _ in range(READS):
+        get_config_by_section("frontier", "host_interval")
+    elapsed = time.perf_counter() - start
+    print("config read %.3f us/read" % (elapsed / READS * 1000000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+下载管理器基准测试，本地HTTP服务模拟源站：对比单连接和分段下载，并校验源站对非identity请求返回gzip
+(压缩后的大小和ETag与原始内容不同)时下载的文件与原始内容一致
+python -m benchmark.download_benchmark
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from core.common.download_manager import DownloadManager
+
+FILE_SIZE = 16 * 1024 * 1024
+SEGMENT_THRESHOLD = 4 * 1024 * 1024
+
+
+def make_body() -> bytes:
+    """十六进制文本，压缩后约为原始大小的一半，仍超过分段阈值"""
+    count = FILE_SIZE // 64 + 1
+    return b"".join(hashlib.sha256(b"%d" % index).hexdigest().encode() for index in range(count))[:FILE_SIZE]
+
+
+def make_handler(body: bytes, compressed: bytes):
+    identity_etag = '"%s"' % hashlib.md5(body).hexdigest()
+    gzip_etag = '"%s-gzip"' % hashlib.md5(body).hexdigest()
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _use_gzip(self) -> bool:
+            return "gzip" in self.headers.get("Accept-Encoding", "") and not self.headers.get("Range")
+
+        def _send_headers(self):
+            if self._use_gzip():
+                self.send_response(200)
+                self.send_header("Content-Encoding", "gzip")
+                self.send_header("ETag", gzip_etag)
+                self.send_header("Content-Length", str(len(compressed)))
+                self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+                return compressed
+            byte_range = self.headers.get("Range")
+            if byte_range and self.headers.get("If-Range", identity_etag) == identity_etag:
+                start, end = byte_range[len("bytes="):].split("-")
+                start, end = int(start), min(int(end) if end else len(body) - 1, len(body) - 1)
+                if start >= len(body):
+                    self.send_response(416)
+                    self.send_header("Content-Range", "bytes */%s" % len(body))
+                    self.end_headers()
+                    return b""
+                self.send_response(206)
+                self.send_header("Content-Range", "bytes %s-%s/%s" % (start, end, len(body)))
+                data = body[start:end + 1]
+            else:
+                self.send_response(200)
+                data = body
+            self.send_header("ETag", identity_etag)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            return data
+
+        def do_HEAD(self):
+            self._send_headers()
+
+        def do_GET(self):
+            self.wfile.write(self._send_headers())
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    body = make_body()
+    compressed = gzip.compress(body)
+    expected = hashlib.sha256(body).hexdigest()
+    print("identity %s KB, gzip %s KB" % (len(body) // 1024, len(compressed) // 1024))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(body, compressed))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%s/file.bin" % server.server_port
+    try:
+        with tempfile.TemporaryDirectory() as out_dir:
+            for segments in (1, 4):
+                file_path = os.path.join(out_dir, "file-%s.bin" % segments)
+                with DownloadManager(max_downloads=1, segments=segments, segment_threshold=SEGMENT_THRESHOLD,
+                                     chunk_size=65536, retries=0, backoff=0.1, timeout=10) as manager:
+                    start = time.perf_counter()
+                    if not manager.download(url, file_path):
+                        raise Exception("下载失败：segments=%s" % segments)
+                    elapsed = time.perf_counter() - start
+                with open(file_path, "rb") as file:
+                    digest = hashlib.sha256(file.read()).hexdigest()
+                if digest != expected:
+                    raise Exception("下载的文件与原始内容不一致：segments=%s, 大小%s" %
+                                    (segments, os.path.getsize(file_path)))
+                print("segments=%s %7.1f ms  %6.1f MB/s" % (segments, elapsed * 1000,
+                                                            len(body) / elapsed / 1024 / 1024))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
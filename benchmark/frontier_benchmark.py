@@ -0,0 +1,60 @@
+"""
+URL边界队列基准测试：模拟全站爬取时页面链接大量重复，输出入队速度、去重命中和进程内存
+python -m benchmark.frontier_benchmark [链接数]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+from random import Random
+
+from core.schedule.url_frontier import UrlFrontier
+
+HOST_COUNT = 50
+LINKS_PER_PAGE = 100
+REPEAT_RATE = 0.6  # 页面链接中导航栏等重复链接的比例
+
+
+def gen_pages(total: int, seed: int = 0):
+    """按页面生成链接，每页一部分是新链接，其余是已出现过的链接"""
+    rand = Random(seed)
+    produced = 0
+    while produced < total:
+        links = []
+        for _ in range(LINKS_PER_PAGE):
+            if produced and rand.random() < REPEAT_RATE:
+                index = rand.randrange(max(1, produced // 1000)) if rand.random() < 0.8 else rand.randrange(produced)
+            else:
+                index = produced
+                produced += 1
+            links.append("https://host%d.example.com/item/%d?utm_source=feed&id=%d" % (
+                index % HOST_COUNT, index, index))
+        yield links
+
+
+def main(total: int = 1000000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        frontier = UrlFrontier(os.path.join(tmp_dir, "frontier.db"), bloom_capacity=total * 2, bloom_error_rate=0.001,
+                               host_buffer=64, host_interval=0, max_depth=10, same_host_only=False)
+        start = time.perf_counter()
+        offered = 0
+        for links in gen_pages(total):
+            frontier.add_many(links, 1)
+            offered += len(links)
+        elapsed = time.perf_counter() - start
+        print("offered %s links in %.1f s, %.0f links/s" % (offered, elapsed, offered / elapsed))
+        start = time.perf_counter()
+        popped = 0
+        while popped < 100000 and frontier.next() is not None:
+            popped += 1
+        elapsed = time.perf_counter() - start
+        print("popped %s urls in %.2f s, %.0f urls/s" % (popped, elapsed, popped / elapsed))
+        print(frontier.stats())
+        print("max rss %.1f MB, db %.1f MB" % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                                               os.path.getsize(os.path.join(tmp_dir, "frontier.db")) / 1048576))
+        frontier.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,98 @@
+"""
+HTTP内容缓存基准测试，本地HTTP服务模拟源站，对比首次爬取和内容大部分未变化时的重新爬取
+python -m benchmark.http_cache_benchmark
+"""
+import hashlib
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from core.common.http_cache import HttpCache
+
+PAGE_COUNT = 200
+PAGE_SIZE = 64 * 1024
+SHARED_EVERY = 10  # 每10个页面中有1个与其他页面内容相同
+CHANGED_EVERY = 20  # 重新爬取时每20个页面中有1个内容变化
+
+
+class OriginState:
+    """模拟源站内容，version变化的页面内容变化"""
+
+    def __init__(self):
+        self.version = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def content(self, index: int) -> bytes:
+        if index % SHARED_EVERY == 0:
+            seed = b"shared"
+        else:
+            seed = b"page-%d-%d" % (index, self.version.get(index, 0))
+        return (hashlib.sha256(seed).hexdigest().encode() * (PAGE_SIZE // 64 + 1))[:PAGE_SIZE]
+
+
+def make_handler(state: OriginState):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            index = int(self.path.rsplit("/", 1)[-1])
+            body = state.content(index)
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            with state.lock:
+                state.requests += 1
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            with state.lock:
+                state.bytes_sent += len(body)
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def crawl(cache: HttpCache, base_url: str) -> float:
+    start = time.perf_counter()
+    for index in range(PAGE_COUNT):
+        if not cache.fetch("%s/page/%d" % (base_url, index)).ok:
+            raise Exception("请求失败：%s" % index)
+    return time.perf_counter() - start
+
+
+def main():
+    state = OriginState()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = "http://127.0.0.1:%s" % server.server_port
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = HttpCache(cache_dir, max_size=1 << 30, max_age=3600, fresh_ttl=0, timeout=10)
+            for round_name in ("cold", "recrawl"):
+                sent_before = state.bytes_sent
+                elapsed = crawl(cache, base_url)
+                print("%-8s %7.1f ms  %6.1f KB from origin" % (round_name, elapsed * 1000,
+                                                             (state.bytes_sent - sent_before) / 1024))
+                for index in range(1, PAGE_COUNT, CHANGED_EVERY):
+                    state.version[index] = state.version.get(index, 0) + 1
+            print(cache.stats())
+            cache.max_size = PAGE_SIZE * PAGE_COUNT // 2
+            print("evicted %s entries, %s" % (cache.evict(), cache.stats()))
+            cache.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
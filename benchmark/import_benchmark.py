@@ -0,0 +1,52 @@
+"""
+导入耗时基准测试：每次在新进程中导入模块，统计导入耗时以及是否加载了可选后端(OpenCV、numpy、Pillow、pywinauto)
+python -m benchmark.import_benchmark
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+RUNS = 5
+MODULES = ["core.crawl.web_crawl", "core.crawl.driver_pool", "core.crawl.window_crawl", "core.schedule.scheduler"]
+OPTIONAL = ["cv2", "numpy", "PIL", "pywinauto"]
+EAGER = ["cv2", "numpy", "PIL.Image", "PIL.ImageGrab", "pywinauto"]  # 原先导入爬虫模块时一并导入的可选后端
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+error = None
+for name in %r:
+    try:
+        __import__(name)
+    except ImportError as e:
+        error = str(e)
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "error": error, "loaded": [name for name in %r if name in sys.modules]}))
+"""
+
+
+def measure(modules: list) -> dict:
+    """在新进程中导入模块，返回多次运行的耗时中位数/毫秒和已加载的可选后端"""
+    results = []
+    for _ in range(RUNS):
+        output = subprocess.run([sys.executable, "-c", SCRIPT % (modules, OPTIONAL)], capture_output=True,
+                                text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {"ms": statistics.median(result["elapsed"] for result in results) * 1000,
+            "loaded": results[-1]["loaded"], "error": results[-1]["error"]}
+
+
+def main():
+    for module in MODULES:
+        result = measure([module])
+        print("%-28s %7.1f ms, optional loaded: %s%s" % (
+            module, result["ms"], result["loaded"] or "-", ", error: %s" % result["error"] if result["error"] else ""))
+    result = measure(EAGER)
+    print("%-28s %7.1f ms, optional loaded: %s%s" % (
+        "eager optional backends", result["ms"], result["loaded"] or "-",
+        ", error: %s" % result["error"] if result["error"] else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+日志调用开销基准测试：同步写文件和标准输出 vs 异步队列，多线程并发记录时每次调用的平均耗时
+python -m benchmark.logging_benchmark
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from logging.handlers import TimedRotatingFileHandler
+
+from core.log.logger import AsyncLogHandler, ContextFilter, JsonFormatter
+
+THREADS = 8
+CALLS_PER_THREAD = 5000
+FORMAT = "%(asctime)s-%(name)s-%(levelname)s-%(message)s"
+
+
+def create_handlers(log_dir: str, name: str, json_format: bool) -> list:
+    devnull = open(os.devnull, "w")
+    handlers = [TimedRotatingFileHandler(os.path.join(log_dir, "%s.log" % name), when="D", encoding="utf-8"),
+                logging.StreamHandler(devnull)]
+    formatter = JsonFormatter() if json_format else logging.Formatter(FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def run(bench_logger: logging.Logger) -> float:
+    """多线程同时记录日志，返回调用线程每次调用平均占用的时间/微秒，即总耗时除以总调用次数"""
+
+    def worker(index: int):
+        for i in range(CALLS_PER_THREAD):
+            bench_logger.info("worker %s downloaded page %s in %.3f s", index, i, 0.123)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (time.perf_counter() - start) / (THREADS * CALLS_PER_THREAD) * 1000000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as log_dir:
+        cases = [("sync text", None, False), ("sync json", None, True), ("async text drop", "drop", False),
+                 ("async json drop", "drop", True), ("async json sample", "sample", True),
+                 ("async json block", "block", True)]
+        for name, overflow, json_format in cases:
+            bench_logger = logging.getLogger("bench.%s" % name)
+            bench_logger.propagate = False
+            bench_logger.setLevel(logging.INFO)
+            handlers = create_handlers(log_dir, name.replace(" ", "_"), json_format)
+            if overflow is None:
+                for handler in handlers:
+                    handler.addFilter(ContextFilter())
+                    bench_logger.addHandler(handler)
+                async_handler = None
+            else:
+                async_handler = AsyncLogHandler(handlers, queue_size=10000, batch_size=256, flush_interval=0.1,
+                                                overflow=overflow, sample_rate=0.1)
+                async_handler.addFilter(ContextFilter())
+                bench_logger.addHandler(async_handler)
+            per_call = run(bench_logger)
+            if async_handler is not None:
+                async_handler.stop()
+                print("%-18s %7.2f us/call  %s" % (name, per_call, async_handler.stats()))
+                async_handler.close()
+            else:
+                print("%-18s %7.2f us/call" % (name, per_call))
+                for handler in handlers:
+                    handler.close()
+            bench_logger.handlers.clear()
+
+
+if __name__ == '__main__':
+    main()
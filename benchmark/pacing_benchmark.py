@@ -0,0 +1,54 @@
+"""
+操作节奏基准测试：模拟操作后界面在随机时间内持续变化，固定等待 vs 等待状态稳定，
+统计总耗时和返回时界面仍未稳定(过早继续)的次数
+python -m benchmark.pacing_benchmark
+"""
+import time
+from random import Random
+
+from core.crawl.action_pacer import ActionPacer
+
+ACTIONS = 20
+LEGACY_SLEEP = 0.5
+
+
+class FakeWindow:
+    """操作后在reaction秒内每50毫秒变化一次的窗口"""
+
+    def __init__(self, reaction: float):
+        self.start = time.perf_counter()
+        self.reaction = reaction
+
+    def is_settled(self) -> bool:
+        return time.perf_counter() - self.start >= self.reaction
+
+    def fingerprint(self) -> int:
+        elapsed = time.perf_counter() - self.start
+        return int(elapsed / 0.05) if elapsed < self.reaction else -1
+
+
+def main():
+    rand = Random(1)
+    reactions = [rand.choice([0.05, 0.1, 0.15, 0.2, 0.3, 0.6]) for _ in range(ACTIONS)]
+
+    start = time.perf_counter()
+    early = 0
+    for reaction in reactions:
+        window = FakeWindow(reaction)
+        time.sleep(LEGACY_SLEEP)
+        early += not window.is_settled()
+    print("%-10s %6.2f s, early %s/%s" % ("fixed", time.perf_counter() - start, early, ACTIONS))
+
+    pacer = ActionPacer()
+    start = time.perf_counter()
+    early = 0
+    for reaction in reactions:
+        window = FakeWindow(reaction)
+        pacer.settle_window(window.fingerprint, "window_input")
+        early += not window.is_settled()
+    print("%-10s %6.2f s, early %s/%s, %s" % ("settle", time.perf_counter() - start, early, ACTIONS,
+                                                pacer.stats()["window:window_input"]))
+
+
+if __name__ == '__main__':
+    main()
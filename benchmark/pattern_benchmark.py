@@ -0,0 +1,89 @@
+"""
+窗口/元素名称匹配基准测试：逐个re.search vs 预编译 vs 多正则一次扫描
+读取文本的耗时分别按0和20us(模拟跨进程UIA调用)计算
+python -m benchmark.pattern_benchmark
+"""
+import re
+import time
+from random import Random
+
+from core.common.pattern_utils import compile_pattern, get_multi_matcher
+
+PATTERNS = {
+    "save": r"另存为|Save As",
+    "open": r"^打开$",
+    "confirm": r"确认.*覆盖",
+    "error": r"(错误|Error)\s*\d+",
+    "login": r"登录超时|Session expired"
+}
+
+
+class FakeWindow:
+    """模拟窗口，window_text()模拟一次跨进程UIA调用的耗时"""
+
+    def __init__(self, text: str, cost: float):
+        self.text = text
+        self.cost = cost
+
+    def window_text(self) -> str:
+        end = time.perf_counter() + self.cost
+        while time.perf_counter() < end:
+            pass
+        return self.text
+
+
+def gen_texts(count: int = 2000, seed: int = 0) -> list:
+    """生成模拟的窗口/元素文本，大部分不匹配"""
+    rand = Random(seed)
+    words = ["文件", "编辑", "视图", "工具", "帮助", "Microsoft", "Edge", "新建标签页", "设置", "Button", "Pane"]
+    return [" ".join(rand.choice(words) for _ in range(rand.randint(1, 6))) for _ in range(count)]
+
+
+def bench_re_search(windows: list) -> int:
+    """当前做法：每个正则一次完整扫描，每次re.search传入原始字符串"""
+    found = 0
+    for pattern in PATTERNS.values():
+        for window in windows:
+            if re.search(pattern, window.window_text()):
+                found += 1
+                break
+    return found
+
+
+def bench_compiled(windows: list) -> int:
+    """预编译后每个正则一次完整扫描"""
+    found = 0
+    for pattern in PATTERNS.values():
+        compiled = compile_pattern(pattern)
+        for window in windows:
+            if compiled.search(window.window_text()):
+                found += 1
+                break
+    return found
+
+
+def bench_multi(windows: list) -> int:
+    """多正则匹配器，一次扫描"""
+    matched = get_multi_matcher(PATTERNS).find_first(windows, lambda window: window.window_text())
+    return 0 if matched is None else 1
+
+
+def measure(func, windows: list, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(windows)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main(rounds: int = 20):
+    texts = gen_texts()
+    for cost in (0.0, 0.00002):
+        windows = [FakeWindow(text, cost) for text in texts]
+        for name, func in (("re.search per call", bench_re_search), ("compiled", bench_compiled),
+                           ("multi pattern", bench_multi)):
+            print("text cost %3dus %-20s %8.3f ms/scan of %s texts x %s patterns" % (
+                cost * 1000000, name, measure(func, windows, rounds), len(texts), len(PATTERNS)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+流水线基准测试：浏览器线程内同步编码截图 vs 浏览器线程只提交、编码在进程池中执行
+浏览器操作以固定等待模拟(页面加载期间线程空闲)，编码使用真实的截图编码函数
+python -m benchmark.pipeline_benchmark
+"""
+import os
+import tempfile
+import time
+
+from benchmark.screenshot_benchmark import gen_frame
+from core.common.screenshot_service import encode_frame
+from core.schedule.pipeline import PipelineRunner, Stage
+
+PAGE_COUNT = 24
+PAGE_LOAD = 0.08  # 模拟每页加载和操作的等待时间/秒
+
+
+def encode_job(job: tuple) -> str:
+    """进程池中执行的阶段函数，需为模块级函数"""
+    frame, file_path = job
+    return encode_frame(frame, file_path)
+
+
+def browse(frames: list, out_dir: str):
+    """模拟逐页打开并截图的浏览器线程"""
+    for index, frame in enumerate(frames):
+        time.sleep(PAGE_LOAD)
+        yield frame, os.path.join(out_dir, "page-%s.png" % index)
+
+
+def main():
+    frames = [gen_frame(index) for index in range(PAGE_COUNT)]
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        for job in browse(frames, os.path.join(out_dir, "inline")):
+            encode_job(job)
+        inline = time.perf_counter() - start
+        print("%-22s %6.2f s, %5.1f pages/s" % ("inline", inline, PAGE_COUNT / inline))
+        for workers in (1, 2, 4):
+            runner = PipelineRunner([Stage("encode", encode_job, workers=workers, process=True)], queue_size=4)
+            start = time.perf_counter()
+            stats = runner.run(browse(frames, os.path.join(out_dir, "pipeline-%s" % workers)))
+            elapsed = time.perf_counter() - start
+            encode = stats["stages"]["encode"]
+            print("%-22s %6.2f s, %5.1f pages/s, source blocked %.2f s, encode utilization %.0f%%, failed %s" % (
+                "pipeline %s process" % workers, elapsed, PAGE_COUNT / elapsed, stats["source_blocked"],
+                encode["utilization"] * 100, encode["failed"]))
+
+
+if __name__ == '__main__':
+    main()
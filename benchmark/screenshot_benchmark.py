@@ -0,0 +1,55 @@
+"""
+截图服务基准测试：调用线程同步编码PNG vs 提交到截图服务，模拟审计截图中大量画面不变的情况
+python -m benchmark.screenshot_benchmark
+"""
+import os
+import tempfile
+import time
+from random import Random
+
+from PIL import Image, ImageDraw
+
+from core.common.screenshot_service import ScreenshotService
+
+FRAME_COUNT = 40
+CHANGE_EVERY = 4  # 每4帧画面变化一次
+
+
+def gen_frame(seed: int, width: int = 1920, height: int = 1080) -> Image.Image:
+    """生成带随机色块和文字的模拟截图"""
+    rand = Random(seed)
+    image = Image.new("RGB", (width, height), (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x, y = rand.randrange(width - 200), rand.randrange(height - 80)
+        draw.rectangle((x, y, x + rand.randint(40, 200), y + rand.randint(20, 80)),
+                       fill=tuple(rand.randrange(256) for _ in range(3)))
+        draw.text((x + 4, y + 4), "item %s" % rand.randrange(10000), fill=(0, 0, 0))
+    return image
+
+
+def main():
+    frames = [gen_frame(index // CHANGE_EVERY) for index in range(FRAME_COUNT)]
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        for frame in frames:
+            frame.save(os.path.join(out_dir, "sync-%s.png" % time.perf_counter_ns()))
+        elapsed = time.perf_counter() - start
+        print("%-18s caller %7.1f ms/frame" % ("sync png", elapsed / FRAME_COUNT * 1000))
+        for image_format in ("png", "jpeg", "webp"):
+            service = ScreenshotService(workers=2, image_format=image_format, quality=75, dedup=True,
+                                        hash_threshold=2, max_pending=FRAME_COUNT)
+            directory = os.path.join(out_dir, image_format)
+            start = time.perf_counter()
+            for frame in frames:
+                service.submit(frame, directory, channel="bench")
+            caller = time.perf_counter() - start
+            service.close()
+            total = time.perf_counter() - start
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            print("%-18s caller %7.3f ms/frame, drained in %6.1f ms, %s, %.1f KB on disk" % (
+                "service %s" % image_format, caller / FRAME_COUNT * 1000, total * 1000, service.stats(), size / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+模板匹配基准测试，使用合成截图，可在Linux下运行
+python -m benchmark.template_benchmark
+"""
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from core.crawl.template_library import TemplateLibrary
+
+
+def gen_screen(width: int = 1920, height: int = 1080, seed: int = 0) -> np.ndarray:
+    """生成带噪声和色块的合成灰度截图"""
+    rand = np.random.default_rng(seed)
+    screen = cv2.GaussianBlur(rand.integers(0, 256, (height, width), dtype=np.uint8), (5, 5), 0)
+    block_w, block_h = max(4, width // 16), max(4, height // 18)
+    for _ in range(60):
+        x, y = int(rand.integers(0, width - block_w)), int(rand.integers(0, height - block_h))
+        cv2.rectangle(screen, (x, y), (x + int(rand.integers(2, block_w)), y + int(rand.integers(2, block_h))),
+                      int(rand.integers(0, 256)), -1)
+    return screen
+
+
+def save_templates(screen: np.ndarray, out_dir: str, count: int = 5, size: tuple = (40, 80)) -> list:
+    """从截图中裁剪模板并保存为png"""
+    paths = []
+    for i in range(count):
+        x, y = 150 + i * 300, 100 + i * 150
+        path = os.path.join(out_dir, "template_%s.png" % i)
+        cv2.imwrite(path, screen[y:y + size[0], x:x + size[1]])
+        paths.append(path)
+    return paths
+
+
+def bench_load(paths: list, rounds: int) -> tuple[float, float]:
+    """只比较模板读取耗时：每次从磁盘读取 vs 模板库缓存"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    uncached = time.perf_counter() - start
+    library = TemplateLibrary()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            library.get(path)
+    return uncached, time.perf_counter() - start
+
+
+def bench_uncached(screen: np.ndarray, paths: list, rounds: int) -> float:
+    """每次匹配都从磁盘读取模板"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            cv2.minMaxLoc(cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED))
+    return time.perf_counter() - start
+
+
+def bench_library(screen: np.ndarray, paths: list, rounds: int) -> float:
+    """通过模板库匹配"""
+    library = TemplateLibrary()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        library.match_many(screen, paths)
+    return time.perf_counter() - start
+
+
+def main(rounds: int = 20):
+    screen = gen_screen()
+    with tempfile.TemporaryDirectory() as out_dir:
+        paths = save_templates(screen, out_dir)
+        load_uncached, load_cached = bench_load(paths, rounds * 10)
+        uncached = bench_uncached(screen, paths, rounds)
+        cached = bench_library(screen, paths, rounds)
+    loads = rounds * 10 * len(paths)
+    matches = rounds * len(paths)
+    print("load uncached: %.3f ms/template" % (load_uncached / loads * 1000))
+    print("load library:  %.3f ms/template" % (load_cached / loads * 1000))
+    print("match uncached: %.2f ms/match" % (uncached / matches * 1000))
+    print("match library:  %.2f ms/match" % (cached / matches * 1000))
+
+
+if __name__ == '__main__':
+    main()
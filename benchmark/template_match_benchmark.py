@@ -0,0 +1,69 @@
+"""
+模板匹配引擎基准测试，使用合成截图，输出每秒可处理的帧数
+python -m benchmark.template_match_benchmark
+"""
+import os
+import tempfile
+import time
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from benchmark.template_benchmark import gen_screen
+from core.crawl.template_library import TemplateLibrary
+from core.crawl.template_matcher import TemplateMatcher
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4K": (3840, 2160)}
+
+
+def build_case(width: int, height: int, out_dir: str) -> tuple[np.ndarray, str]:
+    """生成截图，并在截图中放入原尺寸和放大1.25倍的模板"""
+    screen = gen_screen(width, height, seed=1)
+    template = gen_screen(120, 48, seed=2)
+    template_path = os.path.join(out_dir, "template_%s.png" % width)
+    cv2.imwrite(template_path, template)
+    screen[height // 3:height // 3 + 48, width // 4:width // 4 + 120] = template
+    scaled = cv2.resize(template, (150, 60))
+    screen[height // 2:height // 2 + 60, width // 2:width // 2 + 150] = scaled
+    return screen, template_path
+
+
+def measure_fps(func: Callable[[], object], min_time: float = 1.0) -> float:
+    """重复执行至少min_time秒，返回每秒执行次数"""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return count / elapsed
+
+
+def main():
+    library = TemplateLibrary()
+    matcher = TemplateMatcher(library)
+    with tempfile.TemporaryDirectory() as out_dir:
+        for name, (width, height) in RESOLUTIONS.items():
+            screen, template_path = build_case(width, height, out_dir)
+            template = library.get(template_path)
+            roi = (width // 4 - 50, height // 3 - 50, 300, 200)
+            cases = {
+                "baseline full frame": lambda: cv2.minMaxLoc(
+                    cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)),
+                "pyramid": lambda: matcher.find(screen, template_path),
+                "pyramid all matches": lambda: matcher.find(screen, template_path, max_results=None),
+                "pyramid roi": lambda: matcher.find(screen, template_path, roi=roi),
+                "baseline 3 scales": lambda: [cv2.minMaxLoc(cv2.matchTemplate(
+                    screen, cv2.resize(template, None, fx=scale, fy=scale), cv2.TM_CCOEFF_NORMED))
+                    for scale in (0.8, 1.0, 1.25)],
+                "pyramid 3 scales": lambda: matcher.find(screen, template_path, scales=(0.8, 1.0, 1.25),
+                                                         max_results=None)
+            }
+            for case, func in cases.items():
+                print("%-6s %-22s %8.1f frames/s" % (name, case, measure_fps(func)))
+
+
+if __name__ == '__main__':
+    main()
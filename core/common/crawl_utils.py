@@ -40,3 +40,462 @@ def gen_url_download_script(url):
         link.click();
         document.body.removeChild(link);
     """ % url
+
+
+def gen_find_element_script() -> str:
+    """
+    生成在页面内按selenium定位方式查找元素的脚本函数定义
+    findElements(by, value, parent)返回匹配元素数组，isDisplayed(element)近似判断元素是否可见
+    """
+    return """
+        function findElements(by, value, parent) {
+            parent = parent || document;
+            var doc = parent.ownerDocument || parent;
+            var nodes = [];
+            if (by === 'xpath') {
+                var result = doc.evaluate(value, parent, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+                for (var i = 0; i < result.snapshotLength; i++) {
+                    nodes.push(result.snapshotItem(i));
+                }
+                return nodes;
+            }
+            if (by === 'link text' || by === 'partial link text') {
+                var links = parent.querySelectorAll('a');
+                for (var j = 0; j < links.length; j++) {
+                    var text = (links[j].innerText || '').trim();
+                    if (by === 'link text' ? text === value : text.indexOf(value) > -1) {
+                        nodes.push(links[j]);
+                    }
+                }
+                return nodes;
+            }
+            var selector = value;
+            if (by === 'id') {
+                selector = '#' + CSS.escape(value);
+            } else if (by === 'name') {
+                selector = '[name="' + CSS.escape(value) + '"]';
+            } else if (by === 'class name') {
+                selector = '.' + CSS.escape(value);
+            }
+            return Array.prototype.slice.call(parent.querySelectorAll(selector));
+        }
+        function isDisplayed(element) {
+            if (!element || !element.isConnected) {
+                return false;
+            }
+            var style = window.getComputedStyle(element);
+            if (style.visibility === 'hidden' || style.display === 'none') {
+                return false;
+            }
+            return element.getClientRects().length > 0;
+        }
+    """
+
+
+def gen_wait_element_script() -> str:
+    """
+    生成通过MutationObserver等待元素出现的异步脚本
+    参数: by, value, parent, displayed, timeout(毫秒), callback
+    """
+    return gen_find_element_script() + """
+        var by = arguments[0], value = arguments[1], parent = arguments[2], displayed = arguments[3];
+        var timeout = arguments[4], done = arguments[arguments.length - 1];
+        var observer = null, timer = null, ticker = null, finished = false;
+        function check() {
+            var elements = findElements(by, value, parent);
+            if (elements.length > 0 && (!displayed || isDisplayed(elements[0]))) {
+                return elements[0];
+            }
+            return null;
+        }
+        function finish(element) {
+            if (finished) {
+                return;
+            }
+            finished = true;
+            if (observer) observer.disconnect();
+            clearTimeout(timer);
+            clearInterval(ticker);
+            done(element);
+        }
+        var found = check();
+        if (found) {
+            finish(found);
+        } else {
+            observer = new MutationObserver(function () {
+                var element = check();
+                if (element) finish(element);
+            });
+            observer.observe(document.documentElement, {
+                childList: true, subtree: true, attributes: true, characterData: displayed
+            });
+            if (displayed) {
+                // 可见性可能由样式表或布局变化引起而不产生DOM变更，低频补充检查
+                ticker = setInterval(function () {
+                    var element = check();
+                    if (element) finish(element);
+                }, 250);
+            }
+            timer = setTimeout(function () { finish(null); }, timeout);
+        }
+    """
+
+
+def gen_batch_locate_script() -> str:
+    """
+    生成一次查找多个命名定位的脚本，并在页面内记录DOM版本用于缓存校验
+    参数: queries{名称:[by, value]}, names需要查找的名称, attributes需要读取的属性, page_id, version
+    """
+    return gen_find_element_script() + """
+        var queries = arguments[0], names = arguments[1], attributes = arguments[2];
+        var pageId = arguments[3], version = arguments[4];
+        if (!window.__crawlerPageId) {
+            window.__crawlerPageId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+            window.__crawlerDomVersion = 0;
+            new MutationObserver(function () {
+                window.__crawlerDomVersion++;
+            }).observe(document.documentElement, {
+                childList: true, subtree: true, attributes: true, characterData: true
+            });
+        }
+        var stale = pageId !== window.__crawlerPageId || version !== window.__crawlerDomVersion;
+        if (stale) {
+            names = Object.keys(queries);
+        }
+        var results = {};
+        for (var i = 0; i < names.length; i++) {
+            var query = queries[names[i]];
+            var elements = findElements(query[0], query[1]);
+            var element = elements.length > 0 ? elements[0] : null;
+            var attrs = {};
+            if (element) {
+                for (var j = 0; j < attributes.length; j++) {
+                    attrs[attributes[j]] = element.getAttribute(attributes[j]);
+                }
+            }
+            results[names[i]] = {
+                found: element !== null,
+                count: elements.length,
+                element: element,
+                displayed: isDisplayed(element),
+                text: element ? (element.innerText || element.textContent || '').trim() : null,
+                attributes: attrs
+            };
+        }
+        return {
+            page_id: window.__crawlerPageId,
+            version: window.__crawlerDomVersion,
+            stale: stale,
+            results: results
+        };
+    """
+
+
+def gen_extract_fields_function() -> str:
+    """
+    生成在页面内按字段定义提取数据的脚本函数定义
+    extractFields(node, fields): fields为{字段名: [CSS选择器, 属性, 是否取全部]}，选择器为空时取node本身，
+    属性为text取文本，html取内部HTML，href/src取绝对链接，其他取同名属性，取全部时返回所有匹配元素的值列表
+    """
+    return """
+        function readValue(target, attribute) {
+            if (attribute === 'text') return (target.innerText || target.textContent || '').trim();
+            if (attribute === 'html') return target.innerHTML;
+            if ((attribute === 'href' || attribute === 'src') && target[attribute]) return target[attribute];
+            return target.getAttribute(attribute);
+        }
+        function extractFields(node, fields) {
+            var row = {};
+            for (var name in fields) {
+                var selector = fields[name][0], attribute = fields[name][1], all = fields[name][2];
+                if (all) {
+                    var targets = selector ? node.querySelectorAll(selector) : [node];
+                    var values = [];
+                    for (var i = 0; i < targets.length; i++) values.push(readValue(targets[i], attribute));
+                    row[name] = values;
+                } else {
+                    var target = selector ? node.querySelector(selector) : node;
+                    row[name] = target ? readValue(target, attribute) : null;
+                }
+            }
+            return row;
+        }
+    """
+
+
+def gen_extract_rows_script() -> str:
+    """
+    生成在页面内一次提取所有行的脚本
+    参数: rowSelector行CSS选择器, fields提取字段, root查找范围(为空时为整个页面), limit最多行数,
+    nextSelector下一页按钮的CSS选择器
+    返回: {rows: 行数据, total: 匹配的行数, next: 下一页信息(无可用的下一页时为null，href为空时需点击)}
+    """
+    return gen_extract_fields_function() + """
+        var rowSelector = arguments[0], fields = arguments[1], root = arguments[2] || document;
+        var limit = arguments[3], nextSelector = arguments[4];
+        var nodes = root.querySelectorAll(rowSelector);
+        var count = limit ? Math.min(limit, nodes.length) : nodes.length;
+        var rows = new Array(count);
+        for (var i = 0; i < count; i++) rows[i] = extractFields(nodes[i], fields);
+        if (nodes.length > 0) {
+            // 翻页后据此判断行是否已替换
+            nodes[0].setAttribute('data-crawler-page-marker', '1');
+            nodes[0].__crawlerPageText = nodes[0].textContent;
+        }
+        var next = null;
+        var link = nextSelector ? document.querySelector(nextSelector) : null;
+        if (link && !link.disabled && link.getAttribute('aria-disabled') !== 'true'
+                && !link.classList.contains('disabled')) {
+            var href = link.getAttribute('href');
+            var navigable = href && href.charAt(0) !== '#' && !/^javascript:/i.test(href) && !link.target;
+            next = {href: navigable ? link.href : null};
+        }
+        return {rows: rows, total: nodes.length, next: next};
+    """
+
+
+def gen_click_next_page_script() -> str:
+    """
+    生成点击下一页并等待行替换的异步脚本，用于不跳转页面的翻页
+    参数: nextSelector下一页按钮的CSS选择器, rowSelector行CSS选择器, wait最大等待毫秒, callback
+    返回: true->行已替换
+    """
+    return """
+        var nextSelector = arguments[0], rowSelector = arguments[1], wait = arguments[2];
+        var done = arguments[arguments.length - 1];
+        var link = document.querySelector(nextSelector);
+        if (!link) {
+            done(false);
+            return;
+        }
+        var observer = null, ticker = null, timer = null, finished = false;
+        function changed() {
+            var first = document.querySelector(rowSelector);
+            return !!first && (!first.hasAttribute('data-crawler-page-marker')
+                || first.textContent !== first.__crawlerPageText);
+        }
+        function finish(result) {
+            if (finished) return;
+            finished = true;
+            if (observer) observer.disconnect();
+            clearInterval(ticker);
+            clearTimeout(timer);
+            done(result);
+        }
+        function check() {
+            if (changed()) finish(true);
+        }
+        observer = new MutationObserver(check);
+        observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+        ticker = setInterval(check, 100);
+        timer = setTimeout(function () { finish(changed()); }, wait);
+        link.click();
+    """
+
+
+def gen_scroll_load_script() -> str:
+    """
+    生成滚动到底部并等待新内容的异步脚本，通过MutationObserver和scrollHeight变化判断，返回本批新增的子元素
+    参数: container滚动元素(为空时滚动页面), selector子元素CSS选择器(为空时只等待高度变化),
+    fields提取字段(为空时返回元素), wait最大等待毫秒, remove_seen是否移除已返回的子元素,
+    token本次遍历的标记(子元素标记为该值，再次遍历时使用新的标记，不受上次遍历影响), callback
+    """
+    return gen_extract_fields_function() + """
+        var container = arguments[0], selector = arguments[1], fields = arguments[2];
+        var wait = arguments[3], removeSeen = arguments[4], token = arguments[5] || '1';
+        var done = arguments[arguments.length - 1];
+        var scroller = container || document.scrollingElement || document.documentElement;
+        var root = container || document;
+        var startHeight = scroller.scrollHeight;
+        var observer = null, ticker = null, timer = null, finished = false;
+        if (removeSeen && fields && selector) {
+            var seen = root.querySelectorAll(selector);
+            for (var k = 0; k < seen.length; k++) {
+                if (seen[k].getAttribute('data-crawler-seen') === token) seen[k].remove();
+            }
+        }
+        function collect() {
+            var items = [];
+            if (!selector) return items;
+            var nodes = root.querySelectorAll(selector);
+            for (var i = 0; i < nodes.length; i++) {
+                if (nodes[i].getAttribute('data-crawler-seen') !== token) {
+                    nodes[i].setAttribute('data-crawler-seen', token);
+                    items.push(fields ? extractFields(nodes[i], fields) : nodes[i]);
+                }
+            }
+            return items;
+        }
+        function atBottom() {
+            return scroller.scrollTop + scroller.clientHeight >= scroller.scrollHeight - 1;
+        }
+        function finish(items) {
+            if (finished) return;
+            finished = true;
+            if (observer) observer.disconnect();
+            clearInterval(ticker);
+            clearTimeout(timer);
+            done({items: items, height: scroller.scrollHeight, changed: scroller.scrollHeight !== startHeight,
+                at_bottom: atBottom()});
+        }
+        function check() {
+            var items = collect();
+            if (items.length > 0 || (!selector && scroller.scrollHeight !== startHeight)) finish(items);
+        }
+        var initial = collect();
+        if (initial.length > 0) {
+            finish(initial);
+        } else {
+            scroller.scrollTop = scroller.scrollHeight - scroller.clientHeight;
+            observer = new MutationObserver(check);
+            observer.observe(container || document.documentElement, {childList: true, subtree: true});
+            ticker = setInterval(check, 100);
+            timer = setTimeout(function () { finish(collect()); }, wait);
+        }
+    """
+
+
+def gen_settle_script() -> str:
+    """
+    生成执行操作后等待页面稳定的异步脚本：readyState为complete、DOM在quiet毫秒内无变更、
+    fetch/XHR无进行中的请求且quiet毫秒内无新的资源加载
+    参数: element点击的元素(为空时不点击), signals检查的信号列表(ready_state/dom/network), quiet静默毫秒,
+    min_wait最少等待毫秒, max_wait最大等待毫秒, callback
+    返回: {elapsed, mutations, requests, timed_out, host}，点击失败时返回{error}
+    """
+    return """
+        var element = arguments[0], signals = arguments[1], quiet = arguments[2];
+        var minWait = arguments[3], maxWait = arguments[4], done = arguments[arguments.length - 1];
+        var useReady = signals.indexOf('ready_state') >= 0, useDom = signals.indexOf('dom') >= 0;
+        var useNetwork = signals.indexOf('network') >= 0;
+        var state = window.__crawlerNetwork;
+        if (useNetwork && !state) {
+            // 统计进行中的fetch/XHR请求，页面跳转后需重新注入
+            state = window.__crawlerNetwork = {inflight: 0, total: 0, last: Date.now()};
+            var begin = function () { state.inflight++; state.total++; state.last = Date.now(); };
+            var end = function () { state.inflight = Math.max(0, state.inflight - 1); state.last = Date.now(); };
+            if (window.fetch) {
+                var originalFetch = window.fetch;
+                window.fetch = function () {
+                    begin();
+                    return originalFetch.apply(this, arguments).then(
+                        function (response) { end(); return response; },
+                        function (error) { end(); throw error; });
+                };
+            }
+            var originalSend = XMLHttpRequest.prototype.send;
+            XMLHttpRequest.prototype.send = function () {
+                begin();
+                this.addEventListener('loadend', end);
+                return originalSend.apply(this, arguments);
+            };
+            if (window.PerformanceObserver) {
+                try {
+                    new PerformanceObserver(function () { state.last = Date.now(); })
+                        .observe({type: 'resource', buffered: false});
+                } catch (e) {}
+            }
+        }
+        var start = Date.now(), lastMutation = start, mutations = 0, requestsBefore = state ? state.total : 0;
+        var observer = null, ticker = null, finished = false;
+        function finish(timedOut) {
+            if (finished) return;
+            finished = true;
+            if (observer) observer.disconnect();
+            clearInterval(ticker);
+            done({elapsed: Date.now() - start, mutations: mutations,
+                requests: state ? state.total - requestsBefore : 0, timed_out: timedOut, host: location.host});
+        }
+        function check() {
+            var now = Date.now();
+            if (now - start >= maxWait) return finish(true);
+            if (now - start < minWait) return;
+            if (useReady && document.readyState !== 'complete') return;
+            if (useDom && now - lastMutation < quiet) return;
+            if (useNetwork && state && (state.inflight > 0 || now - state.last < quiet)) return;
+            finish(false);
+        }
+        if (useDom) {
+            observer = new MutationObserver(function (records) {
+                mutations += records.length;
+                lastMutation = Date.now();
+            });
+            observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true,
+                characterData: true});
+        }
+        if (element) {
+            try {
+                element.click();
+            } catch (e) {
+                if (observer) observer.disconnect();
+                return done({error: String(e)});
+            }
+        }
+        if (useNetwork && state) state.last = Math.max(state.last, Date.now() - quiet);
+        ticker = setInterval(check, 50);
+        check();
+    """
+
+
+def gen_capture_file_input_script() -> str:
+    """
+    生成捕获上传控件的异步脚本：点击触发元素，拦截脚本动态创建的input[type=file]的click/showPicker，
+    不弹出文件选择框，捕获到的控件保存在window.__crawlerUploadTarget
+    参数: trigger触发上传的元素, timeout等待毫秒, callback
+    返回: {captured, multiple, connected}，超时未捕获时使用页面中最后一个上传控件，没有时captured为false
+    """
+    return """
+        var trigger = arguments[0], timeout = arguments[1], done = arguments[arguments.length - 1];
+        if (!window.__crawlerFileInputs) {
+            window.__crawlerFileInputs = [];
+            var capture = function (input) {
+                if (window.__crawlerInterceptFileChooser) window.__crawlerFileInputs.push(input);
+            };
+            var isFileInput = function (node) {
+                return node instanceof HTMLInputElement && node.type === 'file';
+            };
+            ['click', 'showPicker'].forEach(function (name) {
+                var original = HTMLInputElement.prototype[name];
+                if (!original) return;
+                HTMLInputElement.prototype[name] = function () {
+                    if (isFileInput(this) && window.__crawlerInterceptFileChooser) return capture(this);
+                    return original.apply(this, arguments);
+                };
+            });
+            new MutationObserver(function (records) {
+                records.forEach(function (record) {
+                    record.addedNodes.forEach(function (node) {
+                        if (node.nodeType !== 1) return;
+                        if (isFileInput(node)) capture(node);
+                        node.querySelectorAll('input[type=file]').forEach(capture);
+                    });
+                });
+            }).observe(document.documentElement, {childList: true, subtree: true});
+        }
+        window.__crawlerFileInputs.length = 0;
+        window.__crawlerInterceptFileChooser = true;
+        var start = Date.now(), ticker = null;
+        function finish(input) {
+            clearInterval(ticker);
+            window.__crawlerInterceptFileChooser = false;
+            window.__crawlerUploadTarget = input || null;
+            done({captured: !!input, multiple: !!(input && input.multiple),
+                connected: !!(input && input.isConnected)});
+        }
+        function check() {
+            var inputs = window.__crawlerFileInputs;
+            if (inputs.length) return finish(inputs[inputs.length - 1]);
+            if (Date.now() - start >= timeout) {
+                var existing = document.querySelectorAll('input[type=file]');
+                finish(existing.length ? existing[existing.length - 1] : null);
+            }
+        }
+        try {
+            trigger.click();
+        } catch (e) {
+            window.__crawlerInterceptFileChooser = false;
+            return done({error: String(e)});
+        }
+        ticker = setInterval(check, 50);
+        check();
+    """
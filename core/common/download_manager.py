@@ -0,0 +1,322 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from os import PathLike
+from typing import Any, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.common.file_utils import delete_file
+from core.config.config import get_config_by_section
+from core.log.logger import logger
+from core.log.metrics import metrics
+
+RETRY_STATUS = {429, 500, 502, 503, 504}  # 可重试的响应码
+STATE_SAVE_CHUNKS = 64  # 分段下载每写入多少块保存一次进度
+RANGE_HEADERS = {"Accept-Encoding": "identity"}  # Range请求按原始字节计算，不能被透明解压
+
+
+class RetryableStatus(Exception):
+    """可重试的响应码"""
+
+    def __init__(self, status_code: int, retry_after: Optional[float]):
+        super().__init__("状态码%s" % status_code)
+        self.retry_after = retry_after  # Retry-After指定的等待时间/秒
+
+
+def check_status(response: requests.Response):
+    """响应码为429或5xx时抛出RetryableStatus"""
+    if response.status_code not in RETRY_STATUS:
+        return
+    retry_after = response.headers.get("Retry-After")
+    try:
+        retry_after = float(retry_after) if retry_after else None
+    except ValueError:
+        retry_after = None  # HTTP日期格式，按退避时间等待
+    raise RetryableStatus(response.status_code, retry_after)
+
+
+class DownloadManager:
+
+    def __init__(self, max_downloads: int = None, segments: int = None, segment_threshold: int = None,
+                 chunk_size: int = None, retries: int = None, backoff: float = None, timeout: float = None):
+        """
+        HTTP下载管理器，复用连接池，大文件分段并行下载，支持断点续传和失败重试
+        参数为空时读取download配置
+        :param max_downloads: 同时下载的文件数
+        :param segments: 大文件的分段数
+        :param segment_threshold: 超过多少字节时分段下载
+        :param chunk_size: 每次读取的字节数
+        :param retries: 失败重试次数
+        :param backoff: 重试的退避基数/秒，第n次重试等待backoff*2^n
+        :param timeout: 连接和读取超时时间/秒
+        """
+        self.max_downloads = self._get_option(max_downloads, "max_downloads")
+        self.segments = self._get_option(segments, "segments")
+        self.segment_threshold = self._get_option(segment_threshold, "segment_threshold")
+        self.chunk_size = self._get_option(chunk_size, "chunk_size")
+        self.retries = self._get_option(retries, "retries")
+        self.backoff = self._get_option(backoff, "backoff")
+        self.timeout = self._get_option(timeout, "timeout")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_downloads, pool_maxsize=self.max_downloads * self.segments)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_downloads, thread_name_prefix="download")
+        self._segment_executor = ThreadPoolExecutor(max_workers=self.max_downloads * self.segments,
+                                                    thread_name_prefix="download-segment")
+        self._lock = threading.Lock()
+        self.downloaded_bytes = 0  # 累计下载字节数
+        self.succeeded = 0  # 下载成功的文件数
+        self.failed = 0  # 下载失败的文件数
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _get_option(value: Any, option: str) -> Any:
+        return value if value is not None else get_config_by_section("download", option)
+
+    def load_driver_session(self, driver: Any):
+        """
+        从浏览器会话中同步cookie和user agent
+        :param driver: 浏览器驱动
+        """
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"),
+                                     path=cookie.get("path", "/"))
+        self.session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent;")
+
+    def close(self):
+        """等待未完成的下载并关闭连接"""
+        self._executor.shutdown(wait=True)
+        self._segment_executor.shutdown(wait=True)
+        self.session.close()
+
+    def submit(self, url: str, file_path: Union[PathLike, str]) -> Future:
+        """
+        提交下载任务，同时下载的文件数受max_downloads限制
+        :return: 结果为是否下载成功的Future
+        """
+        return self._executor.submit(self.download, url, file_path)
+
+    def download_all(self, items: list) -> list:
+        """
+        并行下载多个文件
+        :param items: [(文件链接, 完整的本地文件路径)]
+        :return: 每个文件是否下载成功
+        """
+        futures = [self.submit(url, file_path) for url, file_path in items]
+        return [future.result() for future in futures]
+
+    def download(self, url: str, file_path: Union[PathLike, str]) -> bool:
+        """
+        下载文件到本地，下载中的数据写入.part文件，完成后重命名
+        :param url: 文件链接
+        :param file_path: 完整的本地文件路径
+        :return: true->下载成功
+        """
+        file_path = os.fspath(file_path)
+        part_path = "%s.part" % file_path
+        try:
+            size, accept_ranges, validator = self._probe(url)
+            if accept_ranges and size >= self.segment_threshold and self.segments > 1:
+                success = self._download_segments(url, part_path, size, validator)
+            else:
+                success = self._download_stream(url, part_path, accept_ranges, size, validator)
+        except Exception as e:
+            logger.warning("下载文件失败：%s, %s" % (url, e))
+            success = False
+        with self._lock:
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+        if success:
+            os.replace(part_path, file_path)
+            delete_file(self._state_path(part_path))
+        return success
+
+    def _probe(self, url: str) -> tuple[int, bool, Optional[str]]:
+        """
+        获取文件大小、是否支持Range请求以及ETag/Last-Modified
+        与Range请求使用相同的请求头，得到原始内容而非压缩后内容的大小和校验值
+        """
+        try:
+            response = self.session.head(url, headers=RANGE_HEADERS, allow_redirects=True, timeout=self.timeout)
+            if response.status_code >= 400:
+                return 0, False, None
+        except requests.RequestException:
+            return 0, False, None
+        if response.headers.get("Content-Encoding", "identity").lower() != "identity":
+            # 服务器仍返回压缩内容时大小与Range按原始字节计算的位置不一致，不分段也不续传
+            logger.info("服务器返回压缩内容，改为单连接完整下载：%s" % url)
+            return 0, False, None
+        size = int(response.headers.get("Content-Length", 0))
+        accept_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        return size, accept_ranges and size > 0, validator
+
+    def _wait_retry(self, attempt: int, url: str, error: Exception):
+        delay = self.backoff * (2 ** attempt)
+        if isinstance(error, RetryableStatus) and error.retry_after is not None:
+            delay = max(delay, error.retry_after)
+        logger.warning("下载失败，%.1f秒后重试(%s/%s)：%s, %s" % (delay, attempt + 1, self.retries, url, error))
+        metrics.retry("download", "http")
+        time.sleep(delay)
+
+    def _download_stream(self, url: str, part_path: str, accept_ranges: bool, size: int,
+                         validator: Optional[str]) -> bool:
+        """
+        单连接下载，支持Range时从已下载的.part文件末尾续传
+        .part.json记录开始下载时的ETag/Last-Modified，文件已变化时重新下载
+        """
+        state_path = self._state_path(part_path)
+        for attempt in range(self.retries + 1):
+            offset = os.path.getsize(part_path) if accept_ranges and os.path.exists(part_path) else 0
+            if offset > 0 and self._load_state(state_path, url, size, validator) is None:
+                offset = 0  # 没有进度记录或源文件已变化，已下载的数据不可续用
+            headers = dict(RANGE_HEADERS) if accept_ranges else {}
+            if offset > 0:
+                headers["Range"] = "bytes=%s-" % offset
+                if validator:
+                    headers["If-Range"] = validator  # 源文件在探测之后变化时服务器返回完整内容
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    check_status(response)
+                    if response.status_code == 416:
+                        if offset > 0 and offset == self._range_total(response, size):
+                            return True  # .part文件已完整
+                        logger.warning("续传位置无效，重新下载：%s" % url)
+                        delete_file(part_path)
+                        continue
+                    if response.status_code not in (200, 206):
+                        logger.warning("下载文件失败：%s, 状态码%s" % (url, response.status_code))
+                        return False
+                    mode = "ab" if response.status_code == 206 else "wb"
+                    if mode == "wb" and accept_ranges:
+                        validator = response.headers.get("ETag") or response.headers.get("Last-Modified") or validator
+                        self._save_state(state_path, {"url": url, "size": size, "validator": validator}, self._lock)
+                    with open(part_path, mode) as file:
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            file.write(chunk)
+                            self._add_bytes(len(chunk))
+                return True
+            except (requests.RequestException, OSError, RetryableStatus) as e:
+                if attempt >= self.retries:
+                    logger.warning("下载文件失败：%s, %s" % (url, e))
+                    return False
+                self._wait_retry(attempt, url, e)
+        return False
+
+    @staticmethod
+    def _range_total(response: requests.Response, size: int) -> int:
+        """416响应的Content-Range中的文件总大小，没有时为探测到的大小"""
+        content_range = response.headers.get("Content-Range", "")
+        if content_range.startswith("bytes */"):
+            try:
+                return int(content_range[len("bytes */"):])
+            except ValueError:
+                pass
+        return size
+
+    def _download_segments(self, url: str, part_path: str, size: int, validator: Optional[str]) -> bool:
+        """按Range分段并行下载，进度记录在.part.json中用于续传"""
+        state_path = self._state_path(part_path)
+        state = self._load_state(state_path, url, size, validator)
+        if state is None or not os.path.exists(part_path) or os.path.getsize(part_path) != size:
+            segment_size = -(-size // self.segments)
+            state = {
+                "url": url,
+                "size": size,
+                "validator": validator,
+                "segments": [[start, min(start + segment_size, size) - 1, 0]
+                             for start in range(0, size, segment_size)]
+            }
+            with open(part_path, "wb") as file:
+                file.truncate(size)
+        state_lock = threading.Lock()
+        futures = [self._segment_executor.submit(self._download_segment, url, part_path, segment, state,
+                                                 state_path, state_lock)
+                   for segment in state["segments"] if segment[0] + segment[2] <= segment[1]]
+        results = [future.result() for future in futures]
+        return all(results)
+
+    def _download_segment(self, url: str, part_path: str, segment: list, state: dict, state_path: str,
+                          state_lock: threading.Lock) -> bool:
+        """下载单个分段 segment=[起始字节, 结束字节, 已下载字节数]"""
+        success = False
+        for attempt in range(self.retries + 1):
+            start = segment[0] + segment[2]
+            if start > segment[1]:
+                success = True
+                break
+            headers = dict(RANGE_HEADERS, Range="bytes=%s-%s" % (start, segment[1]))
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    check_status(response)
+                    if response.status_code != 206:
+                        logger.warning("分段下载失败：%s, 状态码%s" % (url, response.status_code))
+                        break
+                    with open(part_path, "r+b") as file:
+                        file.seek(start)
+                        for index, chunk in enumerate(response.iter_content(chunk_size=self.chunk_size), 1):
+                            chunk = chunk[:segment[1] - segment[0] - segment[2] + 1]
+                            file.write(chunk)
+                            segment[2] += len(chunk)
+                            self._add_bytes(len(chunk))
+                            if index % STATE_SAVE_CHUNKS == 0:
+                                # 定期保存进度，进程崩溃后不必重新下载整个分段；先写入文件再记录进度
+                                file.flush()
+                                self._save_state(state_path, state, state_lock)
+            except (requests.RequestException, OSError, RetryableStatus) as e:
+                if attempt >= self.retries:
+                    logger.warning("分段下载失败：%s, %s" % (url, e))
+                    break
+                self._save_state(state_path, state, state_lock)
+                self._wait_retry(attempt, url, e)
+        self._save_state(state_path, state, state_lock)
+        return success or segment[0] + segment[2] > segment[1]
+
+    @staticmethod
+    def _state_path(part_path: str) -> str:
+        return "%s.json" % part_path
+
+    @staticmethod
+    def _load_state(state_path: str, url: str, size: int, validator: Optional[str]) -> Optional[dict]:
+        """读取分段进度，文件已变化时返回None"""
+        if not os.path.exists(state_path):
+            return None
+        try:
+            with open(state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if state.get("url") != url or state.get("size") != size or state.get("validator") != validator:
+            return None
+        return state
+
+    @staticmethod
+    def _save_state(state_path: str, state: dict, state_lock: threading.Lock):
+        with state_lock:
+            with open(state_path, "w", encoding="utf-8") as file:
+                json.dump(state, file)
+
+    def _add_bytes(self, count: int):
+        with self._lock:
+            self.downloaded_bytes += count
+
+    def stats(self) -> dict:
+        """下载统计"""
+        with self._lock:
+            return {
+                "downloaded_bytes": self.downloaded_bytes,
+                "succeeded": self.succeeded,
+                "failed": self.failed
+            }
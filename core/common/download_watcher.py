@@ -0,0 +1,253 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from os import PathLike
+from typing import Optional, Union
+
+from core.common.file_utils import format_download_file_name
+from core.log.logger import logger
+
+TEMP_SUFFIXES = (".crdownload", ".part", ".tmp", ".download")  # 下载中的临时文件后缀
+
+# inotify事件，见<sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class DownloadWatcher:
+
+    def __init__(self, download_path: Union[PathLike, str], use_inotify: bool = True, poll_interval: float = 0.2,
+                 rescan_interval: float = 5.0):
+        """
+        下载文件夹监视器，维护归一化文件名->完成文件路径的索引，等待者无需反复扫描文件夹
+        Linux下订阅inotify事件，其他平台轮询文件夹修改时间，变化时才重新扫描
+        :param download_path: 下载文件夹
+        :param use_inotify: 是否尝试使用inotify
+        :param poll_interval: 轮询模式的检查间隔/秒
+        :param rescan_interval: 轮询模式下强制全量扫描的间隔/秒
+        """
+        self.download_path = os.fspath(download_path)
+        self.use_inotify = use_inotify and sys.platform.startswith("linux")
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self._index = {}  # 归一化文件名->{完整文件路径: None}，后缀不同的同名文件共用一个键，按加入顺序排列
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stop = threading.Event()
+        self._libc = None
+        self._fd = -1
+        self._wd = -1
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """建立初始索引并启动后台监视线程"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        if self.use_inotify and not self._init_inotify():
+            self.use_inotify = False
+        self.rescan()
+        target = self._run_inotify if self.use_inotify else self._run_polling
+        self._thread = threading.Thread(target=target, name="download-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监视"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+            self._wd = -1
+
+    @staticmethod
+    def is_temp_file(filename: str) -> bool:
+        """是否为下载中的临时文件"""
+        return filename.endswith(TEMP_SUFFIXES)
+
+    def rescan(self):
+        """全量扫描下载文件夹重建索引"""
+        index = {}
+        try:
+            with os.scandir(self.download_path) as entries:
+                for entry in entries:
+                    if entry.is_file() and not self.is_temp_file(entry.name):
+                        index.setdefault(format_download_file_name(entry.name), {})[entry.path] = None
+        except OSError:
+            pass
+        with self._condition:
+            self._index = index
+            self._condition.notify_all()
+
+    def _add(self, filename: str):
+        if self.is_temp_file(filename):
+            return
+        path = os.path.join(self.download_path, filename)
+        with self._condition:
+            paths = self._index.setdefault(format_download_file_name(filename), {})
+            paths.pop(path, None)
+            paths[path] = None  # 重新写入的文件排到最后
+            self._condition.notify_all()
+
+    def _remove(self, filename: str):
+        path = os.path.join(self.download_path, filename)
+        with self._condition:
+            key = format_download_file_name(filename)
+            paths = self._index.get(key)
+            if paths is not None:
+                paths.pop(path, None)
+                if not paths:
+                    del self._index[key]
+
+    def _lookup(self, filename: str) -> Optional[str]:
+        """在索引中查找，需持有锁"""
+        des_file = format_download_file_name(filename)
+        paths = self._index.get(des_file)
+        if paths is None:
+            # 兼容浏览器截断或改写文件名的情况，与原有endswith匹配规则一致
+            paths = next((paths for format_name, paths in self._index.items() if des_file.endswith(format_name)),
+                         None)
+            if paths is None:
+                return None
+        return self._choose(paths, filename)
+
+    @staticmethod
+    def _choose(paths: dict, filename: str) -> Optional[str]:
+        """
+        同一归一化文件名可能有多个文件(如report.pdf和report.xlsx)：优先完整文件名相同的，其次后缀相同的；
+        目标文件名没有后缀时取最近加入的
+        """
+        full_name = filename.replace(" ", "").replace("+", "").lower()
+        ext = os.path.splitext(full_name)[1]
+        same_ext = None
+        for path in paths:
+            name = os.path.basename(path).replace(" ", "").replace("+", "").lower()
+            if name == full_name:
+                return path
+            if ext and name.endswith(ext):
+                same_ext = path
+        if ext:
+            return same_ext
+        return next(reversed(paths))
+
+    def find(self, filename: str) -> Optional[str]:
+        """
+        查找已下载完成的文件
+        :param filename: 目标文件名
+        :return: 完整文件路径，找不到时返回None
+        """
+        with self._condition:
+            return self._lookup(filename)
+
+    def wait(self, filename: str, timeout: float = 30) -> Optional[str]:
+        """
+        等待文件下载完成
+        :param filename: 目标文件名
+        :param timeout: 等待最大时间/秒
+        :return: 完整文件路径，超时返回None
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                path = self._lookup(filename)
+                if path is not None:
+                    return path
+                remain = deadline - time.monotonic()
+                if remain <= 0:
+                    return None
+                self._condition.wait(remain)
+
+    def _init_inotify(self) -> bool:
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            logger.warning("inotify不可用，改为轮询监视下载文件夹：%s" % e)
+            return False
+        if self._fd < 0:
+            logger.warning("inotify初始化失败，改为轮询监视下载文件夹：%s" % os.strerror(ctypes.get_errno()))
+            return False
+        self._add_watch()
+        return True
+
+    def _add_watch(self) -> bool:
+        """监视下载文件夹，文件夹被删除重建后需重新添加"""
+        if not os.path.isdir(self.download_path):
+            return False
+        mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+        self._wd = self._libc.inotify_add_watch(self._fd, os.fsencode(self.download_path), mask)
+        return self._wd >= 0
+
+    def _run_inotify(self):
+        while not self._stop.is_set():
+            if self._wd < 0:
+                if self._add_watch():
+                    self.rescan()
+                else:
+                    self._stop.wait(self.poll_interval)
+                    continue
+            readable, _, _ = select.select([self._fd], [], [], self.poll_interval)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            self._handle_events(data)
+
+    def _handle_events(self, data: bytes):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.rescan()
+            elif mask & (IN_IGNORED | IN_DELETE_SELF):
+                self._wd = -1
+                self.rescan()
+            elif mask & IN_ISDIR or not name:
+                continue
+            elif mask & (IN_MOVED_FROM | IN_DELETE):
+                self._remove(name)
+            elif mask & (IN_MOVED_TO | IN_CREATE | IN_CLOSE_WRITE):
+                self._add(name)
+
+    def _run_polling(self):
+        last_mtime = None
+        last_scan = time.monotonic()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                mtime = os.stat(self.download_path).st_mtime_ns
+            except OSError:
+                mtime = None
+            now = time.monotonic()
+            if mtime != last_mtime or now - last_scan >= self.rescan_interval:
+                last_mtime = mtime
+                last_scan = now
+                self.rescan()
@@ -1,7 +1,10 @@
+import base64
+import csv
+import hashlib
 import json
 import os
 from os import PathLike
-from typing import Optional, Generator, Any, Union
+from typing import Optional, Generator, Any, Union, Iterable, Sequence
 
 import requests
 
@@ -37,14 +40,26 @@ def get_file_ext(filename: str) -> str:
         return filename.rsplit(".", 1)[1]
     return ""
 
-def download_file(url: str, file_path: Union[PathLike, str, bytes]) -> bool:
+def format_download_file_name(filename: str) -> str:
+    """归一化下载文件名，去掉空格和加号及后缀，用于匹配浏览器保存时改写过的文件名"""
+    filename = filename.replace(" ", "")
+    filename = filename.replace("+", "")
+    filename = filename.replace(" ", "")
+    return filename.split(".")[0]
+
+
+def download_file(url: str, file_path: Union[PathLike, str, bytes], timeout: float = 30, cache: Any = None) -> bool:
     """
-    下载文件到本地
+    下载文件到本地，批量或大文件下载使用DownloadManager
     :param url: 文件链接
     :param file_path: 完整的本地文件路径
+    :param timeout: 连接和读取超时时间/秒
+    :param cache: HttpCache，不为空时发送条件请求，内容未变化时不再下载
     :return: true->下载成功
     """
-    response = requests.get(url, stream=True)
+    if cache is not None:
+        return cache.fetch_to_file(url, file_path)
+    response = requests.get(url, stream=True, timeout=timeout)
     if response.status_code == 200:
         with open(file_path, "wb") as file:
             for chunk in response.iter_content(chunk_size=8192):
@@ -58,4 +73,71 @@ def delete_file(filepath: Union[PathLike, str, bytes]) -> bool:
         os.remove(filepath)
         return True
     except OSError:
-        return False
\ No newline at end of file
+        return False
+
+
+def file_hash(file_path: Union[PathLike, str], algorithm: str = "sha256", chunk_size: int = 1024 * 1024) -> str:
+    """计算文件的哈希值(十六进制)"""
+    digest = hashlib.new(algorithm)
+    with open(file_path, "rb") as file:
+        while True:
+            data = file.read(chunk_size)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def write_base64(data: str, file_path: Union[PathLike, str]) -> str:
+    """
+    解码base64数据并写入文件，如CDP返回的PDF，可在流水线的进程池中执行
+    :param data: base64数据
+    :param file_path: 文件路径
+    :return: 文件路径
+    """
+    with open(file_path, "wb") as file:
+        file.write(base64.b64decode(data))
+    return str(file_path)
+
+
+def write_jsonl(rows: Iterable[Any], file_path: Union[PathLike, str], append: bool = False) -> int:
+    """
+    逐行写入JSON Lines文件
+    :param rows: 可JSON序列化的数据
+    :param file_path: 文件路径
+    :param append: 是否追加写入
+    :return: 写入的行数
+    """
+    count = 0
+    with open(file_path, "a" if append else "w", encoding="utf-8") as file:
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False))
+            file.write("\n")
+            count += 1
+    return count
+
+
+def write_csv(rows: Iterable[dict], file_path: Union[PathLike, str], fieldnames: Sequence[str] = None,
+              append: bool = False) -> int:
+    """
+    逐行写入CSV文件，列表值以|连接
+    :param rows: 字典数据
+    :param file_path: 文件路径
+    :param fieldnames: 列名，为空时取第一行的字段
+    :param append: 是否追加写入，文件已有内容时不再写表头
+    :return: 写入的行数
+    """
+    count = 0
+    writer = None
+    has_header = append and os.path.exists(file_path) and os.path.getsize(file_path) > 0
+    with open(file_path, "a" if append else "w", encoding="utf-8" if has_header else "utf-8-sig",
+              newline="") as file:
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(file, fieldnames=list(fieldnames or row.keys()), extrasaction="ignore")
+                if not has_header:
+                    writer.writeheader()
+            writer.writerow({key: "|".join(map(str, value)) if isinstance(value, list) else value
+                             for key, value in row.items()})
+            count += 1
+    return count
@@ -0,0 +1,352 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from os import PathLike
+from typing import Any, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.common.file_utils import delete_file
+from core.config.config import get_config_by_section
+from core.log.logger import logger
+
+EVICT_INTERVAL = 300  # 按max_age淘汰的检查间隔/秒
+
+
+class CachedResponse:
+    """缓存读取结果"""
+
+    def __init__(self, url: str, status_code: int, content_path: Optional[str], content_hash: Optional[str],
+                 content_type: Optional[str], from_cache: bool, changed: bool):
+        self.url = url  # 请求链接
+        self.status_code = status_code  # 源站响应码，未发请求时为200
+        self.content_path = content_path  # 缓存内容文件路径，请求失败时为空
+        self.content_hash = content_hash  # 内容sha256
+        self.content_type = content_type  # Content-Type
+        self.from_cache = from_cache  # true->内容来自缓存(未过期或源站返回304)
+        self.changed = changed  # true->内容与上次缓存的不同
+
+    @property
+    def ok(self) -> bool:
+        return self.content_path is not None
+
+    def read(self) -> bytes:
+        """读取内容"""
+        with open(self.content_path, "rb") as file:
+            return file.read()
+
+
+class HttpCache:
+
+    def __init__(self, cache_dir: str = None, max_size: int = None, max_age: float = None, fresh_ttl: float = None,
+                 timeout: float = None, session: requests.Session = None):
+        """
+        基于磁盘的HTTP内容缓存，以URL为键保存ETag/Last-Modified，再次请求时发送条件请求，未变化的内容不再下载
+        相同内容按sha256只保存一份，按总大小和缓存时间淘汰
+        参数为空时读取http_cache配置
+        :param cache_dir: 缓存目录
+        :param max_size: 内容文件总大小上限/字节
+        :param max_age: 超过多久未重新验证的缓存被淘汰/秒
+        :param fresh_ttl: 缓存多久内直接使用，不发送请求/秒，0->每次都重新验证
+        :param timeout: 连接和读取超时时间/秒
+        :param session: 请求会话，为空时新建
+        """
+        self.cache_dir = self._get_option(cache_dir, "cache_dir")
+        self.max_size = self._get_option(max_size, "max_size")
+        self.max_age = self._get_option(max_age, "max_age")
+        self.fresh_ttl = self._get_option(fresh_ttl, "fresh_ttl")
+        self.timeout = self._get_option(timeout, "timeout")
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.objects_dir = os.path.join(self.cache_dir, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, "index.db"), check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT NOT NULL,
+                content_type TEXT,
+                size INTEGER NOT NULL,
+                validated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_hash ON entries (content_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+        self.requests = 0  # 请求次数
+        self.fresh_hits = 0  # 未过期直接命中次数
+        self.revalidated = 0  # 源站返回304次数
+        self.unchanged = 0  # 源站返回200但内容未变化次数
+        self.misses = 0  # 新下载或内容变化次数
+        self.deduplicated = 0  # 内容与其他URL相同、复用已有文件的次数
+        self.errors = 0  # 请求失败次数
+        self.bytes_downloaded = 0  # 实际下载字节数
+        self.bytes_saved = 0  # 命中缓存节省的字节数
+        self.evicted = 0  # 淘汰的条目数
+        self._stored_bytes = self._query_stored_bytes()  # 内容文件总大小，超过max_size时淘汰
+        self._next_evict_at = time.time() + EVICT_INTERVAL
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _get_option(value: Any, option: str) -> Any:
+        return value if value is not None else get_config_by_section("http_cache", option)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        self.session.close()
+
+    def load_driver_session(self, driver: Any):
+        """
+        从浏览器会话中同步cookie和user agent
+        :param driver: 浏览器驱动
+        """
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"),
+                                     path=cookie.get("path", "/"))
+        self.session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent;")
+
+    def _query_stored_bytes(self) -> int:
+        return self._conn.execute("""
+            SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM entries GROUP BY content_hash)
+        """).fetchone()[0]
+
+    def _object_path(self, content_hash: str) -> str:
+        return os.path.join(self.objects_dir, content_hash[:2], content_hash)
+
+    def _get_entry(self, url: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM entries WHERE url = ?", (url,)).fetchone()
+
+    def _touch(self, url: str, validated: bool):
+        now = time.time()
+        with self._lock:
+            if validated:
+                self._conn.execute("UPDATE entries SET validated_at = ?, accessed_at = ? WHERE url = ?",
+                                   (now, now, url))
+            else:
+                self._conn.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (now, url))
+
+    def fetch(self, url: str, headers: dict = None) -> CachedResponse:
+        """
+        获取链接内容，有缓存时发送If-None-Match/If-Modified-Since条件请求
+        :param url: 链接
+        :param headers: 额外的请求头
+        :return: CachedResponse，请求失败时content_path为空
+        """
+        entry = self._get_entry(url)
+        if entry is not None and not os.path.exists(self._object_path(entry["content_hash"])):
+            entry = None  # 内容文件已被删除，重新下载
+        with self._lock:
+            self.requests += 1
+        if entry is not None and self.fresh_ttl and time.time() - entry["validated_at"] < self.fresh_ttl:
+            self._touch(url, False)
+            with self._lock:
+                self.fresh_hits += 1
+                self.bytes_saved += entry["size"]
+            return self._from_entry(url, 200, entry)
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry["etag"]:
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = self.session.get(url, headers=request_headers, stream=True, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning("请求失败：%s, %s" % (url, e))
+            with self._lock:
+                self.errors += 1
+            return CachedResponse(url, 0, None, None, None, False, False)
+        with response:
+            if response.status_code == 304 and entry is not None:
+                self._touch(url, True)
+                with self._lock:
+                    self.revalidated += 1
+                    self.bytes_saved += entry["size"]
+                return self._from_entry(url, 304, entry)
+            if response.status_code != 200:
+                with self._lock:
+                    self.errors += 1
+                return CachedResponse(url, response.status_code, None, None, None, False, False)
+            tmp_path, content_hash, size = self._download(response)
+        now = time.time()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        content_type = response.headers.get("Content-Type")
+        changed = entry is None or entry["content_hash"] != content_hash
+        with self._lock:
+            # 放置内容文件和写入条目在同一把锁内完成，_delete_unreferenced和evict不会删除即将被引用的文件；
+            # 文件已被删除时用本次下载的数据重新写入
+            self._place_object(tmp_path, content_hash, size)
+            self._conn.execute("""
+                INSERT OR REPLACE INTO entries
+                    (url, etag, last_modified, content_hash, content_type, size, validated_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (url, etag, last_modified, content_hash, content_type, size, now, now))
+            if changed:
+                self.misses += 1
+            else:
+                self.unchanged += 1
+        if entry is not None and changed:
+            self._delete_unreferenced(entry["content_hash"])
+        self._evict_if_needed()
+        return CachedResponse(url, 200, self._object_path(content_hash), content_hash, content_type, False, changed)
+
+    def _from_entry(self, url: str, status_code: int, entry: sqlite3.Row) -> CachedResponse:
+        return CachedResponse(url, status_code, self._object_path(entry["content_hash"]), entry["content_hash"],
+                              entry["content_type"], True, False)
+
+    def _download(self, response: requests.Response) -> tuple[str, str, int]:
+        """边下载边计算sha256，写入临时文件，返回(临时文件路径, sha256, 大小)"""
+        tmp_path = os.path.join(self.objects_dir, "%s.tmp" % uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as file:
+                for chunk in response.iter_content(chunk_size=65536):
+                    digest.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            delete_file(tmp_path)
+            raise
+        with self._lock:
+            self.bytes_downloaded += size
+        return tmp_path, digest.hexdigest(), size
+
+    def _place_object(self, tmp_path: str, content_hash: str, size: int):
+        """临时文件移动为内容文件，内容已存在时丢弃临时文件，需持有锁"""
+        object_path = self._object_path(content_hash)
+        if os.path.exists(object_path):
+            self.deduplicated += 1
+            delete_file(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(tmp_path, object_path)
+            self._stored_bytes += size
+
+    def _delete_unreferenced(self, content_hash: str):
+        """删除不再被任何URL引用的内容文件"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM entries WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+            if row is None:
+                object_path = self._object_path(content_hash)
+                if os.path.exists(object_path):
+                    self._stored_bytes -= os.path.getsize(object_path)
+                delete_file(object_path)
+
+    def _evict_if_needed(self):
+        """总大小超过max_size或距上次检查超过EVICT_INTERVAL时淘汰"""
+        with self._lock:
+            needed = self._stored_bytes > self.max_size or time.time() >= self._next_evict_at
+        if needed:
+            self.evict()
+
+    def fetch_to_file(self, url: str, file_path: Union[PathLike, str], headers: dict = None) -> bool:
+        """
+        获取链接内容并保存到本地文件，内容未变化且本地文件已存在时不再写入
+        :param url: 链接
+        :param file_path: 完整的本地文件路径
+        :param headers: 额外的请求头
+        :return: true->成功
+        """
+        response = self.fetch(url, headers)
+        if not response.ok:
+            return False
+        if response.changed or not os.path.exists(file_path):
+            try:
+                shutil.copyfile(response.content_path, file_path)
+            except FileNotFoundError:
+                # 命中的内容文件在复制前被其他线程淘汰，删除缓存后重新下载
+                self.invalidate(url)
+                response = self.fetch(url, headers)
+                if not response.ok:
+                    return False
+                shutil.copyfile(response.content_path, file_path)
+        return True
+
+    def invalidate(self, url: str):
+        """删除链接的缓存"""
+        entry = self._get_entry(url)
+        if entry is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE url = ?", (url,))
+        self._delete_unreferenced(entry["content_hash"])
+
+    def evict(self) -> int:
+        """
+        淘汰超过max_age未重新验证的缓存，总大小超过max_size时按最近访问时间淘汰
+        相同内容只计算一次大小
+        :return: 淘汰的条目数
+        """
+        removed = []
+        with self._lock:
+            expired_before = time.time() - self.max_age
+            removed.extend(row["content_hash"] for row in self._conn.execute(
+                "SELECT content_hash FROM entries WHERE validated_at < ?", (expired_before,)))
+            self._conn.execute("DELETE FROM entries WHERE validated_at < ?", (expired_before,))
+            rows = self._conn.execute("""
+                SELECT content_hash, MAX(size) AS size, MAX(accessed_at) AS accessed_at
+                FROM entries GROUP BY content_hash ORDER BY accessed_at
+            """).fetchall()
+            total = sum(row["size"] for row in rows)
+            for row in rows:
+                if total <= self.max_size:
+                    break
+                count = self._conn.execute("DELETE FROM entries WHERE content_hash = ?",
+                                           (row["content_hash"],)).rowcount
+                removed.extend([row["content_hash"]] * count)
+                total -= row["size"]
+            self.evicted += len(removed)
+            self._next_evict_at = time.time() + EVICT_INTERVAL
+        for content_hash in set(removed):
+            self._delete_unreferenced(content_hash)
+        with self._lock:
+            self._stored_bytes = self._query_stored_bytes()
+        return len(removed)
+
+    def stats(self) -> dict:
+        """缓存统计，hit_rate为未下载内容的请求占比"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            stored_size = self._query_stored_bytes()
+            hits = self.fresh_hits + self.revalidated
+            return {
+                "requests": self.requests,
+                "fresh_hits": self.fresh_hits,
+                "revalidated": self.revalidated,
+                "unchanged": self.unchanged,
+                "misses": self.misses,
+                "deduplicated": self.deduplicated,
+                "errors": self.errors,
+                "hit_rate": hits / self.requests if self.requests else 0.0,
+                "unchanged_rate": (hits + self.unchanged) / self.requests if self.requests else 0.0,
+                "bytes_downloaded": self.bytes_downloaded,
+                "bytes_saved": self.bytes_saved,
+                "evicted": self.evicted,
+                "entries": entries,
+                "stored_bytes": stored_size
+            }
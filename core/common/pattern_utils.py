@@ -0,0 +1,61 @@
+import re
+from functools import lru_cache
+from typing import Optional, Iterable, Callable, Any
+
+
+@lru_cache(maxsize=1024)
+def compile_pattern(pattern: str, flags: int = 0) -> re.Pattern:
+    """编译并缓存正则"""
+    return re.compile(pattern, flags)
+
+
+class MultiPatternMatcher:
+
+    def __init__(self, patterns: dict[str, str], flags: int = 0):
+        """
+        多正则匹配器，候选对象只遍历一次，每个候选文本只读取一次并依次检查所有正则
+        :param patterns: {名称: 正则}，同一文本匹配多个正则时按顺序优先
+        :param flags: 正则标志
+        """
+        self.patterns = dict(patterns)
+        self.flags = flags
+        self._compiled = [(name, compile_pattern(pattern, flags)) for name, pattern in self.patterns.items()]
+
+    def search(self, text: str) -> Optional[str]:
+        """
+        在文本中搜索任一正则
+        :return: 第一个匹配的正则名称，均不匹配时返回None
+        """
+        for name, pattern in self._compiled:
+            if pattern.search(text):
+                return name
+        return None
+
+    def match_all(self, text: str) -> list:
+        """返回文本能匹配的所有正则名称"""
+        return [name for name, pattern in self._compiled if pattern.search(text)]
+
+    def find_first(self, candidates: Iterable[Any], key: Callable[[Any], str] = None) -> Optional[tuple[str, Any]]:
+        """
+        一次遍历候选对象，返回第一个匹配任一正则的对象
+        :param candidates: 候选对象，如窗口列表
+        :param key: 从候选对象取文本的函数，如lambda window: window.window_text()，为空时候选对象即文本
+        :return: (正则名称, 候选对象)，均不匹配时返回None
+        """
+        compiled = self._compiled
+        for candidate in candidates:
+            text = candidate if key is None else key(candidate)
+            for name, pattern in compiled:
+                if pattern.search(text):
+                    return name, candidate
+        return None
+
+
+@lru_cache(maxsize=256)
+def _get_multi_matcher(patterns: tuple, flags: int) -> MultiPatternMatcher:
+    return MultiPatternMatcher(dict(patterns), flags)
+
+
+def get_multi_matcher(patterns: dict[str, str], flags: int = 0) -> MultiPatternMatcher:
+    """获取缓存的多正则匹配器，相同的正则集合只编译一次"""
+    return _get_multi_matcher(tuple(patterns.items()), flags)
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import io
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Optional, Union, TYPE_CHECKING
+
+from core.config.config import get_config_by_section
+from core.log.logger import logger
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+FORMATS = {"png": "PNG", "jpg": "JPEG", "jpeg": "JPEG", "webp": "WEBP"}
+SIGNATURES = {"PNG": b"\x89PNG\r\n\x1a\n", "JPEG": b"\xff\xd8\xff", "WEBP": b"RIFF"}  # 已编码数据的文件头
+EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}  # 格式对应的文件后缀
+
+_counter = itertools.count()
+
+
+def unique_name(ext: str = "png") -> str:
+    """生成不重复的文件名：时间戳到微秒+进程号+进程内序号，无需等待"""
+    now = time.time()
+    return "%s%06d-%s-%s.%s" % (time.strftime("%Y%m%d%H%M%S", time.localtime(now)), int(now % 1 * 1000000),
+                                os.getpid(), next(_counter), ext)
+
+
+def difference_hash(image: Image.Image, size: int = 8) -> int:
+    """感知哈希(dHash)：缩小为灰度图后比较相邻像素，内容相同的截图哈希相同或只差几位"""
+    from PIL import Image
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def encode_frame(frame: Union[Image.Image, bytes], file_path: Union[os.PathLike, str], quality: int = 75) -> str:
+    """
+    按文件后缀的格式保存画面，已是目标格式的编码数据直接写入；模块级函数，可在流水线的进程池中执行
+    :param frame: PIL图片或已编码的图片数据
+    :param file_path: 保存路径
+    :param quality: jpeg/webp的质量，1-100
+    :return: 保存路径；未安装Pillow且需要转换格式时按数据的实际格式保存，后缀与file_path不同
+    """
+    file_path = str(file_path)
+    ext = os.path.splitext(file_path)[1].lstrip(".").lower()
+    image_format = FORMATS.get(ext, "PNG")
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    if isinstance(frame, (bytes, bytearray)):
+        if frame.startswith(SIGNATURES[image_format]):
+            # 已是目标格式，直接写入，不需要解码也不需要Pillow
+            with open(file_path, "wb") as file:
+                file.write(frame)
+            return file_path
+        try:
+            from PIL import Image
+        except ImportError:
+            return _write_original_format(frame, file_path, image_format)
+        frame = Image.open(io.BytesIO(frame))
+    if image_format == "PNG":
+        frame.save(file_path, "PNG", compress_level=1)
+    else:
+        if frame.mode not in ("RGB", "L"):
+            frame = frame.convert("RGB")
+        frame.save(file_path, image_format, quality=quality)
+    return file_path
+
+
+def _write_original_format(frame: bytes, file_path: str, image_format: str) -> str:
+    """未安装Pillow时无法转换格式，换成数据实际格式的后缀后直接写入，不以错误的后缀保存"""
+    actual_format = next((name for name, signature in SIGNATURES.items() if frame.startswith(signature)), None)
+    if actual_format is None:
+        raise Exception("未安装Pillow，无法将截图编码为%s格式：%s" % (image_format, file_path))
+    file_path = "%s.%s" % (os.path.splitext(file_path)[0], EXTENSIONS[actual_format])
+    logger.warning("未安装Pillow，无法将截图转换为%s格式，按原格式%s保存：%s" % (image_format, actual_format, file_path))
+    with open(file_path, "wb") as file:
+        file.write(frame)
+    return file_path
+
+
+class ScreenshotService:
+
+    def __init__(self, workers: int = None, image_format: str = None, quality: int = None, dedup: bool = None,
+                 hash_threshold: int = None, max_pending: int = None):
+        """
+        截图服务：调用线程只负责获取原始画面，解码、去重、编码和写文件在后台线程完成
+        同一通道的截图由同一后台线程按顺序处理，与上一帧感知哈希相近的截图不写入
+        参数为空时读取screenshot配置
+        :param workers: 后台线程数
+        :param image_format: 未指定文件名时的保存格式，png/jpeg/webp
+        :param quality: jpeg/webp的质量，1-100
+        :param dedup: 是否跳过与上一帧相同的截图，只对未指定文件名的截图生效
+        :param hash_threshold: 感知哈希的汉明距离不超过该值时视为相同
+        :param max_pending: 等待处理的截图数上限，超过时跳过新的自动命名截图，指定文件名的截图不跳过
+        """
+        self.workers = self._get_option(workers, "workers")
+        self.image_format = self._get_option(image_format, "format").lower()
+        self.quality = self._get_option(quality, "quality")
+        self.dedup = self._get_option(dedup, "dedup")
+        self.hash_threshold = self._get_option(hash_threshold, "hash_threshold")
+        self.max_pending = self._get_option(max_pending, "max_pending")
+        if self.image_format not in FORMATS:
+            raise ValueError("不支持的截图格式：%s" % self.image_format)
+        self._executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot-%s" % index)
+                           for index in range(self.workers)]
+        self._lock = threading.Lock()
+        self._last_hashes = {}  # 通道->上一帧的感知哈希
+        self._pending = 0
+        self.submitted = 0  # 提交的截图数
+        self.written = 0  # 写入的截图数
+        self.duplicates = 0  # 与上一帧相同被跳过的截图数
+        self.skipped_busy = 0  # 后台积压被跳过的截图数
+        self.failed = 0  # 处理失败的截图数
+        self.encode_time = 0.0  # 后台解码、编码和写入累计耗时/秒
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _get_option(value: Any, option: str) -> Any:
+        return value if value is not None else get_config_by_section("screenshot", option)
+
+    def close(self):
+        """等待所有截图写入"""
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+
+    def is_busy(self) -> bool:
+        """后台积压是否已达上限，调用方可据此跳过获取画面"""
+        with self._lock:
+            return self._pending >= self.max_pending
+
+    def new_filename(self) -> str:
+        """按配置的格式生成不重复的文件名"""
+        return unique_name("jpg" if self.image_format == "jpeg" else self.image_format)
+
+    def submit(self, frame: Union[Image.Image, bytes], directory: Union[os.PathLike, str], filename: str = None,
+               channel: str = "default", dedup: bool = None, skip_if_busy: bool = None) -> Optional[Future]:
+        """
+        提交截图
+        :param frame: PIL图片或已编码的图片数据(如浏览器返回的PNG)
+        :param directory: 保存目录
+        :param filename: 文件名，为空时生成不重复的文件名并按配置的格式保存
+        :param channel: 去重通道，如每个浏览器或窗口一个通道
+        :param dedup: 是否跳过与上一帧相同的截图，为空时只对未指定文件名的截图按配置去重
+        :param skip_if_busy: 后台积压时是否跳过，为空时只跳过未指定文件名的截图
+        :return: 结果为保存路径的Future，重复时结果为None；跳过时不提交并返回None
+        """
+        if skip_if_busy is None:
+            skip_if_busy = filename is None
+        with self._lock:
+            if skip_if_busy and self._pending >= self.max_pending:
+                self.skipped_busy += 1
+                return None
+            self._pending += 1
+            self.submitted += 1
+        if dedup is None:
+            dedup = self.dedup and filename is None
+        if filename is None:
+            filename = self.new_filename()
+        file_path = os.path.join(directory, filename)
+        executor = self._executors[hash(channel) % len(self._executors)]
+        return executor.submit(self._process, frame, file_path, channel, dedup)
+
+    def save(self, frame: Union[Image.Image, bytes], directory: Union[os.PathLike, str], filename: str = None,
+             channel: str = "default", wait: bool = False) -> Optional[str]:
+        """
+        提交截图，未指定文件名时生成不重复的文件名、按配置去重，后台积压时跳过
+        :param wait: 是否等待写入完成
+        :return: 保存路径；未等待时为计划写入的路径，截图重复或未安装Pillow需要转换格式时不会生成该文件；跳过时返回None
+        """
+        auto_named = filename is None
+        if auto_named:
+            filename = self.new_filename()
+        future = self.submit(frame, directory, filename, channel, self.dedup and auto_named, auto_named)
+        if future is None:
+            return None
+        if wait:
+            return future.result()
+        return os.path.join(directory, filename)
+
+    def _process(self, frame: Union[Image.Image, bytes], file_path: str, channel: str, dedup: bool) -> Optional[str]:
+        start = time.perf_counter()
+        try:
+            if dedup:
+                image, frame_hash = self._frame_hash(frame)
+                with self._lock:
+                    last_hash = self._last_hashes.get(channel)
+                if last_hash is not None and self._is_similar(frame_hash, last_hash):
+                    with self._lock:
+                        self.duplicates += 1
+                    return None
+                if image is None:
+                    image = frame
+                image_format = FORMATS.get(os.path.splitext(file_path)[1].lstrip(".").lower(), "PNG")
+                if not isinstance(frame, (bytes, bytearray)) or not frame.startswith(SIGNATURES[image_format]):
+                    frame = image  # 需要重新编码，复用已解码的图片
+            file_path = encode_frame(frame, file_path, self.quality)
+            with self._lock:
+                self.written += 1
+                if dedup:
+                    # 只以写入的截图为参照，逐帧缓慢变化的页面累计变化超过阈值后仍会保存
+                    self._last_hashes[channel] = frame_hash
+            return file_path
+        except Exception as e:
+            logger.warning("保存截图失败：%s, %s" % (file_path, e))
+            with self._lock:
+                self.failed += 1
+            return None
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.encode_time += time.perf_counter() - start
+
+    @staticmethod
+    def _frame_hash(frame: Union[Image.Image, bytes]) -> tuple[Optional[Image.Image], tuple[str, int]]:
+        """
+        去重用的哈希
+        :return: (解码后的图片，未安装Pillow时为None, (哈希类型, 哈希值))
+        """
+        if isinstance(frame, (bytes, bytearray)):
+            try:
+                from PIL import Image
+            except ImportError:
+                # 未安装Pillow时按编码数据的哈希去重，只能跳过完全相同的截图
+                return None, ("bytes", int.from_bytes(hashlib.blake2b(frame, digest_size=8).digest(), "big"))
+            frame = Image.open(io.BytesIO(frame))
+        return frame, ("dhash", difference_hash(frame))
+
+    def _is_similar(self, frame_hash: tuple[str, int], last_hash: tuple[str, int]) -> bool:
+        if frame_hash[0] != last_hash[0]:
+            return False
+        if frame_hash[0] == "bytes":
+            return frame_hash[1] == last_hash[1]
+        return bin(frame_hash[1] ^ last_hash[1]).count("1") <= self.hash_threshold
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"submitted": self.submitted, "written": self.written, "duplicates": self.duplicates,
+                    "skipped_busy": self.skipped_busy, "failed": self.failed, "pending": self._pending,
+                    "encode_time": self.encode_time}
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_screenshot_service() -> ScreenshotService:
+    """进程内共用的截图服务"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ScreenshotService()
+            atexit.register(_service.close)
+        return _service
@@ -1,7 +1,150 @@
 import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable
 
-with open("config/config.json", "r", encoding="utf-8") as file:
-    __config = json.load(file)
+CONFIG_PATH = os.environ.get("CRAWLER_CONFIG", "config/config.json")  # 配置文件路径，可由环境变量指定
+
+# 各节点必须存在的字段及类型，加载和热更新时校验，float字段也接受整数
+SCHEMA = {
+    "webdriver": {"browser_type": str, "download_path": str, "edge": dict, "chrome": dict, "pool": dict},
+    "logger": {"level": str, "save_path": str, "format": str, "when": str, "interval": int, "backup_count": int,
+               "encoding": str, "delay": bool, "utc": bool, "json": bool, "async": bool, "queue_size": int,
+               "batch_size": int, "flush_interval": float, "overflow": str, "sample_rate": float},
+    "metrics": {"enabled": bool, "trace_dir": str, "host": str, "port": int},
+    "download": {"max_downloads": int, "segments": int, "segment_threshold": int, "chunk_size": int, "retries": int,
+                 "backoff": float, "timeout": float},
+    "http_cache": {"cache_dir": str, "max_size": int, "max_age": float, "fresh_ttl": float, "timeout": float},
+    "schedule": {"db_path": str, "workers": int, "host_concurrency": int, "host_interval": float,
+                 "max_attempts": int, "retry_backoff": float, "poll_interval": float},
+    "frontier": {"db_path": str, "bloom_capacity": int, "bloom_error_rate": float, "host_buffer": int,
+                 "host_interval": float, "max_depth": int, "same_host_only": bool, "drop_params": list},
+    "screenshot": {"workers": int, "format": str, "quality": int, "dedup": bool, "hash_threshold": int,
+                   "max_pending": int},
+    "pacing": {"enabled": bool, "learn": bool, "default": dict, "sites": dict, "window": dict, "legacy_sleep": dict},
+    "reload": {"enabled": bool, "check_interval": float},
+    "checkpoint": {"enabled": bool, "journal_path": str, "compact_every": int, "fsync": bool},
+    "pipeline": {"queue_size": int, "start_method": str},
+    "crawl": {"download_dir": str}
+}
+
+_lock = threading.RLock()
+_config = None  # 当前配置，首次读取时加载
+_mtime = None  # 已加载的配置文件修改时间
+_checked_at = 0.0  # 上次检查文件修改时间的时刻
+_version = 0  # 配置版本，每次加载后加1，缓存可据此判断是否需要重建
+_listeners = []  # 热更新后调用的函数
+
+
+def validate_config(config: dict) -> list:
+    """
+    按SCHEMA校验配置
+    :param config: 配置
+    :return: 错误信息列表，为空表示通过
+    """
+    errors = []
+    for section, options in SCHEMA.items():
+        section_value = config.get(section)
+        if not isinstance(section_value, dict):
+            errors.append("缺少节点：%s" % section)
+            continue
+        for option, option_type in options.items():
+            if option not in section_value:
+                errors.append("缺少字段：%s.%s" % (section, option))
+                continue
+            value = section_value[option]
+            if option_type is float:
+                valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+            elif option_type is int:
+                valid = isinstance(value, int) and not isinstance(value, bool)
+            else:
+                valid = isinstance(value, option_type)
+            if not valid:
+                errors.append("字段类型错误：%s.%s应为%s，实际为%s" % (section, option, option_type.__name__,
+                                                            type(value).__name__))
+    return errors
+
+
+def _read_file() -> tuple[dict, float]:
+    mtime = os.stat(CONFIG_PATH).st_mtime
+    with open(CONFIG_PATH, "r", encoding="utf-8") as file:
+        config = json.load(file)
+    return config, mtime
+
+
+def _load():
+    """首次加载配置，校验失败时抛出异常"""
+    global _config, _mtime, _checked_at, _version
+    config, mtime = _read_file()
+    errors = validate_config(config)
+    if errors:
+        raise ValueError("配置文件校验失败：%s, %s" % (CONFIG_PATH, "; ".join(errors)))
+    _config, _mtime, _checked_at = config, mtime, time.monotonic()
+    _version += 1
+
+
+def reload_config(force: bool = False) -> bool:
+    """
+    配置文件修改后重新加载，新配置读取或校验失败时保留当前配置
+    :param force: 是否不比较修改时间直接重新加载
+    :return: 是否已加载新配置
+    """
+    global _config, _mtime, _checked_at, _version
+    with _lock:
+        if _config is None:
+            _load()
+            return True
+        _checked_at = time.monotonic()
+        try:
+            if not force and os.stat(CONFIG_PATH).st_mtime == _mtime:
+                return False
+            config, mtime = _read_file()
+        except (OSError, ValueError) as e:
+            logging.getLogger("selenium").warning("读取配置文件失败，继续使用当前配置：%s" % e)
+            return False
+        errors = validate_config(config)
+        if errors:
+            _mtime = mtime  # 同一个错误的文件不再重复加载
+            logging.getLogger("selenium").warning("配置文件校验失败，继续使用当前配置：%s" % "; ".join(errors))
+            return False
+        _config, _mtime = config, mtime
+        _version += 1
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener()
+        except Exception as e:
+            logging.getLogger("selenium").warning("配置更新回调失败：%s, %s" % (listener, e))
+    return True
+
+
+def _current() -> dict:
+    """当前配置，首次调用时加载；启用reload时每隔check_interval秒检查一次文件修改时间"""
+    config = _config
+    if config is None:
+        with _lock:
+            if _config is None:
+                _load()
+            return _config
+    reload = config["reload"]
+    if reload["enabled"] and time.monotonic() - _checked_at >= reload["check_interval"]:
+        reload_config()
+        return _config
+    return config
+
+
+def get_config_version() -> int:
+    """配置版本，每次加载或热更新后加1"""
+    _current()
+    return _version
+
+
+def add_reload_listener(listener: Callable[[], Any]):
+    """注册热更新后调用的函数，用于重建依赖配置的缓存"""
+    with _lock:
+        _listeners.append(listener)
 
 
 def get_config(option: str):
@@ -10,11 +153,24 @@ def get_config(option: str):
     :param option: [str]字段
     :return: [any]DEFAULT中字段对应的值
     """
-    if option in __config:
-        return __config[option]
+    config = _current()
+    if option in config:
+        return config[option]
     raise KeyError(option)
 
 
+def get_section(section: str) -> dict:
+    """
+    读取整个节点，SCHEMA中的字段已校验类型，调用方不应修改返回的字典
+    :param section: [str]对应节点
+    :return: [dict]节点的值
+    """
+    config = _current()
+    if section in config:
+        return config[section]
+    raise KeyError(section)
+
+
 def get_config_by_section(section: str, option: str):
     """
     读取当前配置对应字段的值
@@ -22,8 +178,9 @@ def get_config_by_section(section: str, option: str):
     :param option: [str]字段
     :return: [any]DEFAULT中字段对应的值
     """
-    if section in __config:
-        section_value = __config[section]
+    config = _current()
+    if section in config:
+        section_value = config[section]
         if option in section_value:
             return section_value[option]
-    raise KeyError(option)
\ No newline at end of file
+    raise KeyError(option)
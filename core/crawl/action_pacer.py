@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Optional, Callable, Generator
+
+from selenium.common.exceptions import WebDriverException, JavascriptException, TimeoutException
+
+from core.common.crawl_utils import gen_settle_script
+from core.config.config import get_config_by_section, get_config_version
+from core.log.logger import logger
+
+
+class PacingProfile:
+
+    def __init__(self, signals: list, quiet: float, max_wait: float, min_delay: float):
+        """
+        站点的等待策略
+        :param signals: 检查的就绪信号，ready_state/dom/network
+        :param quiet: DOM和网络静默多久视为稳定/秒
+        :param max_wait: 最大等待时间/秒
+        :param min_delay: 最少等待时间/秒，与学习到的最小值取较大者
+        """
+        self.signals = signals
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self.min_delay = min_delay
+
+    @classmethod
+    def from_dict(cls, data: dict, default: "PacingProfile" = None) -> "PacingProfile":
+        """由配置生成，未配置的字段取default"""
+        def get(option: str) -> Any:
+            return data[option] if option in data else getattr(default, option)
+        return cls(list(get("signals")), get("quiet"), get("max_wait"), get("min_delay"))
+
+
+class PacingStats:
+    """某类操作的等待统计，按最近的稳定耗时学习最少等待时间"""
+
+    def __init__(self, history_size: int):
+        self.history = deque(maxlen=history_size)  # 最近的稳定耗时/秒
+        self.count = 0  # 等待次数
+        self.timeouts = 0  # 达到最大等待时间的次数
+        self.waited = 0.0  # 累计等待时间/秒
+        self.saved = 0.0  # 相比固定等待节省的时间/秒
+
+    def learned_min(self, min_samples: int = 5) -> float:
+        """最近稳定耗时的第10百分位的80%，样本不足时为0"""
+        if len(self.history) < min_samples:
+            return 0.0
+        ordered = sorted(self.history)
+        return ordered[len(ordered) // 10] * 0.8
+
+
+class ActionPacer:
+
+    def __init__(self, learn: bool = None, history_size: int = 20):
+        """
+        操作节奏控制：操作后等待真实的就绪信号代替固定等待，并统计相比固定等待节省的时间
+        页面操作等待readyState、DOM静默和fetch/XHR网络静默；窗口操作等待UIA状态不再变化
+        站点策略和固定等待时间读取pacing配置
+        :param learn: 是否按历史稳定耗时学习每个站点和操作的最少等待时间
+        :param history_size: 学习使用的历史样本数
+        """
+        self.learn = learn if learn is not None else get_config_by_section("pacing", "learn")
+        self.history_size = history_size
+        self.default_profile = PacingProfile.from_dict(get_config_by_section("pacing", "default"))
+        self.profiles = {host: PacingProfile.from_dict(data, self.default_profile)
+                         for host, data in get_config_by_section("pacing", "sites").items()}
+        self.legacy_sleep = dict(get_config_by_section("pacing", "legacy_sleep"))  # 操作->原固定等待/秒，未配置的操作不统计节省
+        window = get_config_by_section("pacing", "window")
+        self.window_quiet = window["quiet"]
+        self.window_max_wait = window["max_wait"]
+        self.window_poll_interval = window["poll_interval"]
+        self._settle_script = gen_settle_script()
+        self._lock = threading.Lock()
+        self._stats = {}  # (站点, 操作)->PacingStats
+
+    def get_profile(self, host: str) -> PacingProfile:
+        """站点的等待策略，按域名及其上级域名匹配"""
+        parts = host.split(":")[0].split(".")
+        for index in range(len(parts)):
+            profile = self.profiles.get(".".join(parts[index:]))
+            if profile is not None:
+                return profile
+        return self.default_profile
+
+    def _get_stats(self, host: str, action: str) -> PacingStats:
+        key = (host, action)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = PacingStats(self.history_size)
+            return stats
+
+    def _record(self, host: str, action: str, waited: float, timed_out: bool, sample: bool = True):
+        """记录一次等待，sample为False时不作为学习样本"""
+        stats = self._get_stats(host, action)
+        with self._lock:
+            stats.count += 1
+            stats.waited += waited
+            if action in self.legacy_sleep:
+                stats.saved += self.legacy_sleep[action] - waited
+            if timed_out:
+                stats.timeouts += 1
+            elif sample:
+                stats.history.append(waited)
+
+    def _min_wait(self, host: str, action: str, profile: PacingProfile) -> float:
+        if not self.learn:
+            return profile.min_delay
+        with self._lock:
+            stats = self._stats.get((host, action))
+            return max(profile.min_delay, stats.learned_min() if stats is not None else 0.0)
+
+    def settle_page(self, driver: Any, action: str, host: str = "", element: Any = None) -> str:
+        """
+        执行操作后等待页面稳定，element不为空时在同一次脚本调用中点击该元素
+        :param driver: 浏览器驱动，需已设置足够的异步脚本超时时间
+        :param action: 操作名称，如click、input
+        :param host: 当前页面域名，用于选择站点策略，为空时使用默认策略
+        :param element: 需点击的元素
+        :return: 稳定后页面的域名，供下次调用使用
+        """
+        profile = self.get_profile(host) if host else self.default_profile
+        min_wait = self._min_wait(host, action, profile)
+        start = time.perf_counter()
+        try:
+            result = driver.execute_async_script(self._settle_script, element, profile.signals,
+                                                 int(profile.quiet * 1000), int(min_wait * 1000),
+                                                 int(profile.max_wait * 1000))
+            if "error" in result:
+                raise Exception("点击元素失败：%s" % result["error"])
+            timed_out = result["timed_out"]
+            new_host = result["host"]
+            sample = True
+        except (JavascriptException, TimeoutException) as e:
+            # 点击引起页面跳转时脚本所在的文档被卸载，改为等待新页面加载完成；
+            # 其他错误(如元素已失效)发生在点击之前，点击并未执行，直接抛出
+            if isinstance(e, JavascriptException) and "unload" not in str(e.msg).lower():
+                raise
+            logger.debug("等待页面稳定的脚本中断，改为等待页面加载：%s" % e.msg)
+            timed_out = not self._wait_ready_state(driver, profile.max_wait - (time.perf_counter() - start))
+            new_host = host
+            sample = False  # 页面跳转的等待时间不代表该操作的稳定耗时
+        self._record(host or new_host, action, time.perf_counter() - start, timed_out, sample)
+        return new_host
+
+    @staticmethod
+    def _wait_ready_state(driver: Any, timeout: float) -> bool:
+        deadline = time.perf_counter() + max(0.0, timeout)
+        while True:
+            try:
+                if driver.execute_script("return document.readyState;") == "complete":
+                    return True
+            except WebDriverException:
+                pass
+            if time.perf_counter() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def settle_window(self, fingerprint: Callable[[], Any], action: str, host: str = "window"):
+        """
+        执行窗口操作后等待UIA状态不再变化：连续window_quiet秒内fingerprint返回值不变
+        :param fingerprint: 读取窗口状态的函数，如窗口文本、子元素数和位置
+        :param action: 操作名称
+        :param host: 统计分组，如应用名称
+        """
+        start = time.perf_counter()
+        deadline = start + self.window_max_wait
+        min_wait = self._min_wait(host, action, self.default_profile) if self.learn else 0.0
+        last = self._safe_fingerprint(fingerprint)
+        stable_since = start
+        timed_out = False
+        while True:
+            time.sleep(self.window_poll_interval)
+            now = time.perf_counter()
+            current = self._safe_fingerprint(fingerprint)
+            if current != last:
+                last = current
+                stable_since = now
+            elif now - stable_since >= self.window_quiet and now - start >= min_wait:
+                break
+            if now >= deadline:
+                timed_out = True
+                break
+        self._record(host, action, time.perf_counter() - start, timed_out)
+
+    @staticmethod
+    def _safe_fingerprint(fingerprint: Callable[[], Any]) -> Any:
+        try:
+            return fingerprint()
+        except Exception as e:
+            return type(e).__name__  # 窗口关闭或重建也视为状态变化
+
+    def stats(self) -> dict:
+        """各站点和操作的等待次数、平均等待、超时次数、学习到的最少等待和相比固定等待节省的时间/秒"""
+        with self._lock:
+            result = {}
+            for (host, action), stats in self._stats.items():
+                result["%s:%s" % (host or "-", action)] = {
+                    "count": stats.count,
+                    "mean_wait": stats.waited / stats.count if stats.count else 0.0,
+                    "timeouts": stats.timeouts,
+                    "learned_min": stats.learned_min(),
+                    "saved": stats.saved
+                }
+            result["total_saved"] = sum(stats.saved for stats in self._stats.values())
+            return result
+
+
+def poll(times: int, interval: float, initial: float = None, backoff: float = 1.5) -> Generator[int, Any, None]:
+    """
+    代替固定间隔的轮询：总等待时间仍为times*interval，间隔从initial开始按backoff增长到interval
+    用法: for attempt in poll(6, 5): ...，首次立即返回，之后每次返回前等待
+    :param initial: 首次间隔/秒，为空时启用pacing则读取pacing.window.poll_initial，否则为interval即固定间隔
+    """
+    if initial is None:
+        enabled = get_config_by_section("pacing", "enabled")
+        initial = get_config_by_section("pacing", "window")["poll_initial"] if enabled else interval
+    deadline = time.monotonic() + times * interval
+    delay = min(initial, interval)
+    attempt = 0
+    while True:
+        yield attempt
+        attempt += 1
+        remain = deadline - time.monotonic()
+        if remain <= 0:
+            return
+        time.sleep(min(delay, remain))
+        delay = min(delay * backoff, interval)
+
+
+_pacer = None
+_pacer_version = None
+_pacer_lock = threading.Lock()
+
+
+def get_action_pacer() -> Optional[ActionPacer]:
+    """进程内共用的节奏控制器，pacing未启用时返回None，配置热更新后重建"""
+    global _pacer, _pacer_version
+    if not get_config_by_section("pacing", "enabled"):
+        return None
+    version = get_config_version()
+    with _pacer_lock:
+        if _pacer is None or _pacer_version != version:
+            _pacer = ActionPacer()
+            _pacer_version = version
+        return _pacer
@@ -0,0 +1,71 @@
+import threading
+from typing import Any, Sequence
+
+from core.common.crawl_utils import gen_batch_locate_script
+
+
+class BatchLocator:
+
+    def __init__(self, driver: Any):
+        """
+        批量定位器，一次execute_script查找多个命名定位，并按页面缓存结果
+        页面内的MutationObserver记录DOM版本，页面跳转或DOM变更后缓存失效
+        :param driver: 浏览器驱动
+        """
+        self.driver = driver
+        self._script = gen_batch_locate_script()
+        self._page_id = None  # 缓存所属页面的标识
+        self._version = None  # 缓存对应的DOM版本
+        self._cache = {}  # (by, value, attributes)->查找结果
+        self._lock = threading.Lock()
+        self.hits = 0  # 缓存命中的定位数
+        self.misses = 0  # 在页面内实际查找的定位数
+        self.round_trips = 0  # 与浏览器驱动的往返次数
+
+    def locate(self, locators: dict, attributes: Sequence[str] = (), validate: bool = True) -> dict:
+        """
+        批量查找元素
+        :param locators: {名称: (查找的类型, 查找类型对应的关键数据)}
+        :param attributes: 需要一并读取的属性名
+        :param validate: 全部命中缓存时是否仍向页面校验DOM版本，为False时只依赖invalidate()失效
+        :return: {名称: {found, count, element, displayed, text, attributes}}
+        """
+        attributes = tuple(attributes)
+        keys = {name: (by, value, attributes) for name, (by, value) in locators.items()}
+        with self._lock:
+            missing = [name for name, key in keys.items() if key not in self._cache]
+            if not missing and not validate:
+                self.hits += len(keys)
+                return {name: self._cache[key] for name, key in keys.items()}
+            queries = {name: [key[0], key[1]] for name, key in keys.items()}
+            response = self.driver.execute_script(self._script, queries, missing, list(attributes),
+                                                  self._page_id, self._version)
+            self.round_trips += 1
+            if response["stale"]:
+                self._cache.clear()
+            self._page_id = response["page_id"]
+            self._version = response["version"]
+            results = response["results"]
+            for name, result in results.items():
+                self._cache[keys[name]] = result
+            self.misses += len(results)
+            self.hits += len(keys) - len(results)
+            return {name: self._cache[key] for name, key in keys.items()}
+
+    def invalidate(self):
+        """清空缓存，页面跳转、切换窗口或iframe后调用"""
+        with self._lock:
+            self._cache.clear()
+            self._page_id = None
+            self._version = None
+
+    def stats(self) -> dict:
+        """缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "round_trips": self.round_trips,
+                "hit_rate": self.hits / total if total > 0 else 0.0
+            }
@@ -0,0 +1,64 @@
+import base64
+import threading
+from typing import Any
+
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.edge.options import Options as EdgeOptions
+
+from core.config.config import get_config_by_section, get_config_version
+
+OPTIONS_CLASSES = {"chrome": ChromeOptions, "edge": EdgeOptions}
+
+
+class DriverOptionsTemplate:
+
+    def __init__(self, browser_type: str, browser_config: dict):
+        """
+        预先解析的浏览器启动参数模板，每个会话由模板快速生成启动参数，避免重复读取配置和扩展文件
+        :param browser_type: chrome或edge
+        :param browser_config: webdriver下对应浏览器的配置
+        """
+        if browser_type not in OPTIONS_CLASSES:
+            raise ValueError("不支持的浏览器类型：%s" % browser_type)
+        self.browser_type = browser_type
+        self.remote = bool(browser_config.get("remote", False))  # 是否使用远程驱动
+        self.remote_server = browser_config.get("remote_server")  # 远程驱动地址
+        self.cdp_commands = list(browser_config.get("params", {}).items())  # 创建驱动后执行的CDP命令
+        self.scripts = list(browser_config.get("scripts", []))  # 创建驱动后执行的脚本
+        self.arguments = list(browser_config.get("arguments", []))  # 启动参数
+        self.prefs = browser_config.get("prefs")  # 浏览器首选项，各会话共用，不应修改
+        self.extensions = [self._encode_extension(path) for path in browser_config.get("extensions", [])]
+
+    @staticmethod
+    def _encode_extension(path: str) -> str:
+        """扩展文件只读取和编码一次，否则每个会话生成启动参数时都会重新读取"""
+        with open(path, "rb") as file:
+            return base64.b64encode(file.read()).decode("utf-8")
+
+    def new_options(self) -> Any:
+        """生成一份新的启动参数，调用方可继续修改"""
+        options = OPTIONS_CLASSES[self.browser_type]()
+        for argument in self.arguments:
+            options.add_argument(argument)
+        if self.prefs is not None:
+            options.add_experimental_option("prefs", self.prefs)
+        for extension in self.extensions:
+            options.add_encoded_extension(extension)
+        return options
+
+
+_templates = {}  # 浏览器类型->(配置版本, 模板)
+_templates_lock = threading.Lock()
+
+
+def get_options_template(browser_type: str) -> DriverOptionsTemplate:
+    """按当前配置获取浏览器的启动参数模板，配置热更新后重建"""
+    version = get_config_version()
+    with _templates_lock:
+        cached = _templates.get(browser_type)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    template = DriverOptionsTemplate(browser_type, get_config_by_section("webdriver", browser_type))
+    with _templates_lock:
+        _templates[browser_type] = (version, template)
+    return template
@@ -0,0 +1,238 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from typing import Callable, Any, Generator
+
+from core.config.config import get_config_by_section
+from core.crawl.web_crawl import WebCrawler
+from core.log.logger import logger, log_context
+
+
+class PooledSession:
+    """池内的浏览器会话"""
+
+    def __init__(self, session_id: int, driver: Any):
+        self.session_id = session_id  # 会话编号
+        self.driver = driver  # 浏览器驱动
+        self.pages = 0  # 已执行的任务(页面)数
+        self.leased_at = None  # 本次租用的开始时间
+
+
+class DriverPool:
+
+    def __init__(self, size: int = None, max_pages: int = None, lease_timeout: float = None,
+                 driver_factory: Callable[[], Any] = None):
+        """
+        浏览器会话池，预热多个浏览器驱动并租借给线程池中的任务
+        :param size: 会话数量，默认读取webdriver.pool.size
+        :param max_pages: 单个会话执行多少个任务后回收重建，默认读取webdriver.pool.max_pages
+        :param lease_timeout: 等待空闲会话的最大时间/秒，默认读取webdriver.pool.lease_timeout
+        :param driver_factory: 创建浏览器驱动的函数，默认按webdriver配置创建(本地或remote_server)
+        """
+        pool_config = get_config_by_section("webdriver", "pool")
+        self.size = size if size is not None else int(pool_config["size"])
+        self.max_pages = max_pages if max_pages is not None else int(pool_config["max_pages"])
+        self.lease_timeout = lease_timeout if lease_timeout is not None else float(pool_config["lease_timeout"])
+        self.driver_factory = driver_factory if driver_factory is not None else self.create_driver
+        self._idle = queue.LifoQueue()  # 空闲会话，后进先出以优先复用最近使用的会话
+        self._sessions = {}  # 会话编号->会话
+        self._lock = threading.Lock()
+        self._executor = None  # 执行任务的线程池
+        self._next_id = 0
+        self._closed = False
+        self._started_at = None
+        self._busy = 0  # 当前租出的会话数
+        self._busy_time = 0.0  # 会话累计租用时间/秒
+        self._leases = 0  # 累计租用次数
+        self._recycled = 0  # 因达到任务数上限回收的会话数
+        self._crashed = 0  # 因健康检查失败重建的会话数
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def create_driver() -> Any:
+        """按配置创建浏览器驱动"""
+        return WebCrawler().init_webdriver()
+
+    def start(self):
+        """并行预热所有会话并启动任务线程池"""
+        if self._executor is not None:
+            return
+        self._closed = False
+        self._started_at = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="driver-pool")
+        futures = [self._executor.submit(self._new_session) for _ in range(self.size)]
+        error = None
+        for future in futures:
+            try:
+                self._idle.put(future.result())
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            # 部分会话创建失败时退出已创建的驱动并关闭线程池，避免泄漏浏览器进程
+            logger.warning("预热浏览器会话失败：%s" % error)
+            self.close()
+            raise error
+
+    def close(self):
+        """关闭线程池并退出所有浏览器驱动"""
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            self._destroy_session(session)
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+    def _new_session(self) -> PooledSession:
+        """创建新会话"""
+        driver = self.driver_factory()
+        with self._lock:
+            self._next_id += 1
+            session = PooledSession(self._next_id, driver)
+            self._sessions[session.session_id] = session
+        return session
+
+    def _destroy_session(self, session: PooledSession):
+        """退出会话对应的浏览器驱动"""
+        with self._lock:
+            self._sessions.pop(session.session_id, None)
+        try:
+            session.driver.quit()
+        except Exception as e:
+            logger.warning("关闭浏览器会话%s失败：%s" % (session.session_id, e))
+
+    @staticmethod
+    def is_healthy(session: PooledSession) -> bool:
+        """检查会话的浏览器驱动是否仍可响应"""
+        try:
+            session.driver.execute_script("return 1;")
+            return True
+        except Exception as e:
+            logger.warning("浏览器会话%s健康检查失败：%s" % (session.session_id, e))
+            return False
+
+    def acquire(self, timeout: float = None) -> PooledSession:
+        """
+        租用一个空闲会话，崩溃的会话会被替换为新会话
+        :param timeout: 等待最大时间/秒，默认lease_timeout
+        :return: 租用的会话
+        """
+        if self._executor is None:
+            raise Exception("会话池未启动")
+        try:
+            session = self._idle.get(timeout=self.lease_timeout if timeout is None else timeout)
+        except queue.Empty:
+            raise TimeoutError("等待空闲浏览器会话超时")
+        if not self.is_healthy(session):
+            self._destroy_session(session)
+            with self._lock:
+                self._crashed += 1
+            try:
+                session = self._new_session()
+            except Exception:
+                self._idle.put(session)  # 保持空闲数量，下次租用时再次重建
+                raise
+        with self._lock:
+            self._busy += 1
+            self._leases += 1
+        session.leased_at = time.time()
+        return session
+
+    def release(self, session: PooledSession, check_health: bool = False):
+        """
+        归还会话，达到任务数上限或不健康时回收重建
+        :param session: 租用的会话
+        :param check_health: 是否在归还前做健康检查，任务出错时使用
+        """
+        session.pages += 1
+        with self._lock:
+            self._busy -= 1
+            self._busy_time += time.time() - session.leased_at
+        session.leased_at = None
+        if self._closed:
+            self._destroy_session(session)
+            return
+        if check_health and not self.is_healthy(session):
+            with self._lock:
+                self._crashed += 1
+        elif session.pages < self.max_pages:
+            self._idle.put(session)
+            return
+        else:
+            with self._lock:
+                self._recycled += 1
+        self._destroy_session(session)
+        try:
+            self._idle.put(self._new_session())
+        except Exception as e:
+            logger.warning("重建浏览器会话失败：%s" % e)
+            self._idle.put(session)  # 放回旧会话，下次租用时健康检查会再次尝试重建
+
+    @contextmanager
+    def lease(self, timeout: float = None) -> Generator[WebCrawler, Any, None]:
+        """租用会话，并以绑定该会话驱动的WebCrawler形式提供"""
+        session = self.acquire(timeout)
+        failed = False
+        crawler = None
+        try:
+            with log_context(session_id=getattr(session.driver, "session_id", None)):
+                crawler = WebCrawler(driver=session.driver)
+                yield crawler
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if crawler is not None:
+                crawler.close_resources()
+            self.release(session, check_health=failed)
+
+    def submit(self, job: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        提交任务到线程池，任务的第一个参数为租用到的WebCrawler
+        :param job: 任务函数 job(crawler, *args, **kwargs)
+        :return: 任务的Future
+        """
+        if self._executor is None:
+            raise Exception("会话池未启动")
+        return self._executor.submit(self._run_job, job, *args, **kwargs)
+
+    def map(self, job: Callable[..., Any], items: list) -> list:
+        """对每个数据并行执行任务 job(crawler, item)，按顺序返回结果"""
+        futures = [self.submit(job, item) for item in items]
+        return [future.result() for future in futures]
+
+    def _run_job(self, job: Callable[..., Any], *args, **kwargs) -> Any:
+        with self.lease() as crawler:
+            return job(crawler, *args, **kwargs)
+
+    def stats(self) -> dict:
+        """会话池的使用情况，utilisation为会话租用时间占总可用时间的比例"""
+        with self._lock:
+            busy_time = self._busy_time
+            now = time.time()
+            for session in self._sessions.values():
+                if session.leased_at is not None:
+                    busy_time += now - session.leased_at
+            elapsed = now - self._started_at if self._started_at else 0.0
+            capacity = elapsed * self.size
+            return {
+                "size": self.size,
+                "alive": len(self._sessions),
+                "busy": self._busy,
+                "idle": self._idle.qsize(),
+                "leases": self._leases,
+                "recycled": self._recycled,
+                "crashed": self._crashed,
+                "utilisation": busy_time / capacity if capacity > 0 else 0.0
+            }
@@ -0,0 +1,148 @@
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Optional, Any
+
+from selenium.webdriver.remote.webelement import WebElement
+
+from core.common.crawl_utils import gen_wait_element_script
+from core.log.logger import logger
+
+
+class ElementWaiter:
+
+    def __init__(self, driver: Any, use_script: bool = True, initial_interval: float = 0.05,
+                 max_interval: float = 1.0, backoff: float = 1.5, history_size: int = 1000,
+                 max_script_failures: int = 3):
+        """
+        元素等待器，优先在页面内注入MutationObserver事件等待，不允许执行脚本时退化为指数退避轮询
+        :param driver: 浏览器驱动
+        :param use_script: 是否使用页面脚本等待
+        :param initial_interval: 轮询的初始间隔/秒
+        :param max_interval: 轮询的最大间隔/秒
+        :param backoff: 轮询间隔的增长倍数
+        :param history_size: 保留的最近等待记录数
+        :param max_script_failures: 页面脚本连续失败多少次后不再尝试脚本等待
+        """
+        self.driver = driver
+        self.use_script = use_script
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_script_failures = max_script_failures
+        self._script = gen_wait_element_script()
+        self._script_timeout = None  # 已设置的脚本超时时间/秒
+        self._script_failures = 0  # 页面脚本连续失败次数
+        self._history = deque(maxlen=history_size)  # (方式, 是否找到, 耗时/秒)
+        self._lock = threading.Lock()
+
+    def wait(self, by: str, by_value: str, wait_time: float = 30, displayed: bool = False,
+             parent: WebElement = None) -> Optional[WebElement]:
+        """
+        等待元素出现
+        :param by: 查找的类型
+        :param by_value: 查找类型对应的关键数据
+        :param wait_time: 等待最大时间/秒
+        :param displayed: 是否要求元素可见
+        :param parent: 父元素，为空时在整个页面查找
+        :return: 找到的页面元素，超时返回None
+        """
+        start = time.perf_counter()
+        mode = "script"
+        element = None
+        script_failed = not self.use_script
+        if self.use_script:
+            try:
+                element = self._wait_by_script(by, by_value, wait_time, displayed, parent)
+                self._script_failures = 0
+            except Exception as e:
+                # 页面跳转等也会中断脚本，连续失败时才认为不允许注入脚本
+                script_failed = True
+                self._script_failures += 1
+                if self._script_failures >= self.max_script_failures:
+                    self.use_script = False
+                logger.warning("页面脚本等待失败，改为轮询等待：%s" % e)
+        if script_failed:
+            mode = "polling"
+            remain = wait_time - (time.perf_counter() - start)
+            element = self._wait_by_polling(by, by_value, remain, displayed, parent)
+        self._record(mode, element is not None, time.perf_counter() - start)
+        return element
+
+    def _wait_by_script(self, by: str, by_value: str, wait_time: float, displayed: bool,
+                        parent: Optional[WebElement]) -> Optional[WebElement]:
+        """通过异步脚本等待，一次往返直到元素出现或超时"""
+        self.ensure_script_timeout(wait_time + 5)
+        return self.driver.execute_async_script(self._script, by, by_value, parent, displayed,
+                                                int(wait_time * 1000))
+
+    def ensure_script_timeout(self, script_timeout: float):
+        """
+        保证驱动的异步脚本超时时间不小于script_timeout，只增不减
+        同一驱动的异步脚本都应经get_element_waiter(driver)取得的等待器设置，否则记录的超时时间与驱动不一致
+        """
+        with self._lock:
+            if self._script_timeout is None or self._script_timeout < script_timeout:
+                self.driver.set_script_timeout(script_timeout)
+                self._script_timeout = script_timeout
+
+    def _wait_by_polling(self, by: str, by_value: str, wait_time: float, displayed: bool,
+                         parent: Optional[WebElement]) -> Optional[WebElement]:
+        """指数退避轮询等待"""
+        finder = parent if parent is not None else self.driver
+        deadline = time.perf_counter() + wait_time
+        interval = self.initial_interval
+        while True:
+            elements = finder.find_elements(by, by_value)
+            if len(elements) > 0:
+                try:
+                    if not displayed or elements[0].is_displayed():
+                        return elements[0]
+                except Exception as e:
+                    logger.debug("检查元素可见性失败：%s" % e)
+            remain = deadline - time.perf_counter()
+            if remain <= 0:
+                return None
+            time.sleep(min(interval, remain))
+            interval = min(interval * self.backoff, self.max_interval)
+
+    def _record(self, mode: str, found: bool, duration: float):
+        with self._lock:
+            self._history.append((mode, found, duration))
+
+    def stats(self) -> dict:
+        """最近等待的耗时统计/秒"""
+        with self._lock:
+            history = list(self._history)
+        durations = sorted(item[2] for item in history)
+        count = len(durations)
+        if count == 0:
+            return {"count": 0, "found": 0, "timeout": 0, "script": 0, "polling": 0,
+                    "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        found = sum(1 for item in history if item[1])
+        script = sum(1 for item in history if item[0] == "script")
+        return {
+            "count": count,
+            "found": found,
+            "timeout": count - found,
+            "script": script,
+            "polling": count - script,
+            "mean": sum(durations) / count,
+            "p50": durations[int(count * 0.5)],
+            "p95": durations[min(count - 1, int(count * 0.95))],
+            "max": durations[-1]
+        }
+
+
+_waiters = weakref.WeakKeyDictionary()  # 浏览器驱动->元素等待器，驱动释放后自动移除
+_waiters_lock = threading.Lock()
+
+
+def get_element_waiter(driver: Any) -> ElementWaiter:
+    """获取浏览器驱动共用的元素等待器，同一驱动的等待统计和异步脚本超时时间只记录一份"""
+    with _waiters_lock:
+        waiter = _waiters.get(driver)
+        if waiter is None:
+            waiter = _waiters[driver] = ElementWaiter(driver)
+        return waiter
@@ -0,0 +1,137 @@
+import os
+from typing import Any, Optional, Generator, Iterable, Sequence
+
+from selenium.webdriver.remote.webelement import WebElement
+
+from core.common.crawl_utils import gen_extract_rows_script, gen_click_next_page_script
+from core.common.file_utils import write_jsonl, write_csv
+from core.crawl.element_waiter import get_element_waiter
+from core.log.logger import logger
+
+
+def normalize_fields(fields: dict) -> dict:
+    """
+    统一字段定义为{字段名: [CSS选择器, 属性, 是否取全部]}
+    字段值可简写为CSS选择器(取文本)或[CSS选择器, 属性]
+    """
+    normalized = {}
+    for name, field in fields.items():
+        if isinstance(field, str):
+            field = [field, "text"]
+        field = list(field)
+        if len(field) == 1:
+            field.append("text")
+        if len(field) == 2:
+            field.append(False)
+        if len(field) != 3:
+            raise ValueError("字段定义错误：%s" % name)
+        normalized[name] = field
+    return normalized
+
+
+class PageExtractor:
+
+    def __init__(self, driver: Any, element_waiter: Any = None):
+        """
+        页面内批量提取：按行选择器和字段定义一次execute_script返回所有行的JSON数据，支持翻页
+        :param driver: 浏览器驱动
+        :param element_waiter: 元素等待器，用于统一设置异步脚本超时时间
+        """
+        self.driver = driver
+        self.element_waiter = element_waiter
+        self._extract_script = gen_extract_rows_script()
+        self._click_next_script = gen_click_next_page_script()
+        self.round_trips = 0  # 与浏览器驱动的往返次数
+        self.rows = 0  # 累计提取的行数
+        self.pages = 0  # 累计提取的页数
+
+    def _extract_page(self, row_selector: str, fields: dict, root: Optional[WebElement], limit: Optional[int],
+                      next_selector: Optional[str]) -> dict:
+        result = self.driver.execute_script(self._extract_script, row_selector, fields, root, limit, next_selector)
+        self.round_trips += 1
+        self.pages += 1
+        self.rows += len(result["rows"])
+        return result
+
+    def extract(self, row_selector: str, fields: dict, root: WebElement = None, limit: int = None) -> list:
+        """
+        提取当前页面的所有行
+        :param row_selector: 行的CSS选择器，如table tbody tr
+        :param fields: 字段定义{字段名: CSS选择器或[CSS选择器, 属性, 是否取全部]}，选择器为空时取行本身
+        :param root: 查找范围，为空时为整个页面
+        :param limit: 最多提取的行数
+        :return: [{字段名: 值}]
+        """
+        return self._extract_page(row_selector, normalize_fields(fields), root, limit, None)["rows"]
+
+    def iter_pages(self, row_selector: str, fields: dict, next_selector: str = None, max_pages: int = None,
+                   page_timeout: float = 10, max_rows: int = None) -> Generator[tuple, Any, None]:
+        """
+        逐页提取，下一页为链接时直接打开，否则点击并等待行替换
+        :param row_selector: 行的CSS选择器
+        :param fields: 字段定义，同extract
+        :param next_selector: 下一页按钮的CSS选择器，为空时只提取当前页
+        :param max_pages: 最多提取的页数
+        :param page_timeout: 点击翻页后等待行替换的最大时间/秒
+        :param max_rows: 最多返回的行数
+        :return: 逐页返回(行列表, 下一页链接)，下一页需点击或已是最后一页时链接为None，可作为断点续传的游标
+        """
+        fields = normalize_fields(fields)
+        visited = {self.driver.current_url}
+        page = 0
+        count = 0
+        while True:
+            remain = None if max_rows is None else max_rows - count
+            result = self._extract_page(row_selector, fields, None, remain, next_selector)
+            page += 1
+            count += len(result["rows"])
+            next_page = result["next"]
+            if (max_rows is not None and count >= max_rows) or (max_pages is not None and page >= max_pages):
+                next_page = None
+            next_href = next_page["href"] if next_page is not None and next_page["href"] not in visited else None
+            yield result["rows"], next_href
+            if next_page is None:
+                return
+            if next_page["href"]:
+                if next_href is None:
+                    return
+                visited.add(next_href)
+                self.driver.get(next_href)
+                self.round_trips += 1
+            elif not self._click_next(next_selector, row_selector, page_timeout):
+                logger.info("翻页后内容未变化，停止提取：%s" % self.driver.current_url)
+                return
+
+    def iter_rows(self, row_selector: str, fields: dict, next_selector: str = None, max_pages: int = None,
+                  page_timeout: float = 10, max_rows: int = None) -> Generator[dict, Any, None]:
+        """
+        逐页提取并逐行返回，参数同iter_pages
+        :return: 逐行返回{字段名: 值}
+        """
+        for rows, _ in self.iter_pages(row_selector, fields, next_selector, max_pages, page_timeout, max_rows):
+            yield from rows
+
+    def _click_next(self, next_selector: str, row_selector: str, page_timeout: float) -> bool:
+        """点击下一页并等待行替换"""
+        waiter = self.element_waiter if self.element_waiter is not None else get_element_waiter(self.driver)
+        waiter.ensure_script_timeout(page_timeout + 5)
+        self.round_trips += 1
+        return self.driver.execute_async_script(self._click_next_script, next_selector, row_selector,
+                                                int(page_timeout * 1000))
+
+    def export(self, rows: Iterable[dict], file_path: str, fieldnames: Sequence[str] = None,
+               append: bool = False) -> int:
+        """
+        流式写入文件，按后缀选择格式：.csv为CSV，其他为JSON Lines
+        :param rows: 行数据，可为iter_rows的返回值
+        :param file_path: 文件路径
+        :param fieldnames: CSV列名，为空时取第一行的字段
+        :param append: 是否追加写入
+        :return: 写入的行数
+        """
+        if os.path.splitext(file_path)[1].lower() == ".csv":
+            return write_csv(rows, file_path, fieldnames, append)
+        return write_jsonl(rows, file_path, append)
+
+    def stats(self) -> dict:
+        return {"round_trips": self.round_trips, "pages": self.pages, "rows": self.rows}
@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Union, Optional, Sequence, Any
+
+import cv2
+import numpy as np
+
+
+class TemplateLibrary:
+
+    def __init__(self, capacity: int = 128):
+        """
+        模板图片库，模板只读取和灰度化一次，按(路径, 修改时间)做LRU缓存，文件更新后自动重新加载
+        :param capacity: 最多缓存的模板数
+        """
+        self.capacity = capacity
+        self._cache = OrderedDict()  # 绝对路径->(修改时间, 灰度图)
+        self._lock = threading.Lock()
+        self.hits = 0  # 缓存命中次数
+        self.loads = 0  # 从磁盘读取次数
+
+    def get(self, template_path: Union[os.PathLike, str]) -> np.ndarray:
+        """
+        获取灰度模板
+        :param template_path: 模板图片路径
+        :return: 灰度图
+        """
+        path = os.path.abspath(template_path)
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._cache.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+        template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            raise Exception("无法读取模板图片：%s" % template_path)
+        with self._lock:
+            self._cache[path] = (mtime, template)
+            self._cache.move_to_end(path)
+            self.loads += 1
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+        return template
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def to_gray(image: Any) -> np.ndarray:
+        """将截图(PIL图片或RGB数组)转为灰度图"""
+        frame = np.asarray(image)
+        if frame.ndim == 2:
+            return frame
+        if frame.shape[2] == 4:
+            return cv2.cvtColor(frame, cv2.COLOR_RGBA2GRAY)
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+
+    def match(self, screen: np.ndarray, template_path: Union[os.PathLike, str],
+              match_val: float = 0.8) -> Optional[tuple[Sequence[int], float, tuple[int, int]]]:
+        """
+        在灰度截图中匹配单个模板
+        :param screen: 灰度截图
+        :param template_path: 模板图片路径
+        :param match_val: 最低匹配度
+        :return: (左上角坐标, 匹配度, 模板(高, 宽))，未匹配时返回None
+        """
+        template = self.get(template_path)
+        if template.shape[0] > screen.shape[0] or template.shape[1] > screen.shape[1]:
+            return None
+        result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val < match_val:
+            return None
+        return max_loc, max_val, template.shape[:2]
+
+    def match_many(self, screen: np.ndarray, template_paths: Sequence[Union[os.PathLike, str]],
+                   match_val: float = 0.8) -> dict:
+        """
+        在同一帧灰度截图中匹配多个模板
+        :param screen: 灰度截图
+        :param template_paths: 模板图片路径
+        :param match_val: 最低匹配度
+        :return: {模板路径: match的结果}
+        """
+        return {template_path: self.match(screen, template_path, match_val) for template_path in template_paths}
+
+
+default_template_library = TemplateLibrary()  # WindowCrawler共用的模板库
+
+
+def match_templates(image: Any, template_paths: Sequence[Union[os.PathLike, str]], match_val: float = 0.8) -> dict:
+    """
+    在截图中匹配多个模板，模块级函数，可在流水线的进程池中执行，每个子进程各自缓存模板
+    :param image: 截图(PIL图片、RGB数组或灰度图)
+    :param template_paths: 模板图片路径
+    :param match_val: 最低匹配度
+    :return: {模板路径: 左上角坐标或None}
+    """
+    screen = default_template_library.to_gray(image)
+    results = default_template_library.match_many(screen, template_paths, match_val)
+    return {path: matched[0] if matched else None for path, matched in results.items()}
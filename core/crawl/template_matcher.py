@@ -0,0 +1,214 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Union, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from core.crawl.template_library import TemplateLibrary, default_template_library
+
+
+class TemplateMatch:
+    """模板匹配结果，坐标为截图中的像素坐标"""
+
+    def __init__(self, x: int, y: int, width: int, height: int, score: float, scale: float):
+        self.x = x  # 左上角横坐标
+        self.y = y  # 左上角纵坐标
+        self.width = width  # 匹配区域宽度
+        self.height = height  # 匹配区域高度
+        self.score = score  # 匹配度
+        self.scale = scale  # 命中的模板缩放比例
+
+    def __repr__(self):
+        return "TemplateMatch(x=%s, y=%s, width=%s, height=%s, score=%.3f, scale=%s)" % (
+            self.x, self.y, self.width, self.height, self.score, self.scale)
+
+    @property
+    def center(self) -> tuple[int, int]:
+        return self.x + self.width // 2, self.y + self.height // 2
+
+
+class Frame:
+
+    def __init__(self, screen: np.ndarray, levels: int):
+        """
+        一帧灰度截图及其图像金字塔，多个模板匹配时共用
+        :param screen: 灰度截图
+        :param levels: 金字塔层数，第n层为原图的1/2^n
+        """
+        self.pyramid = [screen]
+        for _ in range(levels):
+            if min(self.pyramid[-1].shape[:2]) < 32:
+                break
+            self.pyramid.append(cv2.pyrDown(self.pyramid[-1]))
+
+    @property
+    def screen(self) -> np.ndarray:
+        return self.pyramid[0]
+
+
+def non_max_suppression(matches: list, iou_threshold: float) -> list:
+    """按匹配度从高到低保留，去除与已保留结果重叠度超过iou_threshold的结果"""
+    kept = []
+    for match in sorted(matches, key=lambda item: item.score, reverse=True):
+        for other in kept:
+            overlap_w = min(match.x + match.width, other.x + other.width) - max(match.x, other.x)
+            overlap_h = min(match.y + match.height, other.y + other.height) - max(match.y, other.y)
+            if overlap_w <= 0 or overlap_h <= 0:
+                continue
+            overlap = overlap_w * overlap_h
+            union = match.width * match.height + other.width * other.height - overlap
+            if overlap / union > iou_threshold:
+                break
+        else:
+            kept.append(match)
+    return kept
+
+
+class TemplateMatcher:
+
+    def __init__(self, library: TemplateLibrary = None, pyramid_levels: int = 2, min_template_size: int = 12,
+                 coarse_slack: float = 0.15, max_candidates: int = 32, cache_size: int = 256):
+        """
+        模板匹配引擎：图像金字塔由粗到细搜索，支持感兴趣区域、多尺度和非极大值抑制的多结果匹配
+        :param library: 模板库，默认使用共享模板库
+        :param pyramid_levels: 最多下采样的层数
+        :param min_template_size: 下采样后模板的最小边长，小于该值时减少层数
+        :param coarse_slack: 粗匹配阈值相对最终阈值的放宽量
+        :param max_candidates: 每个尺度在粗匹配层保留的最多候选数，find的max_results为None时不限制
+        :param cache_size: 缓存的缩放模板数
+        """
+        self.library = library if library is not None else default_template_library
+        self.pyramid_levels = pyramid_levels
+        self.min_template_size = min_template_size
+        self.coarse_slack = coarse_slack
+        self.max_candidates = max_candidates
+        self.cache_size = cache_size
+        self._scaled = OrderedDict()  # (模板id, 缩放比例, 层数)->(原模板, 缩放后的模板)
+        self._lock = threading.Lock()
+
+    def prepare(self, screen: np.ndarray) -> Frame:
+        """为一帧灰度截图构建图像金字塔"""
+        return Frame(screen, self.pyramid_levels)
+
+    def _get_scaled(self, template: np.ndarray, scale: float, level: int) -> np.ndarray:
+        """获取按比例缩放并下采样到金字塔第level层的模板"""
+        key = (id(template), scale, level)
+        with self._lock:
+            cached = self._scaled.get(key)
+            if cached is not None and cached[0] is template:
+                self._scaled.move_to_end(key)
+                return cached[1]
+        factor = scale / (2 ** level)
+        if factor == 1:
+            scaled = template
+        else:
+            size = (max(1, round(template.shape[1] * factor)), max(1, round(template.shape[0] * factor)))
+            scaled = cv2.resize(template, size, interpolation=cv2.INTER_AREA if factor < 1 else cv2.INTER_LINEAR)
+        with self._lock:
+            self._scaled[key] = (template, scaled)
+            while len(self._scaled) > self.cache_size:
+                self._scaled.popitem(last=False)
+        return scaled
+
+    def _choose_level(self, template_shape: tuple, scale: float, frame: Frame) -> int:
+        """选择金字塔层数，保证下采样后的模板不小于min_template_size"""
+        min_side = min(template_shape[:2]) * scale
+        if min_side < self.min_template_size:
+            return 0
+        level = int(math.floor(math.log2(min_side / self.min_template_size)))
+        return max(0, min(level, self.pyramid_levels, len(frame.pyramid) - 1))
+
+    @staticmethod
+    def _peaks(result: np.ndarray, threshold: float, width: int, height: int, limit: Optional[int]) -> list:
+        """取result中不小于threshold的局部极大值，经非极大值抑制后返回[(x, y, score)]，limit为空时不限数量"""
+        local_max = result == cv2.dilate(result, np.ones((3, 3), np.uint8))
+        ys, xs = np.nonzero((result >= threshold) & local_max)
+        if len(xs) == 0:
+            return []
+        scores = result[ys, xs]
+        order = np.argsort(scores)[::-1]
+        if limit is not None:
+            order = order[:limit * 8]
+        candidates = [TemplateMatch(int(xs[i]), int(ys[i]), width, height, float(scores[i]), 1.0) for i in order]
+        return [(match.x, match.y, match.score) for match in non_max_suppression(candidates, 0.3)[:limit]]
+
+    def _match_scale(self, frame: Frame, template: np.ndarray, scale: float, match_val: float,
+                     roi: tuple, limit: Optional[int]) -> list:
+        """在单个尺度上由粗到细匹配，limit为空时返回全部结果"""
+        full = self._get_scaled(template, scale, 0)
+        th, tw = full.shape[:2]
+        rx, ry, rw, rh = roi
+        if th > rh or tw > rw:
+            return []
+        level = self._choose_level(template.shape, scale, frame)
+        screen = frame.screen
+        if level == 0:
+            result = cv2.matchTemplate(screen[ry:ry + rh, rx:rx + rw], full, cv2.TM_CCOEFF_NORMED)
+            return [TemplateMatch(rx + x, ry + y, tw, th, score, scale)
+                    for x, y, score in self._peaks(result, match_val, tw, th, limit)]
+        factor = 2 ** level
+        coarse_screen = frame.pyramid[level][ry // factor:(ry + rh) // factor, rx // factor:(rx + rw) // factor]
+        coarse = self._get_scaled(template, scale, level)
+        if coarse.shape[0] > coarse_screen.shape[0] or coarse.shape[1] > coarse_screen.shape[1]:
+            return []
+        result = cv2.matchTemplate(coarse_screen, coarse, cv2.TM_CCOEFF_NORMED)
+        # 返回全部结果时粗匹配层也不限制候选数，否则保留max_candidates个候选
+        coarse_limit = None if limit is None else max(limit, self.max_candidates)
+        peaks = self._peaks(result, match_val - self.coarse_slack, coarse.shape[1], coarse.shape[0], coarse_limit)
+        matches = []
+        margin = factor * 2
+        for x, y, _ in peaks:
+            # 在原图中以候选位置为中心细化
+            x0 = max(rx, rx + x * factor - margin)
+            y0 = max(ry, ry + y * factor - margin)
+            x1 = min(rx + rw, rx + x * factor + tw + margin)
+            y1 = min(ry + rh, ry + y * factor + th + margin)
+            if x1 - x0 < tw or y1 - y0 < th:
+                continue
+            refine = cv2.matchTemplate(screen[y0:y1, x0:x1], full, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(refine)
+            if max_val >= match_val:
+                matches.append(TemplateMatch(x0 + max_loc[0], y0 + max_loc[1], tw, th, float(max_val), scale))
+        return matches
+
+    def find(self, frame: Union[Frame, np.ndarray], template_path: Union[os.PathLike, str], match_val: float = 0.8,
+             roi: Optional[Sequence[int]] = None, scales: Sequence[float] = (1.0,), max_results: Optional[int] = 1,
+             iou_threshold: float = 0.3) -> list:
+        """
+        匹配模板
+        :param frame: prepare()返回的帧或灰度截图
+        :param template_path: 模板图片路径
+        :param match_val: 最低匹配度
+        :param roi: 感兴趣区域(x, y, 宽, 高)，为空时搜索整帧
+        :param scales: 模板的缩放比例，如(0.8, 1.0, 1.25)，用于不同DPI下截取的模板
+        :param max_results: 最多返回的结果数，为None时返回全部
+        :param iou_threshold: 非极大值抑制的重叠度阈值
+        :return: 按匹配度从高到低排序的TemplateMatch列表
+        """
+        if not isinstance(frame, Frame):
+            frame = self.prepare(frame)
+        height, width = frame.screen.shape[:2]
+        if roi is None:
+            roi = (0, 0, width, height)
+        else:
+            x, y = max(0, int(roi[0])), max(0, int(roi[1]))
+            roi = (x, y, min(width, int(roi[0] + roi[2])) - x, min(height, int(roi[1] + roi[3])) - y)
+        template = self.library.get(template_path)
+        matches = []
+        for scale in scales:
+            matches.extend(self._match_scale(frame, template, scale, match_val, roi, max_results))
+        matches = non_max_suppression(matches, iou_threshold)
+        return matches if max_results is None else matches[:max_results]
+
+    def find_many(self, frame: Union[Frame, np.ndarray], template_paths: Sequence[Union[os.PathLike, str]],
+                  match_val: float = 0.8, **kwargs) -> dict:
+        """在同一帧中匹配多个模板，共用图像金字塔，返回{模板路径: TemplateMatch列表}"""
+        if not isinstance(frame, Frame):
+            frame = self.prepare(frame)
+        return {template_path: self.find(frame, template_path, match_val, **kwargs) for template_path in template_paths}
+
+
+default_template_matcher = TemplateMatcher()  # WindowCrawler共用的匹配引擎
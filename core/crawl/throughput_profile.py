@@ -0,0 +1,158 @@
+import json
+import threading
+from typing import Any
+
+from core.config.config import get_config_by_section
+from core.log.logger import logger
+
+# 资源类型对应的链接模式，execute_cdp_cmd无法处理Fetch.requestPaused事件，因此按链接屏蔽
+RESOURCE_TYPE_PATTERNS = {
+    "Image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*", "*.bmp*", "*.avif*"],
+    "Font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "Media": ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.wav*", "*.m3u8*", "*.flv*", "*.m4a*"],
+    "Stylesheet": ["*.css*"]
+}
+
+DISABLE_ANIMATION_SCRIPT = """
+    (function () {
+        function inject() {
+            var style = document.createElement('style');
+            style.textContent = '*, *::before, *::after { animation: none !important;'
+                + ' transition: none !important; scroll-behavior: auto !important; }';
+            (document.head || document.documentElement).appendChild(style);
+        }
+        if (document.documentElement) {
+            inject();
+        } else {
+            document.addEventListener('DOMContentLoaded', inject);
+        }
+    })();
+"""
+
+
+class ThroughputProfile:
+
+    def __init__(self, enabled: bool = False, headless: bool = True, window_size: str = "1920,1080",
+                 block_resource_types: list = None, block_url_patterns: list = None,
+                 disable_animations: bool = True):
+        """
+        高吞吐浏览器配置：无头运行、屏蔽指定类型资源和链接、关闭动画，并统计每页的请求和流量
+        :param enabled: 是否启用
+        :param headless: 是否无头运行
+        :param window_size: 无头模式的窗口大小
+        :param block_resource_types: 屏蔽的资源类型，见RESOURCE_TYPE_PATTERNS
+        :param block_url_patterns: 额外屏蔽的链接模式，支持*通配
+        :param disable_animations: 是否关闭动画和过渡效果
+        """
+        self.enabled = enabled
+        self.headless = headless
+        self.window_size = window_size
+        self.block_resource_types = block_resource_types or []
+        self.block_url_patterns = block_url_patterns or []
+        self.disable_animations = disable_animations
+        self._lock = threading.Lock()
+        self.totals = {"pages": 0, "requests": 0, "blocked_requests": 0, "transferred_bytes": 0}
+
+    @classmethod
+    def from_config(cls) -> "ThroughputProfile":
+        """读取webdriver.throughput配置"""
+        try:
+            config = get_config_by_section("webdriver", "throughput")
+        except KeyError:
+            return cls()
+        return cls(**config)
+
+    def get_blocked_patterns(self) -> list:
+        """需要屏蔽的全部链接模式"""
+        patterns = []
+        for resource_type in self.block_resource_types:
+            if resource_type not in RESOURCE_TYPE_PATTERNS:
+                logger.warning("不支持屏蔽的资源类型：%s" % resource_type)
+                continue
+            patterns.extend(RESOURCE_TYPE_PATTERNS[resource_type])
+        patterns.extend(self.block_url_patterns)
+        return patterns
+
+    def apply_options(self, options: Any, browser_type: str):
+        """
+        在创建驱动前修改启动参数
+        :param options: ChromeOptions或EdgeOptions
+        :param browser_type: chrome或edge，用于选择日志能力的前缀
+        """
+        if self.headless:
+            options.arguments[:] = [argument for argument in options.arguments if argument != "--start-maximized"]
+            options.add_argument("--headless=new")
+            options.add_argument("--window-size=%s" % self.window_size)
+        prefix = "ms" if browser_type == "edge" else "goog"
+        options.set_capability("%s:loggingPrefs" % prefix, {"performance": "ALL"})
+
+    def apply_driver(self, driver: Any):
+        """在驱动创建后通过CDP设置资源屏蔽和关闭动画"""
+        if not hasattr(driver, "execute_cdp_cmd"):
+            logger.warning("远程驱动不支持CDP命令，跳过资源屏蔽设置")
+            return
+        driver.execute_cdp_cmd("Network.enable", {})
+        patterns = self.get_blocked_patterns()
+        if patterns:
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        if self.disable_animations:
+            driver.execute_cdp_cmd("Emulation.setEmulatedMedia", {
+                "features": [{"name": "prefers-reduced-motion", "value": "reduce"}]
+            })
+            driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": DISABLE_ANIMATION_SCRIPT})
+
+    def collect(self, driver: Any) -> dict:
+        """
+        读取自上次调用以来的网络日志，统计请求数、被屏蔽的请求数和传输字节数
+        :param driver: 浏览器驱动
+        :return: {requests, blocked_requests, transferred_bytes, blocked_by_type}
+        """
+        report = {"requests": 0, "blocked_requests": 0, "transferred_bytes": 0, "blocked_by_type": {}}
+        try:
+            entries = driver.get_log("performance")
+        except Exception as e:
+            logger.warning("读取浏览器网络日志失败：%s" % e)
+            return report
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            method = message.get("method")
+            params = message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                report["requests"] += 1
+            elif method == "Network.loadingFinished":
+                report["transferred_bytes"] += int(params.get("encodedDataLength", 0))
+            elif method == "Network.loadingFailed" and params.get("blockedReason"):
+                report["blocked_requests"] += 1
+                resource_type = params.get("type", "Other")
+                report["blocked_by_type"][resource_type] = report["blocked_by_type"].get(resource_type, 0) + 1
+        with self._lock:
+            self.totals["pages"] += 1
+            self.totals["requests"] += report["requests"]
+            self.totals["blocked_requests"] += report["blocked_requests"]
+            self.totals["transferred_bytes"] += report["transferred_bytes"]
+        return report
+
+    def compare_page(self, driver: Any, url: str) -> dict:
+        """
+        分别在不屏蔽和屏蔽资源的情况下加载同一页面，测量节省的请求数和字节数
+        :param driver: 浏览器驱动
+        :param url: 网页链接
+        :return: {baseline, profile, saved_requests, saved_bytes}
+        """
+        self.collect(driver)
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+        try:
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+            driver.get(url)
+            baseline = self.collect(driver)
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.get_blocked_patterns()})
+            driver.get(url)
+            profile = self.collect(driver)
+        finally:
+            driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": False})
+        return {
+            "baseline": baseline,
+            "profile": profile,
+            "saved_requests": baseline["requests"] - profile["requests"] + profile["blocked_requests"],
+            "saved_bytes": baseline["transferred_bytes"] - profile["transferred_bytes"]
+        }
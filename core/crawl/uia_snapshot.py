@@ -0,0 +1,235 @@
+import threading
+from typing import Any, Optional, Sequence, Callable
+
+from core.common.pattern_utils import compile_pattern
+
+
+class UiaTreeProvider:
+    """
+    读取UI自动化树的接口，默认实现基于pywinauto的UIAWrapper
+    测试时可替换为返回内存节点的实现
+    """
+
+    @staticmethod
+    def children(node: Any) -> list:
+        """节点的直接子节点"""
+        return node.children()
+
+    @staticmethod
+    def describe(node: Any) -> tuple[Any, str, str, str]:
+        """
+        节点信息
+        :return: (唯一标识, automation_id, control_type, 文本)
+        """
+        info = node.element_info
+        runtime_id = info.runtime_id
+        key = tuple(runtime_id) if runtime_id else id(node)
+        return key, str(info.automation_id), str(info.control_type), node.window_text()
+
+
+class NodeRecord:
+    """快照中的节点"""
+    __slots__ = ("key", "path", "parent_key", "automation_id", "control_type", "text", "node", "child_keys")
+
+    def __init__(self, key: Any, path: tuple, parent_key: Any, automation_id: str, control_type: str, text: str,
+                 node: Any):
+        self.key = key  # 唯一标识
+        self.path = path  # 从根节点开始的子节点序号，用于保持文档顺序
+        self.parent_key = parent_key  # 父节点标识
+        self.automation_id = automation_id
+        self.control_type = control_type
+        self.text = text
+        self.node = node  # 原始节点(UIAWrapper)
+        self.child_keys = []  # 子节点标识
+
+
+class UiaSnapshot:
+
+    def __init__(self, roots: Sequence[Any], provider: UiaTreeProvider = None, max_depth: int = None,
+                 roots_getter: Callable[[], Sequence[Any]] = None):
+        """
+        UI自动化树快照，一次遍历后按automation_id、control_type和文本建立索引，查询不再跨进程遍历
+        界面变化后可只刷新指纹变化的子树
+        :param roots: 根节点，如app.windows()
+        :param provider: 树读取接口
+        :param max_depth: 最大遍历深度，为空时不限制
+        :param roots_getter: 重新获取根节点的函数，如app.windows，用于发现快照之后打开的窗口和对话框
+        """
+        self.roots = list(roots)
+        self.roots_getter = roots_getter
+        self.provider = provider if provider is not None else UiaTreeProvider()
+        self.max_depth = max_depth
+        self._records = {}  # 标识->NodeRecord
+        self._root_keys = []
+        self._by_automation_id = {}  # automation_id->{标识: None}
+        self._by_control_type = {}  # control_type->{标识: None}
+        self._by_text = {}  # 文本->{标识: None}
+        self._lock = threading.RLock()
+        self.visited = 0  # 累计读取的节点数
+        self.capture()
+
+    def __len__(self):
+        return len(self._records)
+
+    def capture(self):
+        """全量遍历所有根节点"""
+        with self._lock:
+            self._records.clear()
+            self._root_keys = []
+            self._by_automation_id.clear()
+            self._by_control_type.clear()
+            self._by_text.clear()
+            for index, root in enumerate(self.roots):
+                self._root_keys.append(self._walk(root, (index,), None, 0))
+
+    def _walk(self, node: Any, path: tuple, parent_key: Any, depth: int) -> Any:
+        """遍历子树并写入索引，返回子树根节点标识"""
+        key, automation_id, control_type, text = self.provider.describe(node)
+        self.visited += 1
+        record = NodeRecord(key, path, parent_key, automation_id, control_type, text, node)
+        self._records[key] = record
+        self._index(self._by_automation_id, automation_id, key)
+        self._index(self._by_control_type, control_type, key)
+        self._index(self._by_text, text, key)
+        if self.max_depth is None or depth < self.max_depth:
+            for index, child in enumerate(self.provider.children(node)):
+                record.child_keys.append(self._walk(child, path + (index,), key, depth + 1))
+        return key
+
+    @staticmethod
+    def _index(index: dict, value: str, key: Any):
+        index.setdefault(value, {})[key] = None
+
+    @staticmethod
+    def _unindex(index: dict, value: str, key: Any):
+        keys = index.get(value)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del index[value]
+
+    def _remove(self, key: Any):
+        """从快照中移除子树"""
+        record = self._records.pop(key, None)
+        if record is None:
+            return
+        self._unindex(self._by_automation_id, record.automation_id, key)
+        self._unindex(self._by_control_type, record.control_type, key)
+        self._unindex(self._by_text, record.text, key)
+        for child_key in record.child_keys:
+            self._remove(child_key)
+
+    def refresh(self, key: Any):
+        """重新遍历某个节点的子树"""
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                return
+            parent_key, path, node = record.parent_key, record.path, record.node
+            self._remove(key)
+            new_key = self._walk(node, path, parent_key, len(path) - 1)
+            if new_key != key:
+                siblings = self._records[parent_key].child_keys if parent_key is not None else self._root_keys
+                siblings[siblings.index(key)] = new_key
+
+    def refresh_node(self, node: Any) -> bool:
+        """
+        重新遍历快照中某个节点的子树，如等待元素出现的父元素
+        :return: 节点是否在快照中
+        """
+        key = self.provider.describe(node)[0]
+        with self._lock:
+            if key not in self._records:
+                return False
+            self.refresh(key)
+            return True
+
+    def depth(self) -> int:
+        """快照中最深节点的层级，根节点为0层"""
+        with self._lock:
+            return max((len(record.path) - 1 for record in self._records.values()), default=0)
+
+    def refresh_roots(self) -> bool:
+        """
+        重新获取根节点，有窗口打开或关闭时全量遍历
+        :return: 根节点是否变化，未设置roots_getter时为False
+        """
+        if self.roots_getter is None:
+            return False
+        roots = list(self.roots_getter())
+        keys = [self.provider.describe(root)[0] for root in roots]
+        with self._lock:
+            if keys == self._root_keys:
+                return False
+            self.roots = roots
+            self.capture()
+            return True
+
+    def refresh_changed(self, depth: int = 1) -> int:
+        """
+        检查第depth层节点的文本和子节点数，只重新遍历发生变化的子树
+        :param depth: 检查的层级，根节点为0层
+        :return: 刷新的子树数
+        """
+        with self._lock:
+            keys = list(self._root_keys)
+            for _ in range(depth):
+                keys = [child_key for key in keys for child_key in self._records[key].child_keys]
+            changed = []
+            for key in keys:
+                record = self._records.get(key)
+                if record is None:
+                    continue
+                try:
+                    _, _, _, text = self.provider.describe(record.node)
+                    child_count = len(self.provider.children(record.node))
+                except Exception:
+                    changed.append(record.parent_key)  # 节点已失效，刷新父节点
+                    continue
+                self.visited += 1
+                if text != record.text or child_count != len(record.child_keys):
+                    changed.append(key)
+            refreshed = set()
+            for key in changed:
+                if key is None:
+                    self.capture()
+                    return len(keys)
+                if key not in refreshed:
+                    refreshed.add(key)
+                    self.refresh(key)
+            return len(refreshed)
+
+    def find_all(self, automation_id: str = None, control_type: str = None, name_pattern: str = None,
+                 class_type: Any = None) -> list:
+        """
+        在快照中查找所有符合条件的节点，按界面顺序返回原始节点
+        :param automation_id: automation_id完全相等
+        :param control_type: 控件类型，如Button、Edit
+        :param name_pattern: 对文本做re.search的正则
+        :param class_type: 节点需为该类型的实例
+        """
+        with self._lock:
+            candidates = None
+            for index, value in ((self._by_automation_id, automation_id), (self._by_control_type, control_type)):
+                if value is None:
+                    continue
+                keys = index.get(value, {})
+                candidates = set(keys) if candidates is None else candidates.intersection(keys)
+            if name_pattern is not None:
+                pattern = compile_pattern(name_pattern)
+                keys = set()
+                for text, text_keys in self._by_text.items():
+                    if pattern.search(text):
+                        keys.update(text_keys)
+                candidates = keys if candidates is None else candidates.intersection(keys)
+            if candidates is None:
+                candidates = self._records.keys()
+            records = sorted((self._records[key] for key in candidates), key=lambda item: item.path)
+            return [record.node for record in records
+                    if class_type is None or isinstance(record.node, class_type)]
+
+    def find(self, automation_id: str = None, control_type: str = None, name_pattern: str = None,
+             class_type: Any = None) -> Optional[Any]:
+        """查找第一个符合条件的节点"""
+        nodes = self.find_all(automation_id, control_type, name_pattern, class_type)
+        return nodes[0] if nodes else None
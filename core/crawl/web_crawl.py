@@ -1,96 +1,341 @@
 import base64
 import os
-import re
 import shutil
 import time
-from typing import Optional, Union
+import uuid
+from typing import Optional, Union, Sequence, Generator, Any, Callable
 
-from pywinauto import Desktop, Application
 from selenium.webdriver.common import action_chains
+from selenium.webdriver.remote.file_detector import LocalFileDetector
 from selenium.webdriver.remote.webelement import WebElement
 
 from selenium import webdriver
-from selenium.webdriver.edge.options import Options as EdgeOptions
-from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as ec
 from typing_extensions import LiteralString
 
-from core.common.crawl_utils import to_lower_str
+from core.common.crawl_utils import to_lower_str, gen_scroll_load_script, gen_capture_file_input_script
+from core.common.download_manager import DownloadManager
+from core.common.download_watcher import DownloadWatcher
+from core.common.file_utils import format_download_file_name, write_base64
+from core.common.http_cache import HttpCache, CachedResponse
+from core.common.pattern_utils import compile_pattern
+from core.common.screenshot_service import ScreenshotService, get_screenshot_service
 from core.config.config import get_config_by_section
+from core.crawl.action_pacer import get_action_pacer
+from core.crawl.batch_locator import BatchLocator
+from core.crawl.driver_options import get_options_template
+from core.crawl.element_waiter import ElementWaiter, get_element_waiter
+from core.crawl.page_extractor import PageExtractor, normalize_fields
+from core.crawl.throughput_profile import ThroughputProfile
 from core.log.logger import logger
-from core.config.config import get_config
+from core.log.metrics import instrument
+from core.schedule.checkpoint import CheckpointStore, get_checkpoint_store
+from core.schedule.task_queue import get_host
+from core.schedule.url_frontier import UrlFrontier, FrontierUrl, get_url_frontier
 
 
 class WebCrawler:
 
-    def __init__(self):
-        self.driver = None  # 浏览器驱动
+    def __init__(self, driver=None):
+        self.driver = driver  # 浏览器驱动，可由会话池注入已预热的驱动
+        self.element_waiter = None  # 元素等待器
+        self.batch_locator = None  # 批量定位器
+        self.page_extractor = None  # 页面内批量提取器
+        self.download_manager = None  # HTTP下载管理器
+        self.http_cache = None  # HTTP内容缓存
+        self.frontier = None  # URL边界队列
+        self.download_watcher = None  # 下载文件夹监视器
+        self.checkpoint: Optional[CheckpointStore] = get_checkpoint_store()  # 断点记录，未启用时为None
+        self.checkpoint_task: Optional[str] = None  # 断点记录中的任务名称，为空时不记录进度；调度器执行任务时设置为任务ID
+        self.pacer = get_action_pacer()  # 操作节奏控制，未启用时操作后固定等待1秒
+        self._page_host = ""  # 最近一次等待稳定时的页面域名，用于选择站点的等待策略
+        self.throughput_profile = ThroughputProfile.from_config()  # 高吞吐浏览器配置
+        self._scroll_load_script = gen_scroll_load_script()
+        self._capture_file_input_script = gen_capture_file_input_script()
         self.webdriver_type = to_lower_str(get_config_by_section("webdriver", "browser_type"))  # 驱动类型
         self.download_path = os.path.join(os.getcwd(), get_config_by_section("webdriver", "download_path"))  # 设置浏览器下载路径
-        self.will_save_photo = get_config("save_screenshot") == "True"
+        self.will_save_photo = str(get_config_by_section("crawl", "save_screenshot")) == "True"
         os.makedirs(self.download_path, exist_ok=True)
 
+    @instrument("web", "init_driver")
     def init_webdriver(self):
-        """初始化浏览器驱动"""
+        """
+        初始化浏览器驱动
+        :return: 创建好的浏览器驱动
+        """
         if self.webdriver_type == "edge":
             self.init_edge_driver()
         elif self.webdriver_type == "chrome":
             self.init_chrome_driver()
+        return self.driver
 
     def init_chrome_driver(self):
         """初始化Chrome"""
-        chrome_options = ChromeOptions()
-        chrome_config = get_config_by_section("webdriver", self.webdriver_type)
-        for argument in chrome_config["arguments"]:
-            chrome_options.add_argument(argument)
-        for extension in chrome_config["extensions"]:
-            chrome_options.add_extension(extension)
-        if chrome_config["remote"]:
-            self.driver = webdriver.Remote(command_executor=chrome_config["remote_server"], options=chrome_options)
+        template = get_options_template(self.webdriver_type)
+        chrome_options = template.new_options()
+        if self.throughput_profile.enabled:
+            self.throughput_profile.apply_options(chrome_options, self.webdriver_type)
+        if template.remote:
+            self.driver = webdriver.Remote(command_executor=template.remote_server, options=chrome_options)
         else:
             self.driver = webdriver.Chrome(options=chrome_options)
+        if self.throughput_profile.enabled:
+            self.throughput_profile.apply_driver(self.driver)
 
     def init_edge_driver(self):
         """初始化Edge"""
-        edge_options = EdgeOptions()
-        edge_config = get_config_by_section("webdriver", self.webdriver_type)
-        for argument in edge_config["arguments"]:
-            edge_options.add_argument(argument)
-        edge_options.add_experimental_option("prefs", edge_config["prefs"])
-        for extension in edge_config["extensions"]:
-            edge_options.add_extension(extension)
+        template = get_options_template(self.webdriver_type)
+        edge_options = template.new_options()
+        if self.throughput_profile.enabled:
+            self.throughput_profile.apply_options(edge_options, self.webdriver_type)
         self.driver = webdriver.Edge(options=edge_options)
-        for cmd, cmd_args in edge_config["params"].items():
+        if self.throughput_profile.enabled:
+            self.throughput_profile.apply_driver(self.driver)
+        for cmd, cmd_args in template.cdp_commands:
             self.driver.execute_cdp_cmd(cmd, cmd_args)
-        for script in edge_config["scripts"]:
+        for script in template.scripts:
             self.driver.execute_script(script)
 
-    def save_page(self, file_path: str, scale: float = 1.0):
+    def quit_webdriver(self):
+        """关闭浏览器驱动"""
+        self.close_resources()
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning("关闭浏览器驱动失败：%s" % e)
+        self.driver = None
+
+    def close_resources(self):
+        """释放下载监视器、下载管理器和HTTP缓存，不退出浏览器驱动，用于归还会话池中的驱动"""
+        if self.download_watcher is not None:
+            self.download_watcher.stop()
+            self.download_watcher = None
+        if self.download_manager is not None:
+            self.download_manager.close()
+            self.download_manager = None
+        if self.http_cache is not None:
+            self.http_cache.close()
+            self.http_cache = None
+        self.frontier = None  # 共用的队列在进程退出时关闭
+
+    def get_checkpoint(self) -> Optional[CheckpointStore]:
+        """已设置checkpoint_task时返回断点记录，否则返回None，不同的运行不会共用同一份进度"""
+        return self.checkpoint if self.checkpoint_task is not None else None
+
+    def finish_checkpoint_task(self):
+        """任务全部完成后删除其进度，之后同名任务重新执行；调度器中的任务成功后自动删除"""
+        if self.get_checkpoint() is not None:
+            self.checkpoint.forget_task(self.checkpoint_task)
+
+    def get_frontier(self) -> UrlFrontier:
+        """获取进程内共用的URL边界队列，可直接设置frontier使用独立的队列"""
+        if self.frontier is None:
+            self.frontier = get_url_frontier()
+        return self.frontier
+
+    def extract_links(self) -> list:
+        """获取当前页面所有链接的绝对地址"""
+        return self.driver.execute_script(
+            "return Array.from(document.links, a => a.href).filter(href => href.startsWith('http'));")
+
+    @instrument("web", "navigate")
+    def open_url(self, url: str, enqueue_links: bool = True, depth: int = 0) -> int:
+        """
+        打开链接，并将页面中的链接加入URL边界队列
+        :param url: 链接
+        :param enqueue_links: 是否将页面中的链接入队
+        :param depth: 当前页面的层数，页面中的链接为depth+1层
+        :return: 新入队的链接数
+        """
+        self.driver.get(url)
+        self.invalidate_locate_cache()
+        if not enqueue_links:
+            return 0
+        frontier = self.get_frontier()
+        # 直接打开的页面视为种子，未调用seed时same_host_only也能将同域名的链接入队
+        frontier.allow_host(url)
+        return frontier.add_many(self.extract_links(), depth + 1, self.driver.current_url)
+
+    def crawl_frontier(self, seeds: Sequence[str] = (), max_pages: int = None) -> Generator[FrontierUrl, Any, None]:
+        """
+        从URL边界队列逐个打开链接，页面中发现的链接自动入队，队列为空时结束
+        :param seeds: 种子链接
+        :param max_pages: 最多打开的页面数
+        :return: 逐个返回已打开的链接，调用方在此时处理当前页面
+        """
+        frontier = self.get_frontier()
+        if seeds:
+            frontier.seed(seeds)
+        checkpoint, task = self.get_checkpoint(), self.checkpoint_task
+        # 链接取出后即从边界队列删除，启用断点记录时记录处理中的链接，中断后重启先处理该链接
+        resume = checkpoint.get_cursor(task, "frontier") if checkpoint is not None else None
+        count = 0
+        while max_pages is None or count < max_pages:
+            if resume is not None:
+                item = FrontierUrl(0, resume["url"], get_host(resume["url"]), resume["depth"])
+                resume = None
+            else:
+                item = frontier.next()
+            if item is None:
+                ready_time = frontier.next_ready_time()
+                if ready_time is None:
+                    if checkpoint is not None:
+                        checkpoint.set_cursor(task, "frontier", None)  # 队列已处理完，不再需要恢复
+                    return
+                time.sleep(max(0.0, ready_time - time.time()))
+                continue
+            if checkpoint is not None:
+                if checkpoint.is_url_done(task, item.url):
+                    continue
+                checkpoint.set_cursor(task, "frontier", {"url": item.url, "depth": item.depth})
+            try:
+                self.open_url(item.url, depth=item.depth)
+            except Exception as e:
+                logger.warning("打开链接失败：%s, %s" % (item.url, e))
+                continue
+            count += 1
+            yield item
+            if checkpoint is not None:
+                checkpoint.mark_url_done(task, item.url)  # 调用方处理完当前页面后才继续迭代
+
+    def get_page_traffic(self) -> dict:
+        """获取自上次调用以来的请求数、被屏蔽的请求数和传输字节数，需启用throughput配置"""
+        return self.throughput_profile.collect(self.driver)
+
+    @instrument("web", "save_page")
+    def save_page(self, file_path: str, scale: float = 1.0, stream: bool = False, chunk_size: int = 1024 * 1024):
         """
         保存网页为pdf
         :param file_path: 完整的本地文件路径
         :param scale: pdf缩放比例[0.1,2]
+        :param stream: 是否以流的方式分块读取并写入，避免整个文件的base64数据驻留内存
+        :param chunk_size: 流式读取时每块的字节数
         """
-        pdf_data = self.driver.execute_cdp_cmd("Page.printToPDF", {
+        if not stream:
+            write_base64(self.print_page(scale), file_path)
+            return
+        print_params = self._print_params(scale)
+        print_params["transferMode"] = "ReturnAsStream"
+        handle = self.driver.execute_cdp_cmd("Page.printToPDF", print_params)["stream"]
+        try:
+            with open(file_path, "wb") as file:
+                while True:
+                    chunk = self.driver.execute_cdp_cmd("IO.read", {"handle": handle, "size": chunk_size})
+                    if chunk.get("base64Encoded"):
+                        file.write(base64.b64decode(chunk["data"]))
+                    else:
+                        file.write(chunk["data"].encode("utf-8"))
+                    if chunk.get("eof"):
+                        break
+        finally:
+            self.driver.execute_cdp_cmd("IO.close", {"handle": handle})
+
+    @staticmethod
+    def _print_params(scale: float) -> dict:
+        return {
             "printBackground": True,
             "displayHeaderFooter": False,
             "landscape": True,
             "scale": scale
-        })
-        with open(file_path, "wb") as file:
-            file.write(base64.b64decode(pdf_data["data"]))
+        }
+
+    def print_page(self, scale: float = 1.0) -> str:
+        """
+        打印网页为pdf，只返回base64数据，解码和写文件可交给流水线的进程池(file_utils.write_base64)，浏览器可立即继续操作
+        :param scale: pdf缩放比例[0.1,2]
+        :return: pdf的base64数据
+        """
+        return self.driver.execute_cdp_cmd("Page.printToPDF", self._print_params(scale))["data"]
+
+    def save_pages(self, pages: list, scale: float = 1.0, stream: bool = True) -> list:
+        """
+        在当前标签页依次打开多个网页并保存为pdf，复用同一个标签页
+        启用断点记录时跳过已保存且校验通过的网页
+        :param pages: [(网页链接, 完整的本地文件路径)]
+        :param scale: pdf缩放比例[0.1,2]
+        :param stream: 是否以流的方式写入
+        :return: 保存失败的网页链接
+        """
+        failed = []
+        checkpoint, task = self.get_checkpoint(), self.checkpoint_task
+        for url, file_path in pages:
+            if checkpoint is not None and checkpoint.verify_file(task, file_path=file_path) is not None:
+                continue
+            try:
+                self.driver.get(url)
+                self.invalidate_locate_cache()
+                self.save_page(file_path, scale, stream)
+                if checkpoint is not None:
+                    checkpoint.record_file(task, file_path, url)
+            except Exception as e:
+                logger.warning("保存网页失败：%s, %s" % (url, e))
+                failed.append(url)
+        return failed
+
+    def get_download_watcher(self) -> DownloadWatcher:
+        """获取下载文件夹监视器，首次调用时启动"""
+        if self.download_watcher is None:
+            self.download_watcher = DownloadWatcher(self.download_path)
+            self.download_watcher.start()
+        return self.download_watcher
 
+    @instrument("web", "download", check_result=True)
     def wait_download_file(self, filename: str, times: int = 30) -> bool:
-        """等待下载文件"""
-        des_file = self.format_download_file_name(filename)
-        for _ in range(times):
-            for file_name in os.listdir(self.download_path):
-                format_name = self.format_download_file_name(file_name)
-                if des_file.endswith(format_name) and not file_name.endswith(".crdownload"):
-                    return True
-            time.sleep(1)
-        return False
+        """
+        等待下载文件
+        :param filename: 目标文件名
+        :param times: 等待最大时间/秒
+        :return: true->下载完成
+        """
+        return self.get_download_watcher().wait(filename, times) is not None
+
+    def get_http_cache(self):
+        """获取HTTP内容缓存"""
+        if self.http_cache is None:
+            self.http_cache = HttpCache()
+        return self.http_cache
+
+    @instrument("web", "download")
+    def fetch_by_cache(self, url: str) -> CachedResponse:
+        """
+        以当前会话的cookie和user agent通过HTTP获取链接内容，有缓存时发送条件请求，未变化的内容不再下载
+        用于定期重新爬取的页面和接口，无需浏览器渲染时代替driver.get
+        :param url: 链接
+        :return: CachedResponse
+        """
+        cache = self.get_http_cache()
+        cache.load_driver_session(self.driver)
+        return cache.fetch(url)
+
+    @instrument("web", "download", check_result=True)
+    def download_by_request(self, url: str, filename: str, use_cache: bool = False) -> bool:
+        """
+        不经过浏览器，直接以当前会话的cookie和user agent通过HTTP下载文件到下载文件夹
+        启用断点记录时，已下载且校验通过的文件不再下载，未完成的.part文件由下载管理器续传
+        :param url: 文件链接
+        :param filename: 保存的文件名
+        :param use_cache: true->经过HTTP内容缓存，文件未变化时不再下载
+        :return: true->下载成功
+        """
+        file_path = os.path.join(self.download_path, filename)
+        checkpoint, task = self.get_checkpoint(), self.checkpoint_task
+        if checkpoint is not None and checkpoint.verify_file(task, file_path=file_path) is not None:
+            return True
+        if use_cache:
+            cache = self.get_http_cache()
+            cache.load_driver_session(self.driver)
+            success = cache.fetch_to_file(url, file_path)
+        else:
+            if self.download_manager is None:
+                self.download_manager = DownloadManager()
+            self.download_manager.load_driver_session(self.driver)
+            success = self.download_manager.download(url, file_path)
+        if success and checkpoint is not None:
+            checkpoint.record_file(task, file_path, url)
+        return success
 
     def move_download_file(self, des_file: str, des_path: str) -> bool:
         """
@@ -99,25 +344,133 @@ class WebCrawler:
         :param des_path: 目标路径
         :return: true->操作成功；False->找不到文件
         """
-        des_file = self.format_download_file_name(des_file)
-        for file_name in os.listdir(self.download_path):
-            format_name = self.format_download_file_name(file_name)
-            if des_file.endswith(format_name) and not file_name.endswith(".crdownload"):
-                file_path = os.path.join(self.download_path, file_name)
-                des_file_path = os.path.join(des_path, file_name)
-                if os.path.exists(des_file_path):
-                    os.remove(des_file_path)
-                shutil.move(file_path, des_path)
-                return True
-        return False
+        watcher = self.get_download_watcher()
+        file_path = watcher.find(des_file)
+        if file_path is None or not os.path.exists(file_path):
+            watcher.rescan()  # 轮询模式下索引可能尚未刷新
+            file_path = watcher.find(des_file)
+        if file_path is None:
+            return False
+        des_file_path = os.path.join(des_path, os.path.basename(file_path))
+        if os.path.exists(des_file_path):
+            os.remove(des_file_path)
+        shutil.move(file_path, des_path)
+        checkpoint, task = self.get_checkpoint(), self.checkpoint_task
+        if checkpoint is not None:
+            info = checkpoint.get_file(task, file_path=file_path)
+            if info is not None:
+                checkpoint.forget_file(task, file_path)
+            checkpoint.record_file(task, des_file_path, info["url"] if info else None,
+                                   info["sha256"] if info else None)
+        return True
 
     @staticmethod
     def format_download_file_name(filename: str):
-        filename = filename.replace(" ", "")
-        filename = filename.replace("+", "")
-        filename = filename.replace(" ", "")
-        return filename.split(".")[0]
+        return format_download_file_name(filename)
+
+    def get_element_waiter(self) -> ElementWaiter:
+        """获取绑定当前浏览器驱动的元素等待器"""
+        if self.element_waiter is None or self.element_waiter.driver is not self.driver:
+            self.element_waiter = get_element_waiter(self.driver)
+        return self.element_waiter
+
+    def get_batch_locator(self) -> BatchLocator:
+        """获取绑定当前浏览器驱动的批量定位器"""
+        if self.batch_locator is None or self.batch_locator.driver is not self.driver:
+            self.batch_locator = BatchLocator(self.driver)
+        return self.batch_locator
+
+    def get_page_extractor(self) -> PageExtractor:
+        """获取绑定当前浏览器驱动的页面提取器"""
+        if self.page_extractor is None or self.page_extractor.driver is not self.driver:
+            self.page_extractor = PageExtractor(self.driver, self.get_element_waiter())
+        return self.page_extractor
 
+    @instrument("web", "extract")
+    def extract_rows(self, row_selector: str, fields: dict, root: WebElement = None, limit: int = None) -> list:
+        """
+        一次execute_script提取当前页面的所有行
+        :param row_selector: 行的CSS选择器，如table tbody tr
+        :param fields: 字段定义{字段名: CSS选择器或[CSS选择器, 属性, 是否取全部]}
+        :param root: 查找范围，为空时为整个页面
+        :param limit: 最多提取的行数
+        :return: [{字段名: 值}]
+        """
+        return self.get_page_extractor().extract(row_selector, fields, root, limit)
+
+    @instrument("web", "extract")
+    def extract_pages(self, row_selector: str, fields: dict, next_selector: str = None, file_path: str = None,
+                      max_pages: int = None, page_timeout: float = 10) -> Union[list, int]:
+        """
+        逐页提取，每页一次execute_script
+        启用断点记录、设置了checkpoint_task且file_path不为空时，每页写入后记录游标，中断后重启从记录的下一页链接继续追加；
+        需点击翻页的列表无法直接打开中断的页面，重新提取
+        :param row_selector: 行的CSS选择器
+        :param fields: 字段定义，同extract_rows
+        :param next_selector: 下一页按钮的CSS选择器
+        :param file_path: 输出文件路径(.jsonl/.csv)，不为空时边提取边写入
+        :param max_pages: 最多提取的页数
+        :param page_timeout: 点击翻页后等待行替换的最大时间/秒
+        :return: file_path为空时返回所有行，否则返回写入的行数
+        """
+        extractor = self.get_page_extractor()
+        try:
+            if file_path is None:
+                return list(extractor.iter_rows(row_selector, fields, next_selector, max_pages, page_timeout))
+            if self.get_checkpoint() is None:
+                rows = extractor.iter_rows(row_selector, fields, next_selector, max_pages, page_timeout)
+                return extractor.export(rows, file_path)
+            return self._extract_pages_resumable(extractor, row_selector, fields, next_selector, file_path,
+                                                 max_pages, page_timeout)
+        finally:
+            self.invalidate_locate_cache()
+
+    def _extract_pages_resumable(self, extractor: PageExtractor, row_selector: str, fields: dict,
+                                 next_selector: Optional[str], file_path: str, max_pages: Optional[int],
+                                 page_timeout: float) -> int:
+        """逐页写入并记录游标{next: 下一页链接, pages: 已提取页数, rows: 已写入行数, size: 文件大小, done: 是否完成}"""
+        task, name = self.checkpoint_task, "extract:%s" % os.path.abspath(file_path)
+        cursor = self.checkpoint.get_cursor(task, name)
+        if cursor is not None and cursor["done"] and os.path.exists(file_path):
+            return cursor["rows"]
+        pages, count, append = 0, 0, False
+        if cursor is not None and cursor["next"] and os.path.exists(file_path) \
+                and os.path.getsize(file_path) >= cursor["size"]:
+            with open(file_path, "r+b") as file:
+                file.truncate(cursor["size"])  # 丢弃记录游标后写入的不完整数据
+            pages, count, append = cursor["pages"], cursor["rows"], True
+            logger.info("从第%s页继续提取：%s" % (pages + 1, cursor["next"]))
+            self.driver.get(cursor["next"])
+        remain_pages = None if max_pages is None else max_pages - pages
+        for rows, next_href in extractor.iter_pages(row_selector, fields, next_selector, remain_pages, page_timeout):
+            count += extractor.export(rows, file_path, append=append)
+            append = True
+            pages += 1
+            self.checkpoint.set_cursor(task, name, {"next": next_href, "pages": pages, "rows": count,
+                                                    "size": os.path.getsize(file_path), "done": False})
+        if not append:
+            extractor.export([], file_path)
+        self.checkpoint.set_cursor(task, name, {"next": None, "pages": pages, "rows": count,
+                                                "size": os.path.getsize(file_path), "done": True})
+        return count
+
+    @instrument("web", "locate")
+    def locate_elements(self, locators: dict, attributes: Sequence[str] = (), validate: bool = True) -> dict:
+        """
+        一次往返批量查找多个元素，同时返回可见性、文本和属性
+        :param locators: {名称: (查找的类型, 查找类型对应的关键数据)}
+        :param attributes: 需要一并读取的属性名
+        :param validate: 全部命中缓存时是否仍向页面校验DOM版本
+        :return: {名称: {found, count, element, displayed, text, attributes}}
+        """
+        return self.get_batch_locator().locate(locators, attributes, validate)
+
+    def invalidate_locate_cache(self):
+        """页面可能已变化时清空批量定位缓存"""
+        if self.batch_locator is not None:
+            self.batch_locator.invalidate()
+
+    @instrument("web", "wait")
     def wait_element(self, by: str, by_value: str, wait_time: int = 30) -> Optional[WebElement]:
         """
         等待某元素并返回
@@ -126,13 +479,12 @@ class WebCrawler:
         :param wait_time: 等待最大时间/秒
         :return: 返回找到的页面元素或None
         """
-        for i in range(int(wait_time / 0.5)):
-            elements = self.driver.find_elements(by, by_value)
-            if len(elements) > 0:
-                return elements[0]
-            time.sleep(0.5)
-        raise ValueError("找不到元素:%s" % by_value)
+        element = self.get_element_waiter().wait(by, by_value, wait_time)
+        if element is None:
+            raise ValueError("找不到元素:%s" % by_value)
+        return element
 
+    @instrument("web", "wait")
     def wait_display_element(self, by: str, by_value: str, wait_time: int = 30) -> Optional[WebElement]:
         """
         等待某元素并返回
@@ -141,17 +493,12 @@ class WebCrawler:
         :param wait_time: 等待最大时间/秒
         :return: 返回找到的页面元素或None
         """
-        for i in range(int(wait_time / 0.5)):
-            elements = self.driver.find_elements(by, by_value)
-            if len(elements) > 0:
-                try:
-                    if elements[0].is_displayed():
-                        return elements[0]
-                except Exception as e:
-                    print(e)
-            time.sleep(0.5)
-        raise ValueError("找不到元素:%s" % by_value)
+        element = self.get_element_waiter().wait(by, by_value, wait_time, displayed=True)
+        if element is None:
+            raise ValueError("找不到元素:%s" % by_value)
+        return element
 
+    @instrument("web", "click")
     def click_element(self, by: str, value: str):
         """
         点击元素
@@ -161,16 +508,18 @@ class WebCrawler:
         element = self.driver.find_element(by, value)
         self.driver.execute_script("arguments[0].scrollIntoView();", element)
         action_chains.ActionChains(self.driver).move_to_element(element).perform()
-        self.driver.execute_script("arguments[0].click();", element)
-        time.sleep(1)
+        self.invalidate_locate_cache()
+        self.settle_page("click", element)
 
+    @instrument("web", "click")
     def click_element_by_element(self, element: WebElement):
         """点击元素"""
         self.driver.execute_script("arguments[0].scrollIntoView();", element)
         action_chains.ActionChains(self.driver).move_to_element(element).perform()
-        self.driver.execute_script("arguments[0].click();", element)
-        time.sleep(1)
+        self.invalidate_locate_cache()
+        self.settle_page("click", element)
 
+    @instrument("web", "input")
     def click_input_element(self, element: WebElement, text: str):
         """
         点击元素并输入
@@ -183,7 +532,23 @@ class WebCrawler:
         action_chains.ActionChains(self.driver).click(element).perform()
         element.clear()
         element.send_keys(text)
-        time.sleep(1)
+        self.invalidate_locate_cache()
+        self.settle_page("input")
+
+    def settle_page(self, action: str, element: WebElement = None):
+        """
+        等待页面稳定，代替操作后的固定等待，未启用pacing时固定等待1秒
+        :param action: 操作名称，用于统计和学习最少等待时间
+        :param element: 需点击的元素，点击和等待在同一次脚本调用中完成
+        """
+        if self.pacer is None:
+            if element is not None:
+                self.driver.execute_script("arguments[0].click();", element)
+            time.sleep(1)
+            return
+        profile = self.pacer.get_profile(self._page_host) if self._page_host else self.pacer.default_profile
+        self.get_element_waiter().ensure_script_timeout(profile.max_wait + 5)
+        self._page_host = self.pacer.settle_page(self.driver, action, self._page_host, element)
 
     def exist_element(self, by: str, by_value: str) -> bool:
         """
@@ -198,6 +563,7 @@ class WebCrawler:
         windows = self.driver.window_handles
         if len(windows) > 1:
             self.driver.switch_to.window(windows[-1])
+            self.invalidate_locate_cache()
 
     def close_last_window(self):
         """清理最后一个窗口，若只有一个窗口时不处理"""
@@ -206,6 +572,7 @@ class WebCrawler:
             self.driver.switch_to.window(windows[-1])
             self.driver.close()
             self.driver.switch_to.window(windows[-2])
+            self.invalidate_locate_cache()
 
     def clear_other_window(self):
         """清理除主窗口外的窗口"""
@@ -218,15 +585,18 @@ class WebCrawler:
                 except Exception as e:
                     logger.warning("关闭窗口失败：%s" % e)
         self.driver.switch_to.window(windows[0])
+        self.invalidate_locate_cache()
 
     @staticmethod
     def get_open_file_handle(browser_pattern: str = r"^[\S\s]+Microsoft[\s\S]+Edge$", open_text: str = "打开"):
-        """获取浏览器句柄"""
+        """获取浏览器句柄，需安装pywinauto，只能用于有桌面的本地浏览器，优先使用upload_files"""
+        from pywinauto import Desktop, Application
         desktop = Desktop(backend="uia")
         windows = desktop.windows()
+        pattern = compile_pattern(browser_pattern)
         # 遍历所有窗口，打印窗口标题和句柄
         for window in windows:
-            if re.match(browser_pattern, window.window_text()):
+            if pattern.match(window.window_text()):
                 app = Application(backend="uia").connect(handle=window.handle)
                 main_browser = app.windows()[0]
                 if len(main_browser.children(title=open_text)) > 0:
@@ -236,7 +606,8 @@ class WebCrawler:
     @staticmethod
     def upload_file_by_window(handle, filepath: Union[LiteralString, str, bytes], open_text: str = "打开",
                               input_text: str = "文件名(N):", confirm_text: str = "打开(O)"):
-        """通过浏览器上传文件"""
+        """通过浏览器的文件选择框上传文件，需安装pywinauto，优先使用upload_files"""
+        from pywinauto import Application
         app = Application(backend="uia").connect(handle=handle)
         main_browser = app.windows()[0]
         file_chooser = main_browser.children(title=open_text)[0]
@@ -246,11 +617,122 @@ class WebCrawler:
         open_button = file_chooser.descendants(title=confirm_text, control_type="Button")[0]
         open_button.click()
 
+    @instrument("web", "upload")
+    def upload_files(self, files: Sequence[Union[os.PathLike, str]], by: str = None, value: str = None,
+                     element: WebElement = None, trigger: WebElement = None, timeout: float = 10,
+                     batch_size: int = None, on_batch: Callable[[list], Any] = None, use_cdp: bool = None) -> int:
+        """
+        直接设置上传控件的文件，不打开系统文件选择框，可用于无头和远程浏览器
+        上传控件可由by/value查找、直接传入element，或传入trigger：点击trigger并捕获页面脚本动态创建的上传控件
+        :param files: 本地文件路径
+        :param by: 查找上传控件的类型
+        :param value: 查找类型对应的关键数据
+        :param element: 上传控件
+        :param trigger: 点击后弹出文件选择框的元素，如上传按钮
+        :param timeout: 等待上传控件的时间/秒
+        :param batch_size: 每批设置的文件数，为空时一次设置全部文件
+        :param on_batch: 每批文件设置后调用，如点击提交并等待上传完成，参数为本批文件路径
+        :param use_cdp: 是否使用CDP DOM.setFileInputFiles，为空时本地Chromium驱动使用，远程驱动使用send_keys
+        :return: 上传的文件数
+        """
+        paths = []
+        for file in files:
+            path = os.path.abspath(file)
+            if not os.path.isfile(path):
+                raise Exception("上传文件不存在：%s" % path)
+            paths.append(path)
+        if not paths:
+            return 0
+        if element is None and trigger is not None:
+            multiple = self._capture_file_input(trigger, timeout)
+        else:
+            if element is None:
+                if by is None:
+                    raise ValueError("需指定上传控件或触发上传的元素")
+                element = self.get_element_waiter().wait(by, value, timeout)
+                if element is None:
+                    raise ValueError("找不到元素:%s" % value)
+            multiple = bool(element.get_property("multiple"))
+        batch_size = batch_size or len(paths)
+        if batch_size > 1 and not multiple:
+            raise ValueError("上传控件不支持多个文件，需设置batch_size=1")
+        if use_cdp is None:
+            use_cdp = hasattr(self.driver, "execute_cdp_cmd")
+        try:
+            for index in range(0, len(paths), batch_size):
+                batch = paths[index:index + batch_size]
+                self._set_input_files(element, batch, use_cdp)
+                if on_batch is not None:
+                    on_batch(batch)
+        finally:
+            try:
+                self.driver.execute_script("window.__crawlerUploadTarget = null;")
+            except Exception as e:
+                logger.debug("清理上传控件引用失败：%s" % e)
+        self.invalidate_locate_cache()
+        return len(paths)
+
+    def _capture_file_input(self, trigger: WebElement, timeout: float) -> bool:
+        """点击trigger并捕获上传控件，保存在页面的window.__crawlerUploadTarget，返回控件是否支持多个文件"""
+        self.get_element_waiter().ensure_script_timeout(timeout + 5)
+        intercept = hasattr(self.driver, "execute_cdp_cmd")
+        if intercept:
+            # 兜底：通过label等方式原生打开的文件选择框也不弹出
+            self.driver.execute_cdp_cmd("Page.setInterceptFileChooserDialog", {"enabled": True})
+        try:
+            result = self.driver.execute_async_script(self._capture_file_input_script, trigger, int(timeout * 1000))
+        finally:
+            if intercept:
+                self.driver.execute_cdp_cmd("Page.setInterceptFileChooserDialog", {"enabled": False})
+        if "error" in result:
+            raise Exception("点击元素失败：%s" % result["error"])
+        if not result["captured"]:
+            raise ValueError("点击后找不到上传控件")
+        return result["multiple"]
+
+    def _set_input_files(self, element: Optional[WebElement], paths: list, use_cdp: bool):
+        """
+        设置上传控件的文件，element为空时使用捕获到的控件
+        CDP方式可设置未加入文档的动态控件；send_keys方式先将这类控件隐藏加入文档，远程驱动时上传本地文件到远程节点
+        """
+        if use_cdp:
+            if element is not None:
+                self.driver.execute_script("window.__crawlerUploadTarget = arguments[0];", element)
+            remote_object = self.driver.execute_cdp_cmd("Runtime.evaluate",
+                                                        {"expression": "window.__crawlerUploadTarget"})["result"]
+            object_id = remote_object.get("objectId")
+            if object_id is not None:
+                try:
+                    self.driver.execute_cdp_cmd("DOM.setFileInputFiles", {"files": paths, "objectId": object_id})
+                finally:
+                    self.driver.execute_cdp_cmd("Runtime.releaseObject", {"objectId": object_id})
+                return
+            # 在iframe内时Runtime.evaluate取不到当前frame的变量，改用send_keys
+        attached = False
+        if element is None:
+            element = self.driver.execute_script("""
+                var input = window.__crawlerUploadTarget;
+                if (!input.isConnected) {
+                    input.style.display = 'none';
+                    input.setAttribute('data-crawler-upload', '');
+                    document.body.appendChild(input);
+                }
+                return input;
+            """)
+            attached = element.get_attribute("data-crawler-upload") is not None
+        with self.driver.file_detector_context(LocalFileDetector):
+            element.send_keys("\n".join(paths))
+        if attached:
+            self.driver.execute_script(
+                "arguments[0].removeAttribute('data-crawler-upload'); arguments[0].remove();", element)
+
     def into_frame(self, by: str, frame_xpath: str, timeout: int = 30):
         """进入iframe"""
         WebDriverWait(self.driver, timeout).until(ec.frame_to_be_available_and_switch_to_it((by, frame_xpath)))
+        self.invalidate_locate_cache()
 
     @staticmethod
+    @instrument("web", "wait")
     def wait_child_element(parent_element: WebElement, by: str, by_value: str, wait_time: int = 30) -> Optional[
         WebElement]:
         """
@@ -261,49 +743,111 @@ class WebCrawler:
         :param wait_time: 等待最大时间/秒
         :return: 返回找到的页面元素或None
         """
-        for i in range(int(wait_time / 0.5)):
-            elements = parent_element.find_elements(by, by_value)
-            if len(elements) > 0:
-                try:
-                    if elements[0].is_displayed():
-                        return elements[0]
-                except Exception as e:
-                    print(e)
-            time.sleep(0.5)
-        raise ValueError("找不到元素:%s" % by_value)
-
-    def full_load_scroll(self, scroll_element):
-        """完全滚动到内容底部，使其内容完全加载"""
-        check_script = """
-                    var element = arguments[0];
-                    return element.scrollTop + element.clientHeight >= element.scrollHeight;
-                """
-        scroll_script = """
-                    var element = arguments[0];
-                    element.scrollTop = element.scrollHeight - element.clientHeight;
-                """
-        for _ in range(20):
-            self.driver.execute_script(scroll_script, scroll_element)
-            time.sleep(2)
-            is_to_bottom = self.driver.execute_script(check_script, scroll_element)
-            if is_to_bottom:
+        # 保持静态方法，与爬虫共用父元素所属浏览器驱动的等待器
+        waiter = get_element_waiter(parent_element.parent)
+        element = waiter.wait(by, by_value, wait_time, displayed=True, parent=parent_element)
+        if element is None:
+            raise ValueError("找不到元素:%s" % by_value)
+        return element
+
+    @instrument("web", "scroll")
+    def full_load_scroll(self, scroll_element, times: int = 20, idle_timeout: float = 2):
+        """
+        完全滚动到内容底部，使其内容完全加载
+        :param scroll_element: 滚动的元素
+        :param times: 最大滚动次数
+        :param idle_timeout: 每次滚动后等待内容高度变化的最大时间/秒，变化后立即继续
+        """
+        self.get_element_waiter().ensure_script_timeout(idle_timeout + 5)
+        for _ in range(times):
+            result = self.driver.execute_async_script(self._scroll_load_script, scroll_element, None, None,
+                                                      int(idle_timeout * 1000), False, None)
+            if result["at_bottom"] and not result["changed"]:
+                break
+        self.invalidate_locate_cache()
+
+    def iter_scroll_load(self, item_selector: str, scroll_element: WebElement = None, fields: dict = None,
+                         idle_timeout: float = 5, max_items: int = None,
+                         remove_seen: bool = False) -> Generator[Any, Any, None]:
+        """
+        边滚动加载边返回新增的子元素，内容出现即返回，无新内容超过idle_timeout时结束
+        :param item_selector: 子元素的CSS选择器
+        :param scroll_element: 滚动的元素，为空时滚动整个页面
+        :param fields: 提取字段，格式同PageExtractor，为空时返回页面元素，否则返回提取后的字典
+        :param idle_timeout: 无新内容的最大等待时间/秒
+        :param max_items: 最多返回的数量
+        :param remove_seen: 提取字段时是否从页面移除已返回的子元素，限制长列表的页面内存
+        :return: 逐个返回页面元素或提取的数据
+        """
+        self.get_element_waiter().ensure_script_timeout(idle_timeout + 5)
+        if fields:
+            fields = normalize_fields(fields)
+        # 每次遍历使用新的标记，同一页面再次遍历时从头返回
+        token = uuid.uuid4().hex
+        count = 0
+        idle_start = time.monotonic()
+        while True:
+            remain = idle_timeout - (time.monotonic() - idle_start)
+            if remain <= 0:
                 break
+            result = self.driver.execute_async_script(self._scroll_load_script, scroll_element, item_selector,
+                                                      fields, int(remain * 1000), remove_seen and bool(fields),
+                                                      token)
+            items = result["items"]
+            if len(items) == 0:
+                continue
+            idle_start = time.monotonic()
+            for item in items:
+                yield item
+                count += 1
+                if max_items is not None and count >= max_items:
+                    return
 
     def clear_download(self):
-        """清理下载文件夹"""
+        """清理下载文件夹，设置了断点任务时保留该任务已记录的文件和可续传的.part文件"""
         try:
-            shutil.rmtree(self.download_path)
-            os.makedirs(self.download_path, exist_ok=True)
+            checkpoint = self.get_checkpoint()
+            if checkpoint is None:
+                shutil.rmtree(self.download_path)
+                os.makedirs(self.download_path, exist_ok=True)
+                return
+            keep = checkpoint.task_files(self.checkpoint_task)
+            for name in os.listdir(self.download_path):
+                path = os.path.abspath(os.path.join(self.download_path, name))
+                if path in keep or name.endswith((".part", ".part.json")):
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
         except Exception as e:
             logger.warning("清理下载文件夹失败:%s" % e)
 
-    def save_screenshot(self, file_path: Union[os.PathLike, str], filename: str = None):
-        """保存截图"""
+    @instrument("web", "screenshot")
+    def save_screenshot(self, file_path: Union[os.PathLike, str], filename: str = None,
+                        wait: bool = False) -> Optional[str]:
+        """
+        保存截图，调用线程只获取画面，编码和写文件由截图服务在后台完成
+        :param file_path: 保存目录
+        :param filename: 文件名，为空时生成不重复的文件名，与上一张相同的截图不保存
+        :param wait: 是否等待写入完成
+        :return: 保存路径；未等待时为计划写入的路径，后台积压或截图重复时不会生成该文件
+        """
         if not self.will_save_photo:
-            return
-        if not os.path.exists(file_path):
-            os.makedirs(file_path, exist_ok=True)
-        if filename is None:
-            filename = "%s.png" % (int(time.time()))
-            time.sleep(1)
-        self.driver.save_screenshot(os.path.join(file_path, filename))
+            return None
+        service = get_screenshot_service()
+        if filename is None and service.is_busy():
+            return None  # 只跳过自动命名的截图，指定文件名的截图需要保存
+        return service.save(self._capture_screenshot(filename, service), file_path, filename,
+                            "web-%s" % id(self.driver), wait)
+
+    def _capture_screenshot(self, filename: Optional[str], service: ScreenshotService) -> bytes:
+        """获取截图数据，未指定文件名且保存格式为jpeg/webp时由浏览器直接按该格式编码"""
+        if filename is None and service.image_format != "png" and hasattr(self.driver, "execute_cdp_cmd"):
+            try:
+                result = self.driver.execute_cdp_cmd("Page.captureScreenshot", {
+                    "format": service.image_format, "quality": service.quality})
+                return base64.b64decode(result["data"])
+            except Exception as e:
+                logger.debug("CDP截图失败，改用WebDriver截图：%s" % e)
+        return self.driver.get_screenshot_as_png()
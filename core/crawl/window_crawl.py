@@ -1,27 +1,31 @@
+from __future__ import annotations
+
 import os
-import re
 import threading
 import time
 from os import PathLike
-from typing import Union, Optional, Sequence
-
-import cv2
-import numpy as np
-from PIL import ImageGrab
-from pywinauto import Desktop, Application
-from pywinauto.controls.uia_controls import EditWrapper
-from pywinauto.controls.uiawrapper import UIAWrapper
-from pywinauto.keyboard import send_keys
-from pywinauto.mouse import click
+from typing import Union, Optional, Sequence, TYPE_CHECKING
 
+from core.common.pattern_utils import compile_pattern, get_multi_matcher
+from core.common.screenshot_service import get_screenshot_service
 from core.config.config import get_config_by_section
+from core.crawl.action_pacer import get_action_pacer, poll
+from core.crawl.uia_snapshot import UiaSnapshot
+from core.log.metrics import instrument, metrics
+
+if TYPE_CHECKING:
+    from pywinauto import Application
+    from pywinauto.controls.uia_controls import EditWrapper
+    from pywinauto.controls.uiawrapper import UIAWrapper
+
+    from core.crawl.template_matcher import TemplateMatch
 
 
 class WindowCrawler:
 
     def __init__(self):
         self.download_dir = None  # 下载文件夹
-        self.will_save_photo = get_config_by_section("crawl", "save_screenshot") == "True"
+        self.will_save_photo = str(get_config_by_section("crawl", "save_screenshot")) == "True"
         self.init_window_crawler()
 
     def init_window_crawler(self):
@@ -29,6 +33,7 @@ class WindowCrawler:
         os.makedirs(self.download_dir, exist_ok=True)
 
     @staticmethod
+    @instrument("window", "start_app")
     def start_app(filepath: Union[os.PathLike, str]):
         """启动APP"""
         threading.Thread(target=os.startfile, args=(filepath,)).start()
@@ -44,104 +49,185 @@ class WindowCrawler:
     @staticmethod
     def find_app_by_name(name_pattern: str) -> Optional[Application]:
         """通过APP名称查找应用"""
+        from pywinauto import Desktop, Application
         # 遍历所有窗口，打印窗口标题和句柄
+        pattern = compile_pattern(name_pattern)
         for window in Desktop(backend="uia").windows():
-            if re.search(name_pattern, window.window_text()):
+            if pattern.search(window.window_text()):
                 app = Application(backend="uia").connect(handle=window.handle)
                 return app
 
+    @staticmethod
+    def find_app_by_names(name_patterns: dict[str, str]) -> Optional[tuple[str, Application]]:
+        """
+        一次遍历桌面窗口，查找匹配多个名称正则中任一个的应用
+        :param name_patterns: {名称: 正则}
+        :return: (匹配的名称, 应用)，找不到时返回None
+        """
+        from pywinauto import Desktop, Application
+        matched = get_multi_matcher(name_patterns).find_first(Desktop(backend="uia").windows(),
+                                                             lambda window: window.window_text())
+        if matched is None:
+            return None
+        name, window = matched
+        return name, Application(backend="uia").connect(handle=window.handle)
+
+    @instrument("window", "wait")
     def wait_app_by_name(self, name_pattern: str, times: int = 6, interval: int = 5):
         """等待APP名称对应的应用"""
-        for _ in range(times):
+        for _ in poll(times, interval):
             app = self.find_app_by_name(name_pattern)
             if app:
                 return app
-            time.sleep(interval)
+            metrics.retry("window", "wait")
         raise Exception("查找名称为：%s 的应用时找不到" % name_pattern)
 
     @staticmethod
     def find_window_by_name(app: Application, name_pattern: str, class_type: any = None):
         """通过名称和类型查找子窗口"""
+        pattern = compile_pattern(name_pattern)
         for window in app.windows():
-            if re.search(name_pattern, window.window_text()):
+            if pattern.search(window.window_text()):
                 if class_type is None:
                     return window
                 elif isinstance(window, class_type):
                     return window
 
+    @staticmethod
+    def find_window_by_names(app: Application, name_patterns: dict[str, str]) -> Optional[tuple[str, UIAWrapper]]:
+        """
+        一次遍历子窗口，查找匹配多个名称正则中任一个的窗口，用于等待几种可能出现的对话框
+        :param app: 应用
+        :param name_patterns: {名称: 正则}
+        :return: (匹配的名称, 窗口)，找不到时返回None
+        """
+        return get_multi_matcher(name_patterns).find_first(app.windows(), lambda window: window.window_text())
+
+    @instrument("window", "wait")
+    def wait_window_by_names(self, app: Application, name_patterns: dict[str, str], times: int = 6,
+                             interval: int = 5) -> tuple[str, UIAWrapper]:
+        """等待多个名称正则中任一个对应的子窗口出现"""
+        for _ in poll(times, interval):
+            matched = self.find_window_by_names(app, name_patterns)
+            if matched:
+                return matched
+            metrics.retry("window", "wait")
+        raise Exception("查找名称为：%s 的窗口时找不到" % "|".join(name_patterns.values()))
+
+    @instrument("window", "wait")
     def wait_window_by_name(self, app: Application, name_pattern: str, class_type: any = None, times: int = 6,
                             interval: int = 5):
         """通过名称和类型查找子窗口"""
-        for i in range(times):
+        for _ in poll(times, interval):
             window = self.find_window_by_name(app, name_pattern, class_type)
             if window:
                 return window
-            time.sleep(interval)
+            metrics.retry("window", "wait")
         raise Exception("查找名称为：%s 的窗口时找不到" % name_pattern)
 
     @staticmethod
     def find_element_by_app(app: Application, name_pattern: str, class_type: any = None):
         """通过名称和类型查找子元素"""
+        pattern = compile_pattern(name_pattern)
         for window in app.windows():
             for child in window.descendants():
-                if re.search(name_pattern, child.window_text()):
+                if pattern.search(child.window_text()):
                     if class_type is None:
-                        print(type(child))
                         return child
                     elif isinstance(child, class_type):
                         return child
 
+    @instrument("window", "wait")
     def wait_element_by_app(self, app: Application, name_pattern: str, class_type: any = None, times: int = 6,
                             interval: int = 5) -> UIAWrapper:
         """通过名称和类型查找子元素"""
-        for i in range(times):
+        for _ in poll(times, interval):
             element = self.find_element_by_app(app, name_pattern, class_type)
             if element:
                 return element
-            time.sleep(interval)
+            metrics.retry("window", "wait")
         raise Exception("查找名称为：%s 的元素时找不到" % name_pattern)
 
     @staticmethod
     def find_element_by_wrapper(wrapper: UIAWrapper, name_pattern: str, class_type: any = None) -> Optional[UIAWrapper]:
         """通过名称和类型查找子元素"""
+        pattern = compile_pattern(name_pattern)
         for child in wrapper.descendants():
-            if re.search(name_pattern, child.window_text()):
+            if pattern.search(child.window_text()):
                 if class_type is None:
-                    print(type(child))
                     return child
                 elif isinstance(child, class_type):
                     return child
 
+    @instrument("window", "wait")
     def wait_element_by_wrapper(self, wrapper: UIAWrapper, name_pattern: str, class_type: any = None, times: int = 6,
                                 interval: int = 5):
         """通过名称和类型查找子元素"""
-        for i in range(times):
+        for _ in poll(times, interval):
             element = self.find_element_by_wrapper(wrapper, name_pattern, class_type)
             if element:
                 return element
-            time.sleep(interval)
+            metrics.retry("window", "wait")
         raise Exception("查找名称为：%s 的元素时找不到" % name_pattern)
 
     @staticmethod
+    def snapshot_app(app: Application, max_depth: int = None) -> UiaSnapshot:
+        """
+        一次遍历应用所有窗口的子元素，生成带索引的快照，多次查询时代替find_element_by_*
+        :param app: 应用
+        :param max_depth: 最大遍历深度
+        """
+        return UiaSnapshot(app.windows(), max_depth=max_depth, roots_getter=app.windows)
+
+    @staticmethod
+    @instrument("window", "wait")
+    def wait_element_by_snapshot(snapshot: UiaSnapshot, name_pattern: str = None, automation_id: str = None,
+                                 control_type: str = None, class_type: any = None, times: int = 6,
+                                 interval: int = 5, parent: UIAWrapper = None) -> UIAWrapper:
+        """
+        在快照中查找子元素，找不到时只刷新发生变化的子树后重试，窗口打开或关闭时才全量遍历
+        :param parent: 元素所在的父元素，指定时每次重试只重新遍历该子树
+        """
+        for attempt in poll(times, interval):
+            if attempt and not snapshot.refresh_roots():
+                if parent is None or not snapshot.refresh_node(parent):
+                    # 每次检查第1层和轮换的一个更深层级的指纹，只读取这两层节点，深层的变化在后续重试中发现
+                    snapshot.refresh_changed(1)
+                    levels = snapshot.depth()
+                    if levels > 1:
+                        snapshot.refresh_changed(2 + (attempt - 1) % (levels - 1))
+            element = snapshot.find(automation_id, control_type, name_pattern, class_type)
+            if element:
+                return element
+            metrics.retry("window", "wait")
+        raise Exception("查找名称为：%s，automation_id为：%s 的元素时找不到" % (name_pattern, automation_id))
+
+    @staticmethod
+    @instrument("window", "input")
     def send_input_keys(input_element: EditWrapper, keys: str):
         """对元素进行输入操作"""
+        from pywinauto.keyboard import send_keys
         input_element.set_focus()
         send_keys(keys)
 
+    @instrument("window", "screenshot")
     def save_screenshot(self, element: Union[Application, UIAWrapper], out_path: Union[os.PathLike, str],
-                        filename: str = None) -> Union[PathLike, str, None]:
+                        filename: str = None, wait: bool = False) -> Union[PathLike, str, None]:
         """
             保存元素所属窗口的截图，MenuItemWrapper的父窗口可能没有，会报错
+            调用线程只截取画面，编码和写文件由截图服务在后台完成
             pip install Pillow
+        :param filename: 文件名，为空时生成不重复的文件名，与该窗口上一张相同的截图不保存
+        :param wait: 是否等待写入完成
+        :return: 保存路径；未等待时为计划写入的路径，后台积压或截图重复时不会生成该文件
         """
+        from pywinauto import Application
         try:
             if not self.will_save_photo:
                 return None
-            if not os.path.exists(out_path):
-                os.makedirs(out_path, exist_ok=True)
-            if filename is None:
-                filename = "%s.png" % (int(time.time()))
-                time.sleep(1)
+            service = get_screenshot_service()
+            if filename is None and service.is_busy():
+                return None
             if isinstance(element, Application):
                 parent = element.windows()[0]
             elif element.is_dialog():
@@ -150,9 +236,7 @@ class WindowCrawler:
                 parent = element.parent()
                 while parent and not parent.is_dialog():  # 判断是否为窗口层级
                     parent = parent.parent()
-            filepath = os.path.join(out_path, filename)
-            parent.capture_as_image().save(filepath)
-            return filepath
+            return service.save(parent.capture_as_image(), out_path, filename, "window-%s" % parent.handle, wait)
         except Exception as e:
             raise Exception("截图失败：%s" % e)
 
@@ -164,14 +248,15 @@ class WindowCrawler:
                 if automation_id == str(child.automation_id()):
                     return child
 
+    @instrument("window", "wait")
     def wait_element_by_id(self, app: Application, automation_id: str, times: int = 6,
                            interval: int = 5):
         """通过名称和类型查找子元素"""
-        for i in range(times):
+        for _ in poll(times, interval):
             element = self.find_element_by_id(app, automation_id)
             if element:
                 return element
-            time.sleep(interval)
+            metrics.retry("window", "wait")
         raise Exception("查找automation_id为：%s 的元素时找不到" % automation_id)
 
     @staticmethod
@@ -185,59 +270,101 @@ class WindowCrawler:
         return parent
 
     @staticmethod
+    @instrument("window", "click")
     def click_by_template(window: UIAWrapper, template_path: Union[os.PathLike, str], relative_x: float = 0.5,
-                          relative_y: float = 0.5, match_val: float = 0.8):
-        """图片模板匹配点击"""
+                          relative_y: float = 0.5, match_val: float = 0.8, settle: bool = True):
+        """
+        图片模板匹配点击
+        :param settle: 启用pacing时是否等待窗口状态不再变化后返回
+        """
+        from pywinauto.mouse import click
+        from core.crawl.template_library import default_template_library
         rect = window.rectangle()
         left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
 
-        screen = window.capture_as_image()
-        screen = cv2.cvtColor(np.array(screen), cv2.COLOR_RGB2GRAY)
-        template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+        screen = default_template_library.to_gray(window.capture_as_image())
 
         # 模板匹配
-        result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-        if max_val < match_val:
+        matched = default_template_library.match(screen, template_path, match_val)
+        if matched is None:
             raise Exception("未找到匹配控件：%s" % template_path)
 
         # 计算坐标
-        template_h, template_w = template.shape[:2]
+        max_loc, _, (template_h, template_w) = matched
         top_left_x, top_left_y = max_loc
         x = int(left + top_left_x + template_w * relative_x)
         y = int(top + top_left_y + template_h * relative_y)
 
         # 点击
         click(coords=(x, y))
+        if settle:
+            WindowCrawler.wait_window_settled(window, "window_click")
 
     @staticmethod
+    @instrument("window", "template_match")
     def find_by_template(window: UIAWrapper, template_path: Union[os.PathLike, str], match_val: float = 0.8
                          ) -> Optional[Sequence[int]]:
         """图片模板匹配元素"""
-        screen = window.capture_as_image()
-        screen = cv2.cvtColor(np.array(screen), cv2.COLOR_RGB2GRAY)
-        template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-
-        # 模板匹配
-        result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-        if max_val < match_val:
+        from core.crawl.template_library import default_template_library
+        screen = default_template_library.to_gray(window.capture_as_image())
+        matched = default_template_library.match(screen, template_path, match_val)
+        if matched is None:
             return None
-        return max_loc
+        return matched[0]
+
+    @staticmethod
+    @instrument("window", "template_match")
+    def find_by_templates(window: UIAWrapper, template_paths: Sequence[Union[os.PathLike, str]],
+                          match_val: float = 0.8) -> dict:
+        """
+        对同一次窗口截图匹配多个模板
+        :return: {模板路径: 左上角坐标或None}
+        """
+        from core.crawl.template_library import default_template_library
+        screen = default_template_library.to_gray(window.capture_as_image())
+        results = default_template_library.match_many(screen, template_paths, match_val)
+        return {path: matched[0] if matched else None for path, matched in results.items()}
+
+    @staticmethod
+    @instrument("window", "template_match")
+    def find_all_by_template(window: UIAWrapper, template_path: Union[os.PathLike, str], match_val: float = 0.8,
+                             roi: Optional[Sequence[int]] = None, scales: Sequence[float] = (1.0,),
+                             max_results: Optional[int] = None) -> list[TemplateMatch]:
+        """
+        图像金字塔匹配窗口中所有符合的元素
+        :param window: 窗口
+        :param template_path: 模板图片路径
+        :param match_val: 最低匹配度
+        :param roi: 窗口内的搜索区域(x, y, 宽, 高)，为空时搜索整个窗口
+        :param scales: 模板缩放比例，用于匹配不同DPI下截取的模板
+        :param max_results: 最多返回的结果数，为None时返回全部
+        :return: 按匹配度排序的TemplateMatch，坐标相对窗口左上角
+        """
+        from core.crawl.template_library import default_template_library
+        from core.crawl.template_matcher import default_template_matcher
+        screen = default_template_library.to_gray(window.capture_as_image())
+        return default_template_matcher.find(screen, template_path, match_val, roi, scales, max_results)
 
+    @instrument("window", "wait")
     def wait_by_template(self, window: UIAWrapper, template_path: Union[os.PathLike, str], match_val: float = 0.8,
                          times: int = 6, interval: int = 5):
         """图片模板匹配元素"""
-        for i in range(times):
+        for _ in poll(times, interval):
             max_loc = self.find_by_template(window, template_path, match_val)
             if max_loc:
                 return max_loc
-            time.sleep(interval)
+            metrics.retry("window", "wait")
         raise Exception("查找template_path为：%s 的元素时找不到" % template_path)
 
     @staticmethod
-    def click_by_element(element: UIAWrapper, relative_x: float = 0.5, relative_y: float = 0.5):
-        """根据元素位置点击"""
+    @instrument("window", "click")
+    def click_by_element(element: UIAWrapper, relative_x: float = 0.5, relative_y: float = 0.5,
+                         settle: bool = True):
+        """
+        根据元素位置点击
+        :param settle: 启用pacing时是否等待元素所在窗口的状态不再变化后返回
+        """
+        from pywinauto.mouse import click
         rect = element.rectangle()
         left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
         width = right - left
@@ -245,26 +372,62 @@ class WindowCrawler:
         x = int(left + width * relative_x)
         y = int(top + height * relative_y)
         click(coords=(x, y))
+        if settle:
+            WindowCrawler.wait_window_settled(element.top_level_parent(), "window_click")
 
     @staticmethod
-    def input_keys(text: str, sleep_time: float = 0.5):
+    @instrument("window", "input")
+    def input_keys(text: str, sleep_time: float = None, window: UIAWrapper = None):
+        """
+        键盘输入
+        :param sleep_time: 输入后的固定等待时间/秒
+        :param window: 接收输入的窗口，sleep_time为空且启用pacing时等待该窗口状态不再变化，代替固定等待
+        """
+        from pywinauto.keyboard import send_keys
         send_keys(text)
-        time.sleep(sleep_time)
+        if sleep_time is None and window is not None and get_action_pacer() is not None:
+            WindowCrawler.wait_window_settled(window, "window_input")
+        else:
+            time.sleep(sleep_time if sleep_time is not None else 0.5)
 
-    def save_desktop_shot(self, out_path: Union[os.PathLike, str], filename: str = None):
+    @staticmethod
+    def wait_window_settled(window: UIAWrapper, action: str = "window_click", fallback_sleep: float = 0.0):
         """
-            保存元素所属窗口的截图，MenuItemWrapper的父窗口可能没有，会报错
+        等待窗口的文本、子元素数和位置不再变化，代替操作后的固定等待
+        :param window: 操作的窗口
+        :param action: 操作名称，用于统计和学习最少等待时间
+        :param fallback_sleep: 未启用pacing时的固定等待时间/秒
+        """
+        pacer = get_action_pacer()
+        if pacer is None:
+            if fallback_sleep > 0:
+                time.sleep(fallback_sleep)
+            return
+
+        def fingerprint() -> tuple:
+            rect = window.rectangle()
+            return window.window_text(), len(window.children()), rect.left, rect.top, rect.right, rect.bottom
+
+        pacer.settle_window(fingerprint, action)
+
+    @instrument("window", "screenshot")
+    def save_desktop_shot(self, out_path: Union[os.PathLike, str], filename: str = None,
+                          wait: bool = False) -> Union[PathLike, str, None]:
+        """
+            保存桌面截图，调用线程只截取画面，编码和写文件由截图服务在后台完成
             pip install Pillow
+        :param filename: 文件名，为空时生成不重复的文件名，与上一张相同的桌面截图不保存
+        :param wait: 是否等待写入完成
+        :return: 保存路径；未等待时为计划写入的路径，后台积压或截图重复时不会生成该文件
         """
+        from PIL import ImageGrab
         try:
             if not self.will_save_photo:
-                return
-            if not os.path.exists(out_path):
-                os.makedirs(out_path, exist_ok=True)
-            if filename is None:
-                filename = "%s.png" % (int(time.time()))
-                time.sleep(1)
-            ImageGrab.grab().save(os.path.join(out_path, filename))
+                return None
+            service = get_screenshot_service()
+            if filename is None and service.is_busy():
+                return None
+            return service.save(ImageGrab.grab(), out_path, filename, "desktop", wait)
         except Exception as e:
             raise Exception("截图失败：%s" % e)
 
@@ -272,9 +435,10 @@ class WindowCrawler:
     def find_elements_by_app(app: Application, name_pattern: str, class_type: any = None) -> list:
         """通过名称和类型查找所有匹配子元素"""
         children = []
+        pattern = compile_pattern(name_pattern)
         for window in app.windows():
             for child in window.descendants():
-                if re.search(name_pattern, child.window_text()):
+                if pattern.search(child.window_text()):
                     if class_type is None:
                         children.append(child)
                         break
@@ -1,20 +1,234 @@
+import atexit
+import contextvars
+import json
 import logging
 import os
+import queue
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from logging.handlers import TimedRotatingFileHandler
+from random import Random
+from typing import Any, Optional
 
-from core.config.config import get_config_by_section
+from core.config.config import get_config_by_section, add_reload_listener
 
-logger_save_path = get_config_by_section("logger", "save_path")
-os.makedirs(logger_save_path, exist_ok=True)
-logger_file = "%s/log.log" % logger_save_path
+_task_id = contextvars.ContextVar("log_task_id", default=None)
+_session_id = contextvars.ContextVar("log_session_id", default=None)
 
-logging.basicConfig(
-    level=get_config_by_section("logger", "level"),
-    format=get_config_by_section("logger", "format"),
-    handlers=[
+
+@contextmanager
+def log_context(task_id: Any = None, session_id: Any = None):
+    """
+    在当前线程/协程内为日志附加任务ID和会话ID，为空的参数保持外层的值
+    :param task_id: 任务ID
+    :param session_id: 浏览器会话ID
+    """
+    tokens = []
+    if task_id is not None:
+        tokens.append((_task_id, _task_id.set(task_id)))
+    if session_id is not None:
+        tokens.append((_session_id, _session_id.set(session_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """为日志记录添加task_id和session_id属性，格式中可使用%(task_id)s"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "task_id"):
+            record.task_id = _task_id.get()
+        if not hasattr(record, "session_id"):
+            record.session_id = _session_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "task_id": getattr(record, "task_id", None),
+            "session_id": getattr(record, "session_id", None),
+            "thread": record.threadName
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class AsyncLogHandler(logging.Handler):
+
+    def __init__(self, handlers: list, queue_size: int = 10000, batch_size: int = 256, flush_interval: float = 0.5,
+                 overflow: str = "drop", sample_rate: float = 0.1):
+        """
+        异步日志：调用线程只把记录放入有界队列，后台线程批量格式化后一次写入各输出并flush
+        :param handlers: 实际输出的handler，只在后台线程中使用
+        :param queue_size: 队列长度
+        :param batch_size: 每批最多写入的记录数
+        :param flush_interval: 队列为空时最长多久写入一次/秒
+        :param overflow: 队列满时的处理方式，drop->丢弃新记录，sample->队列超过80%后INFO及以下按sample_rate抽样，
+        满时丢弃，block->阻塞等待
+        :param sample_rate: sample模式下保留的比例
+        """
+        super().__init__()
+        if overflow not in ("drop", "sample", "block"):
+            raise ValueError("不支持的日志溢出处理方式：%s" % overflow)
+        self.handlers = handlers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.sample_rate = sample_rate
+        self._high_water = int(queue_size * 0.8)
+        self._rand = Random()
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0  # 入队的记录数
+        self.dropped = 0  # 队列满丢弃的记录数
+        self.sampled_out = 0  # 抽样丢弃的记录数
+        self.written = 0  # 已写入的记录数
+        self.batches = 0  # 写入批次数
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """在调用线程中合并消息参数和异常文本，后台线程不再访问调用方的对象"""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        if self._stopped:
+            return
+        try:
+            if self.overflow == "sample" and record.levelno <= logging.INFO \
+                    and self.queue.qsize() >= self._high_water and self._rand.random() >= self.sample_rate:
+                with self._stats_lock:
+                    self.sampled_out += 1
+                return
+            record = self.prepare(record)
+            if self.overflow == "block":
+                self.queue.put(record)
+            else:
+                self.queue.put_nowait(record)
+            with self._stats_lock:
+                self.enqueued += 1
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stopped:
+                    return
+                continue
+            if record is None:
+                return
+            batch = [record]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch: list):
+        for handler in self.handlers:
+            try:
+                if isinstance(handler, TimedRotatingFileHandler):
+                    self._write_file(handler, batch)
+                elif isinstance(handler, logging.StreamHandler):
+                    records = [record for record in batch if record.levelno >= handler.level]
+                    if records:
+                        handler.stream.write("".join(handler.format(record) + "\n" for record in records))
+                        handler.flush()
+                else:
+                    for record in batch:
+                        handler.handle(record)
+            except Exception:
+                sys.stderr.write("写入日志失败：%s\n" % handler)
+        with self._stats_lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    @staticmethod
+    def _write_file(handler: TimedRotatingFileHandler, batch: list):
+        """按批写入滚动日志文件，到达滚动时间时先写入已格式化的部分再滚动"""
+        lines = []
+        for record in batch:
+            if record.levelno < handler.level:
+                continue
+            if handler.shouldRollover(record):
+                if lines:
+                    handler.stream.write("".join(lines))
+                    lines = []
+                handler.doRollover()
+            if handler.stream is None:
+                handler.stream = handler._open()
+            lines.append(handler.format(record) + "\n")
+        if lines:
+            handler.stream.write("".join(lines))
+            handler.flush()
+
+    def stop(self, timeout: float = 5):
+        """写入队列中剩余的记录并停止后台线程"""
+        if self._stopped:
+            return
+        self._stopped = True
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self):
+        self.stop()
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"enqueued": self.enqueued, "dropped": self.dropped, "sampled_out": self.sampled_out,
+                    "written": self.written, "batches": self.batches, "queued": self.queue.qsize()}
+
+
+def _create_handlers() -> list:
+    logger_save_path = get_config_by_section("logger", "save_path")
+    os.makedirs(logger_save_path, exist_ok=True)
+    handlers = [
         TimedRotatingFileHandler(
-            filename=logger_file,
+            filename="%s/log.log" % logger_save_path,
             when=get_config_by_section("logger", "when"),
             interval=get_config_by_section("logger", "interval"),
             backupCount=get_config_by_section("logger", "backup_count"),
@@ -24,5 +238,106 @@ logging.basicConfig(
         ),
         logging.StreamHandler(sys.stdout)
     ]
-)
-logger = logging.getLogger("selenium")
\ No newline at end of file
+    if get_config_by_section("logger", "json"):
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(get_config_by_section("logger", "format"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def _setup_handlers() -> tuple[list, Optional[AsyncLogHandler]]:
+    handlers = _create_handlers()
+    context_filter = ContextFilter()
+    async_handler = None
+    if get_config_by_section("logger", "async"):
+        async_handler = AsyncLogHandler(handlers, get_config_by_section("logger", "queue_size"),
+                                        get_config_by_section("logger", "batch_size"),
+                                        get_config_by_section("logger", "flush_interval"),
+                                        get_config_by_section("logger", "overflow"),
+                                        get_config_by_section("logger", "sample_rate"))
+        async_handler.addFilter(context_filter)
+        atexit.register(async_handler.stop)
+        handlers = [async_handler]
+    else:
+        for handler in handlers:
+            handler.addFilter(context_filter)
+    return handlers, async_handler
+
+
+class _BootstrapHandler(logging.Handler):
+    """导入模块时挂在root上的占位handler，首次有日志记录时才读取配置并创建日志文件和handler"""
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        setup_logging()
+        if _bootstrap_handler is not None:
+            # 初始化过程中同一线程产生的记录，或初始化失败，输出到标准错误
+            if record.levelno >= logging.lastResort.level:
+                logging.lastResort.handle(record)
+        elif record.levelno >= logging.getLogger(record.name).getEffectiveLevel():
+            logging.root.handle(record)
+        return True
+
+    def emit(self, record: logging.LogRecord):
+        pass
+
+
+_setup_lock = threading.RLock()
+_setting_up = False
+_bootstrap_handler = None
+async_log_handler = None  # 异步模式下的日志handler，同步模式或尚未初始化时为None
+
+
+def setup_logging() -> Optional[AsyncLogHandler]:
+    """
+    按logger配置创建日志handler，只执行一次；首次记录日志时自动调用，也可在启动时主动调用
+    :return: 异步模式下的日志handler，同步模式为None
+    """
+    global _bootstrap_handler, _setting_up, async_log_handler
+    with _setup_lock:
+        if _bootstrap_handler is not None and not _setting_up:
+            _setting_up = True
+            try:
+                handlers, async_handler = _setup_handlers()
+                # 替换而不是原地修改handlers列表，避免正在遍历该列表的记录被新handler重复处理
+                logging.root.handlers = [handler for handler in logging.root.handlers
+                                         if handler is not _bootstrap_handler]
+                _bootstrap_handler = None
+                logging.basicConfig(level=get_config_by_section("logger", "level"), handlers=handlers)
+                async_log_handler = async_handler
+                add_reload_listener(_apply_level)
+            finally:
+                _setting_up = False
+    return async_log_handler
+
+
+def _apply_level():
+    """配置热更新后调整日志级别"""
+    logging.root.setLevel(get_config_by_section("logger", "level"))
+
+
+if not logging.root.handlers:
+    # 未配置日志时挂上占位handler并放开root级别，使首条记录能触发初始化，导入本模块不读取配置也不创建文件
+    _bootstrap_handler = _BootstrapHandler()
+    logging.root.addHandler(_bootstrap_handler)
+    logging.root.setLevel(logging.DEBUG)
+logger = logging.getLogger("selenium")
+
+
+def get_log_stats() -> Optional[dict]:
+    """异步日志的队列统计，同步模式或尚未初始化时返回None"""
+    return async_log_handler.stats() if async_log_handler is not None else None
+
+
+def wait_log_idle(timeout: float = 5) -> bool:
+    """等待异步日志队列写完，返回是否已写完"""
+    if async_log_handler is None:
+        return True
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = async_log_handler.stats()
+        if stats["written"] >= stats["enqueued"]:
+            return True
+        time.sleep(0.01)
+    return False
@@ -0,0 +1,308 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from core.config.config import get_config_by_section, add_reload_listener
+from core.log.logger import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """耗时直方图，桶为累计计数的上限/秒"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为+Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class TaskTrace:
+
+    def __init__(self, task_id: Any, attributes: dict):
+        """
+        单个任务的操作记录
+        :param task_id: 任务ID
+        :param attributes: 任务附加信息，如链接
+        """
+        self.task_id = task_id
+        self.attributes = attributes
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans = []  # 按开始时间排列的操作
+        self.depth = 0  # 当前嵌套层数
+
+    def to_dict(self) -> dict:
+        return {"task_id": self.task_id, "attributes": self.attributes, "started_at": self.started_at,
+                "duration": time.perf_counter() - self._start, "spans": self.spans}
+
+
+class MetricsRegistry:
+
+    def __init__(self, enabled: bool = False, trace_dir: str = None):
+        """
+        爬虫操作的指标和追踪：按组件和操作统计耗时直方图、调用结果、失败原因和重试次数，
+        可输出Prometheus文本格式，trace_task内的操作写入每个任务的JSON追踪文件
+        未启用时被装饰的方法只多一次属性判断
+        :param enabled: 是否启用，为None时首次使用时读取metrics配置，配置热更新后重新读取
+        :param trace_dir: 追踪文件目录，enabled为None时同样读取配置
+        """
+        self._from_config = enabled is None
+        self._enabled = enabled
+        self._trace_dir = trace_dir
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._durations = {}  # (组件, 操作)->Histogram
+        self._results = {}  # (组件, 操作, success/failure)->次数
+        self._failures = {}  # (组件, 操作, 原因)->次数
+        self._retries = {}  # (组件, 操作)->次数
+
+    @classmethod
+    def from_config(cls) -> "MetricsRegistry":
+        """按metrics配置延迟初始化，创建时不读取配置"""
+        registry = cls(None)
+        add_reload_listener(registry._load_config)
+        return registry
+
+    def _load_config(self):
+        if self._from_config:
+            self._enabled = bool(get_config_by_section("metrics", "enabled"))
+            self._trace_dir = get_config_by_section("metrics", "trace_dir")
+
+    @property
+    def enabled(self) -> bool:
+        if self._enabled is None:
+            self._load_config()
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled: bool):
+        self._enabled = enabled
+        self._from_config = False
+
+    @property
+    def trace_dir(self) -> str:
+        if self._enabled is None:
+            self._load_config()
+        return self._trace_dir
+
+    @trace_dir.setter
+    def trace_dir(self, trace_dir: str):
+        if self._enabled is None:
+            self._load_config()
+        self._trace_dir = trace_dir
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._results.clear()
+            self._failures.clear()
+            self._retries.clear()
+
+    def observe(self, component: str, action: str, duration: float, reason: str = None):
+        """
+        记录一次操作
+        :param component: 组件，如web、window
+        :param action: 操作，如navigate、wait、click
+        :param duration: 耗时/秒
+        :param reason: 失败原因，为空表示成功
+        """
+        key = (component, action)
+        with self._lock:
+            histogram = self._durations.get(key)
+            if histogram is None:
+                histogram = self._durations[key] = Histogram()
+            histogram.observe(duration)
+            outcome = (component, action, "success" if reason is None else "failure")
+            self._results[outcome] = self._results.get(outcome, 0) + 1
+            if reason is not None:
+                failure = (component, action, reason)
+                self._failures[failure] = self._failures.get(failure, 0) + 1
+
+    def retry(self, component: str, action: str):
+        """记录一次重试"""
+        if not self.enabled:
+            return
+        key = (component, action)
+        with self._lock:
+            self._retries[key] = self._retries.get(key, 0) + 1
+        trace = self.current_trace()
+        if trace is not None:
+            trace.spans.append({"component": component, "action": action, "event": "retry",
+                                "offset": time.perf_counter() - trace._start, "depth": trace.depth})
+
+    def current_trace(self) -> Optional[TaskTrace]:
+        return getattr(self._local, "trace", None)
+
+    @contextmanager
+    def trace_task(self, task_id: Any, **attributes):
+        """
+        在当前线程记录任务内的所有操作，结束后写入trace_dir/<task_id>.json
+        :param task_id: 任务ID
+        :param attributes: 任务附加信息
+        """
+        if not self.enabled:
+            yield None
+            return
+        previous = self.current_trace()
+        trace = TaskTrace(task_id, attributes)
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            self._local.trace = previous
+            self._save_trace(trace)
+
+    def _save_trace(self, trace: TaskTrace):
+        if not self.trace_dir:
+            return
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            with open(os.path.join(self.trace_dir, "%s.json" % trace.task_id), "w", encoding="utf-8") as file:
+                json.dump(trace.to_dict(), file, ensure_ascii=False, default=str)
+        except OSError as e:
+            logger.warning("保存追踪文件失败：%s, %s" % (trace.task_id, e))
+
+    def render_prometheus(self) -> str:
+        """输出Prometheus文本格式"""
+        lines = ["# HELP crawler_action_duration_seconds Crawler action duration",
+                 "# TYPE crawler_action_duration_seconds histogram"]
+        with self._lock:
+            for (component, action), histogram in sorted(self._durations.items()):
+                labels = 'component="%s",action="%s"' % (component, action)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append('crawler_action_duration_seconds_bucket{%s,le="%s"} %s' % (labels, le, cumulative))
+                lines.append("crawler_action_duration_seconds_sum{%s} %s" % (labels, repr(histogram.sum)))
+                lines.append("crawler_action_duration_seconds_count{%s} %s" % (labels, histogram.count))
+            lines.append("# HELP crawler_actions_total Crawler actions by outcome")
+            lines.append("# TYPE crawler_actions_total counter")
+            for (component, action, outcome), count in sorted(self._results.items()):
+                lines.append('crawler_actions_total{component="%s",action="%s",outcome="%s"} %s' % (
+                    component, action, outcome, count))
+            lines.append("# HELP crawler_action_failures_total Crawler action failures by reason")
+            lines.append("# TYPE crawler_action_failures_total counter")
+            for (component, action, reason), count in sorted(self._failures.items()):
+                lines.append('crawler_action_failures_total{component="%s",action="%s",reason="%s"} %s' % (
+                    component, action, _escape_label(reason), count))
+            lines.append("# HELP crawler_action_retries_total Crawler action retries")
+            lines.append("# TYPE crawler_action_retries_total counter")
+            for (component, action), count in sorted(self._retries.items()):
+                lines.append('crawler_action_retries_total{component="%s",action="%s"} %s' % (
+                    component, action, count))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """以字典返回当前统计"""
+        with self._lock:
+            return {
+                "durations": {"%s.%s" % key: {"count": histogram.count, "sum": histogram.sum}
+                              for key, histogram in self._durations.items()},
+                "results": {"%s.%s.%s" % key: count for key, count in self._results.items()},
+                "failures": {"%s.%s.%s" % key: count for key, count in self._failures.items()},
+                "retries": {"%s.%s" % key: count for key, count in self._retries.items()}
+            }
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = MetricsRegistry.from_config()  # 全局指标
+
+
+def instrument(component: str, action: str, check_result: bool = False) -> Callable:
+    """
+    记录被装饰方法的耗时和结果，异常按类型名记为失败原因
+    :param component: 组件，如web、window
+    :param action: 操作，如navigate、wait、click
+    :param check_result: 返回值为False或None时也记为失败
+    """
+
+    def decorator(func: Callable) -> Callable:
+        target_index = 1 if func.__code__.co_varnames[:1] == ("self",) else 0
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            trace = metrics.current_trace()
+            span = None
+            if trace is not None:
+                target = args[target_index] if len(args) > target_index else None
+                span = {"component": component, "action": action, "method": func.__name__,
+                        "target": target[:200] if isinstance(target, str) else None,
+                        "offset": time.perf_counter() - trace._start, "depth": trace.depth}
+                trace.spans.append(span)
+                trace.depth += 1
+            reason = None
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                if check_result and (result is None or result is False):
+                    reason = "empty_result"
+                return result
+            except BaseException as e:
+                reason = type(e).__name__
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                metrics.observe(component, action, duration, reason)
+                if span is not None:
+                    trace.depth -= 1
+                    span["duration"] = duration
+                    span["ok"] = reason is None
+                    if reason is not None:
+                        span["reason"] = reason
+
+        return wrapper
+
+    return decorator
+
+
+def create_metrics_app(registry: MetricsRegistry = None) -> Any:
+    """创建提供/metrics的Flask应用"""
+    import flask
+
+    registry = registry if registry is not None else metrics
+    app = flask.Flask("crawler_metrics")
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return flask.Response(registry.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/metrics/json")
+    def json_metrics():
+        return flask.jsonify(registry.snapshot())
+
+    return app
+
+
+def start_metrics_server(host: str = None, port: int = None) -> threading.Thread:
+    """在后台线程启动指标服务，参数为空时读取metrics配置"""
+    from werkzeug.serving import make_server
+
+    host = host if host is not None else get_config_by_section("metrics", "host")
+    port = port if port is not None else get_config_by_section("metrics", "port")
+    server = make_server(host, port, create_metrics_app(), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.server = server
+    thread.start()
+    return thread
@@ -0,0 +1,270 @@
+import json
+import os
+import threading
+from typing import Any, Optional
+
+from core.common.file_utils import file_hash
+from core.config.config import get_config_by_section
+from core.log.logger import logger
+
+
+class TaskProgress:
+    """单个任务的进度"""
+
+    def __init__(self):
+        self.urls = set()  # 已完成的链接
+        self.files = {}  # 文件路径->{sha256, size, url}
+        self.cursors = {}  # 名称->分页游标
+
+    def to_dict(self) -> dict:
+        return {"urls": sorted(self.urls), "files": self.files, "cursors": self.cursors}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TaskProgress":
+        progress = cls()
+        progress.urls.update(data.get("urls", []))
+        progress.files.update(data.get("files", {}))
+        progress.cursors.update(data.get("cursors", {}))
+        return progress
+
+
+class CheckpointStore:
+
+    def __init__(self, journal_path: str = None, compact_every: int = None, fsync: bool = None):
+        """
+        崩溃安全的断点记录：按任务记录已完成的链接、已下载的文件及哈希、最后的分页游标
+        每次变更追加一行到日志文件，重启后由快照和日志恢复；日志达到compact_every行时合并为新快照并清空日志
+        参数为空时读取checkpoint配置
+        :param journal_path: 日志文件路径，快照保存在同目录的<journal_path>.snapshot
+        :param compact_every: 日志行数达到该值时合并
+        :param fsync: 每次追加后是否fsync，开启后断电也不丢记录但写入更慢
+        """
+        self.journal_path = self._get_option(journal_path, "journal_path")
+        self.snapshot_path = self.journal_path + ".snapshot"
+        self.compact_every = self._get_option(compact_every, "compact_every")
+        self.fsync = self._get_option(fsync, "fsync")
+        journal_dir = os.path.dirname(self.journal_path)
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._tasks = {}  # 任务->TaskProgress
+        self._journal = None
+        self._journal_lines = 0  # 日志中的记录数
+        self.appended = 0  # 本进程追加的记录数
+        self.compactions = 0  # 本进程的合并次数
+        self._load()
+
+    @staticmethod
+    def _get_option(value: Any, option: str) -> Any:
+        return value if value is not None else get_config_by_section("checkpoint", option)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _load(self):
+        """读取快照并重放日志，进程崩溃时日志最后一行可能不完整，忽略即可"""
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as file:
+                self._tasks = {task: TaskProgress.from_dict(data) for task, data in json.load(file).items()}
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning("断点日志存在不完整的记录，已忽略：%s" % line[:200])
+                        continue
+                    self._apply(record)
+                    replayed += 1
+        if replayed:
+            logger.info("由断点日志恢复%s条记录：%s" % (replayed, self.journal_path))
+            self._compact()  # 合并后丢弃不完整的行，新记录从干净的日志开始追加
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _apply(self, record: dict):
+        """应用一条记录，重复应用结果不变，合并中途崩溃时重放日志也不会出错"""
+        task, op, value = record["t"], record["op"], record.get("v")
+        if op == "forget":
+            self._tasks.pop(task, None)
+            return
+        progress = self._tasks.get(task)
+        if progress is None:
+            progress = self._tasks[task] = TaskProgress()
+        if op == "url":
+            progress.urls.add(value)
+        elif op == "file":
+            progress.files[value["path"]] = {k: v for k, v in value.items() if k != "path"}
+        elif op == "unfile":
+            progress.files.pop(value, None)
+        elif op == "cursor":
+            if value["value"] is None:
+                progress.cursors.pop(value["name"], None)
+            else:
+                progress.cursors[value["name"]] = value["value"]
+
+    def _append(self, task: str, op: str, value: Any = None):
+        record = {"t": task, "op": op, "v": value}
+        with self._lock:
+            if self._journal is None:
+                raise Exception("断点记录已关闭：%s" % self.journal_path)
+            self._apply(record)
+            self._journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._journal_lines += 1
+            self.appended += 1
+            if self._journal_lines >= self.compact_every:
+                self._compact()
+
+    def _compact(self):
+        """写入新快照后清空日志，需持有锁；快照先写临时文件再替换，任意时刻崩溃都能恢复"""
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({task: progress.to_dict() for task, progress in self._tasks.items()}, file,
+                      ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, "w", encoding="utf-8")
+        self._journal_lines = 0
+        self.compactions += 1
+
+    def compact(self):
+        """立即合并日志"""
+        with self._lock:
+            self._compact()
+
+    def close(self):
+        """合并日志并关闭"""
+        with self._lock:
+            if self._journal is None:
+                return
+            if self._journal_lines:
+                self._compact()
+            self._journal.close()
+            self._journal = None
+
+    def mark_url_done(self, task: str, url: str):
+        """记录任务中已完成的链接"""
+        self._append(task, "url", url)
+
+    def is_url_done(self, task: str, url: str) -> bool:
+        with self._lock:
+            progress = self._tasks.get(task)
+            return progress is not None and url in progress.urls
+
+    def done_urls(self, task: str) -> set:
+        with self._lock:
+            progress = self._tasks.get(task)
+            return set(progress.urls) if progress is not None else set()
+
+    def record_file(self, task: str, file_path: str, url: str = None, sha256: str = None):
+        """
+        记录已下载完成的文件
+        :param task: 任务
+        :param file_path: 文件路径
+        :param url: 下载链接，用于重启后按链接查找文件
+        :param sha256: 文件哈希，为空时计算
+        """
+        file_path = os.path.abspath(file_path)
+        value = {"path": file_path, "sha256": sha256 or file_hash(file_path), "size": os.path.getsize(file_path),
+                 "url": url}
+        self._append(task, "file", value)
+
+    def forget_file(self, task: str, file_path: str):
+        """删除文件记录，如文件已被移动或校验失败"""
+        self._append(task, "unfile", os.path.abspath(file_path))
+
+    def get_file(self, task: str, url: str = None, file_path: str = None) -> Optional[dict]:
+        """
+        按链接或文件路径查找已下载的文件
+        :return: {path, sha256, size, url}，不存在时返回None
+        """
+        with self._lock:
+            progress = self._tasks.get(task)
+            if progress is None:
+                return None
+            if file_path is not None:
+                info = progress.files.get(os.path.abspath(file_path))
+                return dict(info, path=os.path.abspath(file_path)) if info is not None else None
+            for path, info in progress.files.items():
+                if info.get("url") == url:
+                    return dict(info, path=path)
+        return None
+
+    def verify_file(self, task: str, url: str = None, file_path: str = None) -> Optional[str]:
+        """
+        校验已下载的文件是否完整：先比较大小，一致时再比较哈希
+        :return: 校验通过时返回文件路径，否则返回None并删除记录
+        """
+        info = self.get_file(task, url, file_path)
+        if info is None:
+            return None
+        path = info["path"]
+        if os.path.isfile(path) and os.path.getsize(path) == info["size"] and file_hash(path) == info["sha256"]:
+            return path
+        logger.info("断点记录的文件不存在或校验失败，需要重新下载：%s" % path)
+        self.forget_file(task, path)
+        return None
+
+    def task_files(self, task: str = None) -> set:
+        """任务已记录的文件路径，task为空时返回所有任务的文件"""
+        with self._lock:
+            if task is not None:
+                progress = self._tasks.get(task)
+                return set(progress.files) if progress is not None else set()
+            return {path for progress in self._tasks.values() for path in progress.files}
+
+    def set_cursor(self, task: str, name: str, value: Any):
+        """
+        记录分页游标，value为None时删除
+        :param task: 任务
+        :param name: 游标名称，如输出文件路径
+        :param value: 可JSON序列化的游标
+        """
+        self._append(task, "cursor", {"name": name, "value": value})
+
+    def get_cursor(self, task: str, name: str) -> Any:
+        with self._lock:
+            progress = self._tasks.get(task)
+            return progress.cursors.get(name) if progress is not None else None
+
+    def forget_task(self, task: str):
+        """任务全部完成后删除其进度"""
+        with self._lock:
+            if task not in self._tasks:
+                return
+        self._append(task, "forget")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tasks": len(self._tasks),
+                "urls": sum(len(progress.urls) for progress in self._tasks.values()),
+                "files": sum(len(progress.files) for progress in self._tasks.values()),
+                "journal_lines": self._journal_lines,
+                "appended": self.appended,
+                "compactions": self.compactions
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """进程内共用的断点记录，checkpoint未启用时返回None"""
+    global _store
+    if not get_config_by_section("checkpoint", "enabled"):
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore()
+        return _store
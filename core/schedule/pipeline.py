@@ -0,0 +1,250 @@
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Sequence
+
+from core.config.config import get_config_by_section
+from core.log.logger import logger
+
+_STOP = object()  # 阶段结束标记
+
+
+class Stage:
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1, process: bool = False,
+                 queue_size: int = None):
+        """
+        流水线阶段
+        :param name: 阶段名称，用于统计
+        :param func: 处理函数func(item)，返回值传给下一阶段，返回None时丢弃；process为True时需为可pickle的模块级函数
+        :param workers: 并行数，process为True时为子进程数
+        :param process: 是否在进程池中执行，用于模板匹配、图片编码、解析等CPU密集的处理，不受GIL限制
+        :param queue_size: 输入队列长度，为空时取流水线的queue_size；队列满时上游阻塞等待
+        """
+        if workers < 1:
+            raise ValueError("阶段并行数必须大于0：%s" % name)
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.process = process
+        self.queue_size = queue_size
+
+
+class StageStats:
+    """单个阶段的执行统计"""
+
+    def __init__(self):
+        self.received = 0  # 进入队列的数量
+        self.completed = 0  # 处理成功的数量
+        self.failed = 0  # 处理失败的数量
+        self.dropped = 0  # 处理结果为None未传给下一阶段的数量
+        self.busy_time = 0.0  # 累计处理耗时/秒
+        self.blocked_time = 0.0  # 下一阶段队列已满时累计等待时间/秒
+        self.max_queue = 0  # 输入队列的最大长度
+
+
+class PipelineRunner:
+
+    def __init__(self, stages: Sequence[Stage], queue_size: int = None, start_method: str = None,
+                 sink: Callable[[Any], Any] = None, on_error: Callable[[str, Any, Exception], Any] = None):
+        """
+        多阶段流水线：调用线程只负责驱动浏览器或窗口并提交数据，后续阶段由各自的线程或进程池并行处理
+        阶段之间为有界队列，下游处理不过来时上游阻塞(背压)，内存占用不会随积压增长
+        参数为空时读取pipeline配置
+        :param stages: 按顺序执行的阶段
+        :param queue_size: 各阶段默认的输入队列长度
+        :param start_method: 进程池的启动方式，spawn/fork/forkserver
+        :param sink: 最后一个阶段的结果回调，在该阶段的线程中调用
+        :param on_error: 处理失败时的回调on_error(阶段名称, 数据, 异常)，为空时只记录日志
+        """
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        names = [stage.name for stage in stages]
+        duplicated = sorted({name for name in names if names.count(name) > 1})
+        if duplicated:
+            raise ValueError("流水线阶段名称重复：%s" % ", ".join(duplicated))
+        self.stages = list(stages)
+        self.queue_size = self._get_option(queue_size, "queue_size")
+        self.start_method = self._get_option(start_method, "start_method")
+        self.sink = sink
+        self.on_error = on_error
+        self._queues = [queue.Queue(maxsize=stage.queue_size or self.queue_size) for stage in self.stages]
+        self._stats = {stage.name: StageStats() for stage in self.stages}
+        self._executors = {}  # 阶段名称->进程池
+        self._threads = []
+        self._active = [0] * len(self.stages)  # 各阶段未结束的线程数
+        self._lock = threading.Lock()
+        self._submit_lock = threading.Lock()  # 提交与关闭互斥，保证结束标记之后不会再有数据入队
+        self._closing = False
+        self.submitted = 0  # 调用线程提交的数量
+        self.source_blocked = 0.0  # 调用线程因第一阶段队列已满累计等待的时间/秒
+        self._started_at = None
+        self._closed_at = None
+
+    @staticmethod
+    def _get_option(value: Any, option: str) -> Any:
+        return value if value is not None else get_config_by_section("pipeline", option)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        """启动各阶段的线程和进程池"""
+        if self._started_at is not None:
+            return
+        self._started_at = time.perf_counter()
+        for index, stage in enumerate(self.stages):
+            if stage.process:
+                self._executors[stage.name] = ProcessPoolExecutor(
+                    max_workers=stage.workers, mp_context=multiprocessing.get_context(self.start_method))
+            self._active[index] = stage.workers
+            for worker in range(stage.workers):
+                thread = threading.Thread(target=self._run_stage, args=(index,), daemon=True,
+                                          name="pipeline-%s-%s" % (stage.name, worker))
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item: Any, timeout: float = None) -> bool:
+        """
+        提交数据到第一个阶段，队列已满时阻塞，调用线程应在两次浏览器操作之间调用
+        :param item: 数据
+        :param timeout: 最大等待时间/秒，为空时一直等待
+        :return: false->等待超时未提交
+        """
+        if self._started_at is None:
+            self.start()
+        with self._submit_lock:
+            if self._closing:
+                raise Exception("流水线已关闭")
+            start = time.perf_counter()
+            try:
+                self._put(0, item, timeout)
+            except queue.Full:
+                return False
+            finally:
+                self.source_blocked += time.perf_counter() - start
+            self.submitted += 1
+        return True
+
+    def run(self, source: Iterable[Any]) -> dict:
+        """
+        在调用线程迭代source(如逐页打开并截图的生成器)并提交，全部处理完成后关闭
+        :return: stats()
+        """
+        with self:
+            for item in source:
+                self.submit(item)
+        return self.stats()
+
+    def close(self):
+        """等待已提交的数据全部处理完成后停止线程和进程池"""
+        with self._submit_lock:
+            if self._started_at is None or self._closing:
+                return
+            self._closing = True
+            for _ in range(self.stages[0].workers):
+                self._queues[0].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+        self._closed_at = time.perf_counter()
+
+    def _put(self, index: int, item: Any, timeout: float = None):
+        stage_queue = self._queues[index]
+        stage_queue.put(item, timeout=timeout)
+        stats = self._stats[self.stages[index].name]
+        with self._lock:
+            stats.received += 1
+            stats.max_queue = max(stats.max_queue, stage_queue.qsize())
+
+    def _run_stage(self, index: int):
+        stage = self.stages[index]
+        stats = self._stats[stage.name]
+        executor = self._executors.get(stage.name)
+        is_last = index == len(self.stages) - 1
+        stage_queue = self._queues[index]
+        while True:
+            item = stage_queue.get()
+            if item is _STOP:
+                break
+            start = time.perf_counter()
+            try:
+                result = executor.submit(stage.func, item).result() if executor is not None else stage.func(item)
+            except Exception as e:
+                with self._lock:
+                    stats.failed += 1
+                    stats.busy_time += time.perf_counter() - start
+                self._handle_error(stage, item, e)
+                continue
+            with self._lock:
+                stats.completed += 1
+                stats.busy_time += time.perf_counter() - start
+                if result is None:
+                    stats.dropped += 1
+            if result is None:
+                continue
+            if is_last:
+                if self.sink is not None:
+                    try:
+                        self.sink(result)
+                    except Exception as e:
+                        self._handle_error(stage, result, e)
+                continue
+            start = time.perf_counter()
+            self._put(index + 1, result)
+            with self._lock:
+                stats.blocked_time += time.perf_counter() - start
+        with self._lock:
+            self._active[index] -= 1
+            last_worker = self._active[index] == 0
+        if last_worker and not is_last:
+            # 本阶段的线程全部结束后，下一阶段已收到所有数据
+            for _ in range(self.stages[index + 1].workers):
+                self._queues[index + 1].put(_STOP)
+
+    def _handle_error(self, stage: Stage, item: Any, error: Exception):
+        if self.on_error is None:
+            logger.warning("流水线阶段%s处理失败：%s: %s" % (stage.name, type(error).__name__, error))
+            return
+        try:
+            self.on_error(stage.name, item, error)
+        except Exception as e:
+            logger.warning("流水线错误回调失败：%s, %s" % (stage.name, e))
+
+    def stats(self) -> dict:
+        """
+        调用线程的提交数和因背压等待的时间，以及各阶段的吞吐量(个/秒)、利用率、平均耗时和队列长度
+        利用率接近1且上游blocked_time增长的阶段为瓶颈，可增加其workers
+        """
+        if self._started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._closed_at or time.perf_counter()) - self._started_at
+        with self._lock:
+            stages = {}
+            for index, stage in enumerate(self.stages):
+                stats = self._stats[stage.name]
+                done = stats.completed + stats.failed
+                stages[stage.name] = {
+                    "workers": stage.workers,
+                    "process": stage.process,
+                    "received": stats.received,
+                    "completed": stats.completed,
+                    "failed": stats.failed,
+                    "dropped": stats.dropped,
+                    "throughput": stats.completed / elapsed if elapsed > 0 else 0.0,
+                    "utilization": stats.busy_time / (elapsed * stage.workers) if elapsed > 0 else 0.0,
+                    "mean_time": stats.busy_time / done if done else 0.0,
+                    "blocked_time": stats.blocked_time,
+                    "queue": self._queues[index].qsize(),
+                    "max_queue": stats.max_queue
+                }
+            return {"elapsed": elapsed, "submitted": self.submitted, "source_blocked": self.source_blocked,
+                    "stages": stages}
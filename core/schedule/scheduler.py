@@ -0,0 +1,288 @@
+import threading
+import time
+import traceback
+from random import Random
+from typing import Callable, Any, Optional
+
+from core.config.config import get_config_by_section
+from core.log.logger import logger, log_context
+from core.log.metrics import metrics
+from core.schedule.checkpoint import CheckpointStore, get_checkpoint_store
+from core.schedule.task_queue import TaskQueue, CrawlTask
+
+Rand = Random()
+
+
+def create_web_crawler() -> Any:
+    """创建并初始化浏览器爬虫"""
+    from core.crawl.web_crawl import WebCrawler
+    crawler = WebCrawler()
+    crawler.init_webdriver()
+    return crawler
+
+
+def create_window_crawler() -> Any:
+    """创建桌面应用爬虫"""
+    from core.crawl.window_crawl import WindowCrawler
+    return WindowCrawler()
+
+
+class HostLimiter:
+
+    def __init__(self, concurrency: int, interval: float):
+        """
+        域名访问限制，没有域名的任务(如窗口任务，域名为空)不受限制
+        :param concurrency: 单个域名同时执行的任务数
+        :param interval: 同一域名两次任务开始的最小间隔/秒
+        """
+        self.concurrency = concurrency
+        self.interval = interval
+        self._active = {}  # 域名->执行中的任务数
+        self._next_allowed = {}  # 域名->下次允许开始的时间戳
+
+    def blocked_hosts(self, now: float) -> set:
+        """当前不可开始新任务的域名，同时删除已过间隔的记录，长时间爬取大量域名时不会持续占用内存"""
+        blocked = {host for host, count in self._active.items() if count >= self.concurrency}
+        expired = []
+        for host, allowed in self._next_allowed.items():
+            if allowed > now:
+                blocked.add(host)
+            else:
+                expired.append(host)
+        for host in expired:
+            del self._next_allowed[host]
+        return blocked
+
+    def acquire(self, host: str, now: float):
+        if not host:
+            return
+        self._active[host] = self._active.get(host, 0) + 1
+        self._next_allowed[host] = now + self.interval
+
+    def release(self, host: str):
+        if not host:
+            return
+        count = self._active.get(host, 0) - 1
+        if count > 0:
+            self._active[host] = count
+        else:
+            self._active.pop(host, None)
+
+
+class HostStats:
+    """单个域名的执行统计"""
+
+    def __init__(self):
+        self.completed = 0  # 成功的任务数
+        self.failed = 0  # 执行失败的次数
+        self.retried = 0  # 重试的次数
+        self.total_time = 0.0  # 成功任务的累计耗时/秒
+        self.max_time = 0.0  # 成功任务的最大耗时/秒
+
+
+class CrawlScheduler:
+
+    def __init__(self, queue: TaskQueue = None, workers: int = None, host_concurrency: int = None,
+                 host_interval: float = None, retry_backoff: float = None, poll_interval: float = None,
+                 crawler_factories: dict[str, Callable[[], Any]] = None, checkpoint: CheckpointStore = None):
+        """
+        爬取任务调度器，从持久化队列中按优先级取任务，按域名限制并发和频率后分发给工作线程
+        参数为空时读取schedule配置
+        :param queue: 任务队列，默认使用schedule.db_path
+        :param workers: 工作线程数，每个线程持有自己的爬虫实例
+        :param host_concurrency: 单个域名同时执行的任务数
+        :param host_interval: 同一域名两次任务开始的最小间隔/秒
+        :param retry_backoff: 重试退避基数/秒，第n次重试约等待retry_backoff*2^(n-1)并带随机抖动
+        :param poll_interval: 没有可执行任务时的等待间隔/秒
+        :param crawler_factories: 任务类型->创建爬虫的函数，默认web->WebCrawler，window->WindowCrawler
+        :param checkpoint: 断点记录，默认启用checkpoint时使用进程内共用的记录；任务重试时跳过已完成的工作，成功或不再重试时删除其进度
+        """
+        self.queue = queue if queue is not None else TaskQueue(get_config_by_section("schedule", "db_path"))
+        self.workers = self._get_option(workers, "workers")
+        self.retry_backoff = self._get_option(retry_backoff, "retry_backoff")
+        self.poll_interval = self._get_option(poll_interval, "poll_interval")
+        self.limiter = HostLimiter(self._get_option(host_concurrency, "host_concurrency"),
+                                   self._get_option(host_interval, "host_interval"))
+        self.crawler_factories = crawler_factories if crawler_factories is not None else {
+            "web": create_web_crawler,
+            "window": create_window_crawler
+        }
+        self.checkpoint = checkpoint if checkpoint is not None else get_checkpoint_store()
+        self._handlers = {}  # 任务类型->处理函数
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._running = 0  # 执行中的任务数
+        self._host_stats = {}  # 域名->HostStats
+        self._started_at = None
+
+    @staticmethod
+    def _get_option(value: Any, option: str) -> Any:
+        return value if value is not None else get_config_by_section("schedule", option)
+
+    def register(self, kind: str, handler: Callable[[Any, CrawlTask], Any]):
+        """
+        注册任务处理函数
+        :param kind: 任务类型
+        :param handler: handler(crawler, task)，抛出异常视为失败并按次数重试
+        """
+        self._handlers[kind] = handler
+
+    def start(self):
+        """恢复中断的任务并启动工作线程"""
+        if self._threads:
+            return
+        recovered = self.queue.recover()
+        if recovered:
+            logger.info("恢复%s个中断的任务" % recovered)
+        self._stop.clear()
+        self._started_at = time.time()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run_worker, name="crawl-worker-%s" % i, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """停止调度，执行中的任务完成后工作线程退出"""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def run_until_idle(self, timeout: float = None) -> bool:
+        """
+        启动并等待所有可执行任务完成后停止
+        :param timeout: 等待最大时间/秒
+        :return: true->队列已处理完
+        """
+        self.start()
+        deadline = None if timeout is None else time.time() + timeout
+        idle = False
+        while deadline is None or time.time() < deadline:
+            with self._lock:
+                running = self._running
+            if running == 0 and self.queue.next_ready_time() is None:
+                idle = True
+                break
+            time.sleep(self.poll_interval)
+        self.stop()
+        return idle
+
+    def _claim(self) -> Optional[CrawlTask]:
+        """按域名限制取出任务，需持有锁"""
+        now = time.time()
+        task = self.queue.claim(self.limiter.blocked_hosts(now))
+        if task is not None:
+            self.limiter.acquire(task.host, now)
+            self._running += 1
+        return task
+
+    def _run_worker(self):
+        crawlers = {}  # 任务类型->当前线程的爬虫实例
+        try:
+            while not self._stop.is_set():
+                with self._wakeup:
+                    task = self._claim()
+                    if task is None:
+                        self._wakeup.wait(self.poll_interval)
+                        continue
+                self._execute(task, crawlers)
+        finally:
+            for crawler in crawlers.values():
+                self._close_crawler(crawler)
+
+    def _execute(self, task: CrawlTask, crawlers: dict):
+        start = time.time()
+        error = None
+        try:
+            handler = self._handlers.get(task.kind)
+            if handler is None:
+                raise KeyError("未注册的任务类型：%s" % task.kind)
+            crawler = crawlers.get(task.kind)
+            if crawler is None and task.kind in self.crawler_factories:
+                crawler = self.crawler_factories[task.kind]()
+                crawlers[task.kind] = crawler
+            if self.checkpoint is not None and hasattr(crawler, "checkpoint"):
+                crawler.checkpoint = self.checkpoint
+                crawler.checkpoint_task = self.checkpoint_task(task)
+            with log_context(task_id=task.task_id), \
+                    metrics.trace_task(task.task_id, url=task.url, kind=task.kind, attempt=task.attempts):
+                handler(crawler, task)
+        except Exception as e:
+            error = "%s: %s" % (type(e).__name__, e)
+            logger.warning("任务%s执行失败：%s\n%s" % (task.task_id, task.url, traceback.format_exc()))
+            crawler = crawlers.get(task.kind)
+            if crawler is not None and not self._is_healthy(crawler):
+                self._close_crawler(crawlers.pop(task.kind))
+        duration = time.time() - start
+        self._finish(task, error, duration)
+
+    def _finish(self, task: CrawlTask, error: Optional[str], duration: float):
+        retry_at = None
+        if error is None:
+            self.queue.complete(task.task_id)
+            if self.checkpoint is not None:
+                self.checkpoint.forget_task(self.checkpoint_task(task))
+        else:
+            if task.attempts < task.max_attempts:
+                delay = self.retry_backoff * (2 ** (task.attempts - 1)) * Rand.uniform(0.5, 1.5)
+                retry_at = time.time() + delay
+            self.queue.fail(task.task_id, error, retry_at)
+            if retry_at is None and self.checkpoint is not None:
+                # 不再重试的任务不会恢复，删除其进度，避免断点日志和保留的下载文件无限增长
+                self.checkpoint.forget_task(self.checkpoint_task(task))
+        with self._wakeup:
+            self.limiter.release(task.host)
+            self._running -= 1
+            stats = self._host_stats.setdefault(task.host, HostStats())
+            if error is None:
+                stats.completed += 1
+                stats.total_time += duration
+                stats.max_time = max(stats.max_time, duration)
+            else:
+                stats.failed += 1
+                if retry_at is not None:
+                    stats.retried += 1
+            self._wakeup.notify_all()
+
+    @staticmethod
+    def checkpoint_task(task: CrawlTask) -> str:
+        """任务在断点记录中的名称，同一任务重试时相同"""
+        return "task-%s" % task.task_id
+
+    @staticmethod
+    def _is_healthy(crawler: Any) -> bool:
+        """浏览器爬虫的驱动是否仍可响应，其他爬虫视为健康"""
+        driver = getattr(crawler, "driver", None)
+        if driver is None:
+            return True
+        try:
+            driver.execute_script("return 1;")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_crawler(crawler: Any):
+        if hasattr(crawler, "quit_webdriver"):
+            crawler.quit_webdriver()
+
+    def stats(self) -> dict:
+        """队列状态以及各域名的吞吐量(任务/秒)和平均、最大耗时/秒"""
+        with self._lock:
+            elapsed = time.time() - self._started_at if self._started_at else 0.0
+            hosts = {}
+            for host, stats in self._host_stats.items():
+                hosts[host] = {
+                    "completed": stats.completed,
+                    "failed": stats.failed,
+                    "retried": stats.retried,
+                    "throughput": stats.completed / elapsed if elapsed > 0 else 0.0,
+                    "mean_latency": stats.total_time / stats.completed if stats.completed else 0.0,
+                    "max_latency": stats.max_time
+                }
+            running = self._running
+        return {"running": running, "queue": self.queue.counts(), "hosts": hosts}
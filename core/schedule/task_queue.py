@@ -0,0 +1,176 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Iterable
+from urllib.parse import urlsplit
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_EXPIRED = "expired"
+
+
+class CrawlTask:
+    """爬取任务"""
+
+    def __init__(self, row: sqlite3.Row):
+        self.task_id = row["id"]  # 任务ID
+        self.url = row["url"]  # 任务链接
+        self.host = row["host"]  # 链接对应的域名
+        self.kind = row["kind"]  # 任务类型，对应调度器中注册的处理函数
+        self.payload = json.loads(row["payload"]) if row["payload"] else {}  # 任务附加数据
+        self.priority = row["priority"]  # 优先级，越大越先执行
+        self.attempts = row["attempts"]  # 已执行次数
+        self.max_attempts = row["max_attempts"]  # 最大执行次数
+        self.deadline = row["deadline"]  # 截止时间戳，超过后不再执行
+
+
+def get_host(url: str) -> str:
+    """获取链接的域名，非URL任务返回空字符串"""
+    return urlsplit(url).netloc.lower()
+
+
+class TaskQueue:
+
+    def __init__(self, db_path: str):
+        """
+        基于SQLite的持久化优先级任务队列，进程重启后未完成的任务会重新排队
+        :param db_path: 数据库文件路径
+        """
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                host TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                not_before REAL NOT NULL,
+                deadline REAL,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                error TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_ready ON tasks (status, priority DESC, id)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def put(self, url: str, kind: str = "web", payload: dict = None, priority: int = 0, max_attempts: int = 3,
+            deadline: float = None, delay: float = 0) -> int:
+        """
+        添加任务
+        :param url: 任务链接
+        :param kind: 任务类型
+        :param payload: 任务附加数据，需可JSON序列化
+        :param priority: 优先级，越大越先执行
+        :param max_attempts: 最大执行次数
+        :param deadline: 截止时间戳
+        :param delay: 延迟多少秒后才可执行
+        :return: 任务ID
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO tasks (url, host, kind, payload, priority, status, max_attempts, not_before, deadline,"
+                " created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, get_host(url), kind, json.dumps(payload, ensure_ascii=False) if payload else None, priority,
+                 STATUS_PENDING, max_attempts, now + delay, deadline, now))
+            return cursor.lastrowid
+
+    def put_many(self, urls: Iterable[str], kind: str = "web", priority: int = 0, max_attempts: int = 3,
+                 deadline: float = None) -> int:
+        """批量添加任务，返回添加的数量"""
+        now = time.time()
+        rows = [(url, get_host(url), kind, None, priority, STATUS_PENDING, max_attempts, now, deadline, now)
+                for url in urls]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO tasks (url, host, kind, payload, priority, status, max_attempts, not_before, deadline,"
+                " created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+        return len(rows)
+
+    def recover(self) -> int:
+        """将上次运行中断时处于执行中的任务重新排队，返回数量"""
+        with self._lock:
+            cursor = self._conn.execute("UPDATE tasks SET status = ? WHERE status = ?",
+                                        (STATUS_PENDING, STATUS_RUNNING))
+            return cursor.rowcount
+
+    def claim(self, exclude_hosts: Iterable[str] = ()) -> Optional[CrawlTask]:
+        """
+        取出优先级最高的可执行任务并标记为执行中，已过截止时间的任务标记为过期
+        :param exclude_hosts: 暂不可访问的域名
+        :return: 任务，没有可执行任务时返回None
+        """
+        exclude_hosts = list(exclude_hosts)
+        now = time.time()
+        sql = "SELECT * FROM tasks WHERE status = ? AND not_before <= ?"
+        params = [STATUS_PENDING, now]
+        if exclude_hosts:
+            sql += " AND host NOT IN (%s)" % ",".join("?" * len(exclude_hosts))
+            params.extend(exclude_hosts)
+        sql += " ORDER BY priority DESC, id LIMIT 1"
+        with self._lock:
+            self._conn.execute("UPDATE tasks SET status = ?, finished_at = ? WHERE status = ? AND deadline < ?",
+                               (STATUS_EXPIRED, now, STATUS_PENDING, now))
+            row = self._conn.execute(sql, params).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE tasks SET status = ?, attempts = attempts + 1 WHERE id = ?",
+                               (STATUS_RUNNING, row["id"]))
+            task = CrawlTask(row)
+            task.attempts += 1
+            return task
+
+    def complete(self, task_id: int):
+        """标记任务完成"""
+        with self._lock:
+            self._conn.execute("UPDATE tasks SET status = ?, finished_at = ?, error = NULL WHERE id = ?",
+                               (STATUS_DONE, time.time(), task_id))
+
+    def fail(self, task_id: int, error: str, retry_at: float = None):
+        """
+        标记任务失败
+        :param task_id: 任务ID
+        :param error: 失败原因
+        :param retry_at: 重试的时间戳，为空时不再重试
+        """
+        with self._lock:
+            if retry_at is None:
+                self._conn.execute("UPDATE tasks SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                                   (STATUS_FAILED, time.time(), error, task_id))
+            else:
+                self._conn.execute("UPDATE tasks SET status = ?, not_before = ?, error = ? WHERE id = ?",
+                                   (STATUS_PENDING, retry_at, error, task_id))
+
+    def next_ready_time(self) -> Optional[float]:
+        """最早可执行的待处理任务时间戳，没有待处理任务时返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(not_before) AS ready FROM tasks WHERE status = ?",
+                                     (STATUS_PENDING,)).fetchone()
+            return row["ready"]
+
+    def counts(self) -> dict:
+        """各状态的任务数"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS total FROM tasks GROUP BY status").fetchall()
+            return {row["status"]: row["total"] for row in rows}
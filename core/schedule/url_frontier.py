@@ -0,0 +1,432 @@
+import atexit
+import hashlib
+import heapq
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Any, Optional, Iterable, Sequence
+from urllib.parse import urlsplit, urlunsplit, urljoin, parse_qsl, urlencode
+
+from core.common.pattern_utils import compile_pattern
+from core.config.config import get_config_by_section
+from core.log.logger import logger
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str, base: str = None, drop_params: Sequence[str] = ()) -> Optional[str]:
+    """
+    归一化URL：补全相对链接，协议和域名转小写，去掉默认端口、片段和指定的查询参数，查询参数排序
+    :param url: 链接
+    :param base: 相对链接的基准链接
+    :param drop_params: 去掉的查询参数，如utm_source
+    :return: 归一化后的链接，非http/https链接返回None
+    """
+    normalized = _normalize(url.strip(), base, frozenset(drop_params))
+    return normalized[0] if normalized else None
+
+
+def _normalize(url: str, base: Optional[str], drop_params: frozenset) -> Optional[tuple[str, str]]:
+    """归一化URL，返回(链接, 域名)，绝对链接不依赖base，结果可缓存"""
+    if base and not url.startswith(("http://", "https://")):
+        url = urljoin(base, url)
+    return _normalize_absolute(url, drop_params)
+
+
+@lru_cache(maxsize=16384)
+def _normalize_absolute(url: str, drop_params: frozenset) -> Optional[tuple[str, str]]:
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    host = parts.hostname.lower().rstrip(".")
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = "%s:%s" % (host, port)
+    if parts.username:
+        userinfo = parts.username if parts.password is None else "%s:%s" % (parts.username, parts.password)
+        host = "%s@%s" % (userinfo, host)
+    query = parts.query
+    if query:
+        query = parse_qsl(query, keep_blank_values=True)
+        if drop_params:
+            query = [(key, value) for key, value in query if key not in drop_params]
+        query = urlencode(sorted(query))
+    return urlunsplit((scheme, host, parts.path or "/", query, "")), host
+
+
+class BloomFilter:
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        布隆过滤器，判断为不存在时一定不存在
+        :param capacity: 预计元素数
+        :param error_rate: 达到预计元素数时的误判率
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))  # 位数
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))  # 哈希函数个数
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0  # 已添加的次数
+
+    def _positions(self, key: bytes) -> list:
+        """由16字节摘要做双重哈希得到各位置"""
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def add(self, key: bytes) -> bool:
+        """添加摘要，返回true表示之前一定不存在"""
+        bits = self.bits
+        added = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        self.count += 1
+        return added
+
+    def save(self, file_path: str):
+        with open(file_path, "wb") as file:
+            file.write(b"%d %r %d\n" % (self.capacity, self.error_rate, self.count))
+            file.write(self.bits)
+
+    @classmethod
+    def load(cls, file_path: str, capacity: int, error_rate: float) -> Optional["BloomFilter"]:
+        """读取保存的过滤器，参数不一致或文件损坏时返回None"""
+        bloom = cls(capacity, error_rate)
+        try:
+            with open(file_path, "rb") as file:
+                header = file.readline().split()
+                bits = file.read()
+        except OSError:
+            return None
+        if len(header) != 3 or int(header[0]) != capacity or float(header[1]) != error_rate \
+                or len(bits) != len(bloom.bits):
+            return None
+        bloom.bits[:] = bits
+        bloom.count = int(header[2])
+        return bloom
+
+
+class FrontierUrl:
+    """待爬取的链接"""
+
+    def __init__(self, row_id: int, url: str, host: str, depth: int):
+        self.row_id = row_id  # 数据库行ID
+        self.url = url  # 归一化后的链接
+        self.host = host  # 域名
+        self.depth = depth  # 距种子链接的层数
+
+
+class UrlFrontier:
+
+    def __init__(self, db_path: str = None, bloom_capacity: int = None, bloom_error_rate: float = None,
+                 host_buffer: int = None, host_interval: float = None, max_depth: int = None,
+                 same_host_only: bool = None, drop_params: Sequence[str] = None, seen_cache_size: int = 100000):
+        """
+        URL边界队列：归一化去重后按域名分队列，同一域名两次取出至少间隔host_interval
+        去重先查内存中的布隆过滤器，判断可能存在时再查最近链接缓存和磁盘上的精确集合；待爬链接也保存在磁盘，
+        内存只保留布隆过滤器和每个域名少量待取链接，千万级链接时内存占用仍有上限
+        参数为空时读取frontier配置
+        :param db_path: 数据库文件路径，布隆过滤器保存在同目录的.bloom文件
+        :param bloom_capacity: 布隆过滤器预计链接数
+        :param bloom_error_rate: 布隆过滤器误判率
+        :param host_buffer: 每个域名在内存中缓存的待取链接数
+        :param host_interval: 同一域名两次取出的最小间隔/秒
+        :param max_depth: 最大层数，超过的链接不入队
+        :param same_host_only: true->只接受种子链接所在域名的链接
+        :param drop_params: 归一化时去掉的查询参数
+        :param seen_cache_size: 最近链接缓存的大小
+        """
+        self.db_path = self._get_option(db_path, "db_path")
+        self.bloom_capacity = self._get_option(bloom_capacity, "bloom_capacity")
+        self.bloom_error_rate = self._get_option(bloom_error_rate, "bloom_error_rate")
+        self.host_buffer = self._get_option(host_buffer, "host_buffer")
+        self.host_interval = self._get_option(host_interval, "host_interval")
+        self.max_depth = self._get_option(max_depth, "max_depth")
+        self.same_host_only = self._get_option(same_host_only, "same_host_only")
+        self.drop_params = frozenset(self._get_option(drop_params, "drop_params"))
+        self.seen_cache_size = seen_cache_size
+        self.allowed_hosts = set()  # same_host_only时允许的域名
+        self.exclude_patterns = []  # 不入队的链接正则
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                host TEXT NOT NULL,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_frontier_host ON frontier (host, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY)")
+        self._closed = False
+        self._bloom_path = "%s.bloom" % self.db_path
+        self._bloom = self._load_bloom()
+        self._recent = OrderedDict()  # 最近确认存在的摘要
+        self._pending = {}  # 域名->待取链接数
+        self._buffers = {}  # 域名->deque[FrontierUrl]
+        self._last_ids = {}  # 域名->已缓存的最大行ID
+        self._ready = []  # [(可取出时间, 域名)]
+        self._scheduled = set()  # 已在_ready中的域名
+        for host, count in self._conn.execute("SELECT host, COUNT(*) FROM frontier GROUP BY host"):
+            self._pending[host] = count
+            self._schedule(host, 0)
+        self.allowed_hosts.update(row[0] for row in self._conn.execute("SELECT host FROM hosts"))
+        self.added = 0  # 入队链接数
+        self.duplicates = 0  # 重复链接数
+        self.rejected = 0  # 被过滤的链接数
+        self.bloom_negatives = 0  # 布隆过滤器判断不存在、免于查磁盘的次数
+        self.disk_lookups = 0  # 查询磁盘精确集合的次数
+        self.false_positives = 0  # 布隆过滤器误判次数
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return sum(self._pending.values())
+
+    @staticmethod
+    def _get_option(value: Any, option: str) -> Any:
+        return value if value is not None else get_config_by_section("frontier", option)
+
+    def _load_bloom(self) -> BloomFilter:
+        """读取保存的布隆过滤器，不存在或不一致时从精确集合重建"""
+        bloom = BloomFilter.load(self._bloom_path, self.bloom_capacity, self.bloom_error_rate)
+        if bloom is not None:
+            os.remove(self._bloom_path)  # close()时重新保存，异常退出后下次启动从精确集合重建
+        else:
+            bloom = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+            for (key,) in self._conn.execute("SELECT key FROM seen"):
+                bloom.add(key)
+        return bloom
+
+    def close(self):
+        """保存布隆过滤器并关闭数据库，重复调用无影响"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._bloom.save(self._bloom_path)
+            self._conn.close()
+
+    @staticmethod
+    def _key(url: str) -> bytes:
+        return hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+
+    def _remember(self, key: bytes):
+        self._recent[key] = None
+        if len(self._recent) > self.seen_cache_size:
+            self._recent.popitem(last=False)
+
+    def _is_seen(self, key: bytes) -> bool:
+        """查询链接摘要是否已存在"""
+        if key not in self._bloom:
+            self.bloom_negatives += 1
+            return False
+        if key in self._recent:
+            self._recent.move_to_end(key)
+            return True
+        self.disk_lookups += 1
+        if self._conn.execute("SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone() is not None:
+            self._remember(key)
+            return True
+        self.false_positives += 1
+        return False
+
+    def seen(self, url: str, base: str = None) -> bool:
+        """链接是否已入队过"""
+        normalized = _normalize(url.strip(), base, self.drop_params)
+        if normalized is None:
+            return False
+        with self._lock:
+            return self._is_seen(self._key(normalized[0]))
+
+    def exclude(self, pattern: str):
+        """添加不入队的链接正则"""
+        self.exclude_patterns.append(compile_pattern(pattern))
+
+    def seed(self, urls: Iterable[str]) -> int:
+        """添加种子链接，same_host_only时其域名加入允许的域名"""
+        normalized = [item for item in (_normalize(url.strip(), None, self.drop_params) for url in urls) if item]
+        self._allow_hosts({host for _, host in normalized})
+        return self.add_many([url for url, _ in normalized], 0)
+
+    def allow_host(self, url: str):
+        """将链接的域名加入允许的域名，如直接打开的页面，其中的链接在same_host_only时也可入队"""
+        normalized = _normalize(url.strip(), None, self.drop_params)
+        if normalized is not None:
+            self._allow_hosts({normalized[1]})
+
+    def _allow_hosts(self, hosts: set):
+        with self._lock:
+            hosts = hosts - self.allowed_hosts
+            if not hosts:
+                return
+            self.allowed_hosts.update(hosts)
+            self._conn.executemany("INSERT OR IGNORE INTO hosts (host) VALUES (?)", [(host,) for host in hosts])
+
+    def add(self, url: str, depth: int = 0, base: str = None) -> bool:
+        """添加链接，返回true表示新入队"""
+        return self.add_many([url], depth, base) == 1
+
+    def add_many(self, urls: Iterable[str], depth: int = 0, base: str = None) -> int:
+        """
+        批量添加链接，一个事务写入
+        :param urls: 链接，可为相对链接
+        :param depth: 链接的层数
+        :param base: 相对链接的基准链接，一般为当前页面链接
+        :return: 新入队的链接数
+        """
+        if self.max_depth is not None and depth > self.max_depth:
+            with self._lock:
+                self.rejected += sum(1 for _ in urls)
+            return 0
+        rows = []
+        total = host_rejected = 0
+        with self._lock:
+            for url in urls:
+                total += 1
+                normalized = _normalize(url.strip(), base, self.drop_params)
+                if normalized is None:
+                    self.rejected += 1
+                    continue
+                url, host = normalized
+                if self.exclude_patterns and any(pattern.search(url) for pattern in self.exclude_patterns):
+                    self.rejected += 1
+                    continue
+                if self.same_host_only and host not in self.allowed_hosts:
+                    self.rejected += 1
+                    host_rejected += 1
+                    continue
+                key = self._key(url)
+                if self._is_seen(key):
+                    self.duplicates += 1
+                    continue
+                self._bloom.add(key)
+                self._remember(key)
+                rows.append((key, host, url))
+            if not rows:
+                if host_rejected and host_rejected == total:
+                    logger.warning("%s个链接的域名都不在允许的域名中，未入队，请先seed或allow_host：%s" %
+                                   (total, base))
+                return 0
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR IGNORE INTO seen (key) VALUES (?)", [(row[0],) for row in rows])
+            self._conn.executemany("INSERT INTO frontier (host, url, depth) VALUES (?, ?, ?)",
+                                   [(host, url, depth) for _, host, url in rows])
+            self._conn.execute("COMMIT")
+            now = time.time()
+            for _, host, _ in rows:
+                self._pending[host] = self._pending.get(host, 0) + 1
+                self._schedule(host, now)
+            self.added += len(rows)
+            return len(rows)
+
+    def _schedule(self, host: str, ready_at: float):
+        if host not in self._scheduled:
+            self._scheduled.add(host)
+            heapq.heappush(self._ready, (ready_at, host))
+
+    def _fill_buffer(self, host: str) -> deque:
+        """从磁盘读取域名的下一批待取链接"""
+        buffer = self._buffers.setdefault(host, deque())
+        if not buffer:
+            rows = self._conn.execute(
+                "SELECT id, url, depth FROM frontier WHERE host = ? AND id > ? ORDER BY id LIMIT ?",
+                (host, self._last_ids.get(host, 0), self.host_buffer)).fetchall()
+            for row_id, url, depth in rows:
+                buffer.append(FrontierUrl(row_id, url, host, depth))
+            if rows:
+                self._last_ids[host] = rows[-1][0]
+        return buffer
+
+    def next(self) -> Optional[FrontierUrl]:
+        """
+        取出下一个可访问的链接，优先取等待最久的域名
+        :return: 链接，没有可访问的域名时返回None，可用next_ready_time()获取等待时间
+        """
+        with self._lock:
+            now = time.time()
+            while self._ready and self._ready[0][0] <= now:
+                _, host = heapq.heappop(self._ready)
+                self._scheduled.discard(host)
+                buffer = self._fill_buffer(host)
+                if not buffer:
+                    self._pending.pop(host, None)
+                    self._buffers.pop(host, None)
+                    self._last_ids.pop(host, None)
+                    continue
+                item = buffer.popleft()
+                self._conn.execute("DELETE FROM frontier WHERE id = ?", (item.row_id,))
+                self._pending[host] -= 1
+                if self._pending[host] > 0:
+                    self._schedule(host, now + self.host_interval)
+                else:
+                    del self._pending[host]
+                    self._buffers.pop(host, None)
+                    self._last_ids.pop(host, None)
+                return item
+            return None
+
+    def next_ready_time(self) -> Optional[float]:
+        """最早可取出链接的时间戳，队列为空时返回None"""
+        with self._lock:
+            return self._ready[0][0] if self._ready else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": sum(self._pending.values()),
+                "hosts": len(self._pending),
+                "seen": self._bloom.count,
+                "added": self.added,
+                "duplicates": self.duplicates,
+                "rejected": self.rejected,
+                "bloom_negatives": self.bloom_negatives,
+                "disk_lookups": self.disk_lookups,
+                "false_positives": self.false_positives,
+                "bloom_bytes": len(self._bloom.bits)
+            }
+
+
+_frontier = None
+_frontier_lock = threading.Lock()
+
+
+def get_url_frontier() -> UrlFrontier:
+    """
+    进程内共用的URL边界队列：同一数据库只能由一个实例读写，
+    多个实例各自缓存待取链接会把同一链接分给多个爬虫，并互相覆盖布隆过滤器文件；进程退出时保存
+    """
+    global _frontier
+    with _frontier_lock:
+        if _frontier is None:
+            _frontier = UrlFrontier()
+            atexit.register(_frontier.close)
+        return _frontier